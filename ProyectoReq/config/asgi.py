@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Vistas asíncronas del dashboard y las consultas (ver ingreso_edificio/urls.py)
+os.environ.setdefault('VISTAS_ASINCRONAS', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,8 +43,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ingreso_edificio.medicion.MedicionMiddleware',
+    'ingreso_edificio.respuestas.CompresionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'ingreso_edificio.replicas.EscrituraMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -55,7 +59,9 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates con medición del tiempo de render (MEDICION_ACTIVA)
+        'BACKEND': 'ingreso_edificio.medicion.PlantillasMedidas',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],  # ← AGREGAR templates
         'APP_DIRS': True,
         'OPTIONS': {
@@ -64,6 +70,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'ingreso_edificio.edificios.contexto',
             ],
         },
     },
@@ -79,9 +86,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reutiliza la conexión entre peticiones (y sus PRAGMA) durante 60 s
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Toma el candado de escritura al abrir la transacción: evita el
+            # "database is locked" inmediato al promover una lectura a escritura
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# PRAGMA aplicados a cada conexión SQLite nueva (ingreso_edificio/ajustes_sqlite.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 134217728,        # 128 MB
+    'cache_size': -20000,          # negativo = KiB (unos 20 MB)
+    'temp_store': 'MEMORY',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -126,6 +150,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Configuración de archivos estáticos
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic genera nombres con hash (manifiesto) y variantes .gz/.br
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'ingreso_edificio.estaticos.AlmacenamientoComprimido',
+    },
+}
 
 # Configuración regional
 LANGUAGE_CODE = 'es-co'
@@ -134,7 +169,180 @@ TIME_ZONE = 'America/Bogota'
 # Modelo de usuario personalizado
 AUTH_USER_MODEL = 'ingreso_edificio.Usuario'
 
+# Caché: LocMem es por proceso. Con varios workers se declara una caché
+# compartida con CACHE_REDIS_URL (p. ej. redis://localhost:6379/1, requiere el
+# paquete redis) para que contadores del dashboard, versión de edificios,
+# usuarios y sesiones se vean igual en todos los procesos
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', '')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ingreso-edificio',
+        }
+    }
+CACHE_COMPARTIDA = bool(CACHE_REDIS_URL)
+
+# Usuario y sesión en caché (ingreso_edificio/autenticacion.py): editar,
+# desactivar, eliminar o cerrar sesión los descarta de la caché. Con LocMem el
+# descarte solo alcanza al worker que atendió el cambio, así que la copia de
+# los demás caduca pronto; con CACHE_REDIS_URL la ven todos a la vez
+AUTHENTICATION_BACKENDS = [
+    'ingreso_edificio.autenticacion.BackendUsuarioCacheado',
+    # Para las sesiones abiertas antes de activar el backend cacheado
+    'django.contrib.auth.backends.ModelBackend',
+]
+# Escritura directa a la base: una sesión sigue válida si la caché se vacía
+SESSION_ENGINE = 'ingreso_edificio.autenticacion'
+USUARIO_CACHE_TIMEOUT = 300 if CACHE_COMPARTIDA else 30  # segundos
+SESION_CACHE_TIMEOUT = USUARIO_CACHE_TIMEOUT
+
 # URLs de login
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Exportación de reportes: filas leídas por bloque desde la base de datos
+REPORTE_CSV_CHUNK_SIZE = 2000
+
+# Paginación por cursor en listados y reportes
+PAGINACION_TAM_PAGINA = 50
+
+# Máximo de filas por página que se puede pedir a la API de listados (?tam=)
+API_TAM_PAGINA_MAXIMO = 200
+
+# Máximo de coincidencias devueltas por el buscador de visitantes
+AUTOCOMPLETAR_LIMITE = 10
+
+# Máximo de resultados por relevancia en la búsqueda de visitantes
+BUSQUEDA_LIMITE = 100
+
+# Tiempo máximo (segundos) que una estadística del dashboard vive en caché
+ESTADISTICAS_CACHE_TIMEOUT = 300
+
+# Auditoría: 'buffer' escribe en lotes fuera de la petición; 'sincrono'
+# escribe cada evento en el momento (útil en pruebas)
+AUDITORIA_MODO = 'buffer'
+AUDITORIA_TAM_LOTE = 50
+AUDITORIA_INTERVALO_FLUSH = 5
+
+# Máximo de visitantes por registro grupal de entrada/salida
+REGISTRO_GRUPAL_MAXIMO = 500
+
+# Analítica de visitas: ventana por defecto (días), tamaño de los rankings,
+# tiempo en caché por ventana y percentiles con NumPy si está instalado
+ANALITICA_DIAS_POR_DEFECTO = 30
+ANALITICA_LIMITE_RANKING = 10
+ANALITICA_CACHE_TIMEOUT = 600
+ANALITICA_USAR_NUMPY = True
+
+# Archivo histórico: registros de visita cerrados y auditorías más antiguos
+# que el horizonte se mueven a tablas de archivo (comando archivar_historico)
+ARCHIVO_HORIZONTE_DIAS = 365
+ARCHIVO_TAM_LOTE = 2000
+
+# Medición por petición (ingreso_edificio/medicion.py): consultas SQL,
+# tiempos de vista y plantilla, cabecera Server-Timing y log estructurado.
+# Envuelve cada consulta y cada render: en producción se activa solo para
+# diagnosticar
+MEDICION_ACTIVA = DEBUG
+MEDICION_UMBRAL_LENTO_MS = 500
+# Una misma sentencia SQL repetida este número de veces se marca como N+1
+MEDICION_UMBRAL_REPETIDAS = 5
+# Server-Timing expone tiempos internos: solo en desarrollo por defecto
+MEDICION_SERVER_TIMING = DEBUG
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # Con WARNING solo se registran peticiones lentas y consultas repetidas;
+        # MEDICION_NIVEL_LOG=INFO añade una línea JSON por cada petición
+        'ingreso_edificio.medicion': {
+            'handlers': ['console'],
+            'level': os.environ.get('MEDICION_NIVEL_LOG', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# Archivos estáticos (ingreso_edificio/estaticos.py): Django puede servirlos
+# desde STATIC_ROOT con la variante comprimida que acepte el navegador. Fuera
+# de DEBUG lo normal es que un servidor web (nginx con gzip_static) atienda
+# /static/; un despliegue sin él lo activa explícitamente.
+ESTATICOS_SERVIR = DEBUG
+ESTATICOS_MAX_AGE = 31536000  # un año, solo para nombres con hash
+ESTATICOS_TAMANO_MINIMO_COMPRESION = 512  # bytes
+# Sin manifiesto (collectstatic no se ejecutó) {% static %} falla salvo en
+# desarrollo, donde se usa el nombre original
+ESTATICOS_MANIFIESTO_ESTRICTO = not DEBUG
+
+# GET condicional (ingreso_edificio/respuestas.py): dashboard, visitantes,
+# consultas y evacuación responden 304 si no cambió nada desde la última vista
+RESPUESTAS_CONDICIONALES = True
+
+# Compresión gzip de respuestas a partir de este tamaño (bytes)
+COMPRESION_TAMANO_MINIMO = 1024
+
+# Eventos en vivo del dashboard (ingreso_edificio/eventos.py, requiere ASGI)
+EVENTOS_INTERVALO_SONDEO = 5  # segundos; un sondeo por proceso, no por pantalla
+EVENTOS_LATIDO = 15  # segundos entre comentarios de keep-alive
+EVENTOS_COLA_MAXIMA = 100  # eventos pendientes por pantalla antes de descartar
+
+# Variantes asíncronas de dashboard y consultar_registros. config/asgi.py lo
+# activa; con WSGI (o runserver) se usan las vistas síncronas
+VISTAS_ASINCRONAS = os.environ.get('VISTAS_ASINCRONAS') == '1'
+
+# Reportes en segundo plano (ingreso_edificio/reportes.py)
+REPORTES_DIR = BASE_DIR / 'reportes'
+REPORTES_TRABAJADOR_LOCAL = True  # hilos del proceso web; False = solo el comando procesar_reportes
+REPORTES_HILOS = 1
+REPORTES_UMBRAL_SEGUNDO_PLANO = 50000  # filas; una exportación mayor pasa a segundo plano
+REPORTES_PASO_PROGRESO = 5000  # filas entre cada actualización del avance
+REPORTES_TIEMPO_ABANDONO = 300  # segundos sin avance para volver a encolar un trabajo
+REPORTES_VIGENCIA = 86400  # segundos que se conservan los archivos generados
+
+# Varios edificios (ingreso_edificio/edificios.py): cada Edificio indica en
+# base_datos el alias donde viven sus visitantes, visitas y auditoría. Las
+# bases adicionales se declaran como "alias=ruta" separados por comas, por
+# ejemplo EDIFICIOS_BASES="norte=/srv/ingreso/norte.sqlite3", y se crean con
+# "manage.py migrate --database norte"
+for _alias, _, _ruta in (
+    parte.partition('=') for parte in os.environ.get('EDIFICIOS_BASES', '').split(',') if parte.strip()
+):
+    DATABASES[_alias.strip()] = {**DATABASES['default'], 'NAME': _ruta.strip()}
+DATABASE_ROUTERS = ['ingreso_edificio.edificios.RouterEdificios']
+
+# Réplicas de lectura (ingreso_edificio/replicas.py): consultas, reportes y
+# analítica leen de la réplica de cada base si está al día. Alias principal:
+# alias de la réplica. Para copias SQLite locales basta con
+# REPLICAS_SQLITE="default=/srv/ingreso/replica.sqlite3,norte=..." y el
+# comando "manage.py sincronizar_replica --continuo"
+REPLICAS_LECTURA = {}
+for _alias, _, _ruta in (
+    parte.partition('=') for parte in os.environ.get('REPLICAS_SQLITE', '').split(',') if parte.strip()
+):
+    _alias = _alias.strip()
+    DATABASES[f'{_alias}_replica'] = {
+        **DATABASES[_alias],
+        'NAME': f'file:{_ruta.strip()}?mode=ro',
+        # Sin transaction_mode: la réplica nunca abre transacciones de escritura
+        'OPTIONS': {},
+        # En las pruebas la réplica es la misma base de prueba
+        'TEST': {'MIRROR': _alias},
+    }
+    REPLICAS_LECTURA[_alias] = f'{_alias}_replica'
+REPLICA_RETRASO_MAXIMO = 120  # segundos; una réplica más atrasada no se usa
+REPLICA_INTERVALO_SINCRONIZACION = 30  # segundos entre copias con sincronizar_replica --continuo
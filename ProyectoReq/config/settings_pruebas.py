@@ -0,0 +1,12 @@
+"""
+Ajustes para las pruebas:
+
+    python manage.py test --settings=config.settings_pruebas
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES
+
+# Base propia del edificio "sur" para las pruebas con varios edificios. Como
+# toda base SQLite de pruebas, Django la crea en memoria y no toca este NAME
+DATABASES['sur'] = {**DATABASES['default'], 'NAME': BASE_DIR / 'sur.sqlite3'}
@@ -14,10 +14,21 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from ingreso_edificio.estaticos import servir_estatico
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('ingreso_edificio.urls')),
-]
\ No newline at end of file
+]
+
+# Con DEBUG = True runserver sirve los estáticos desde las carpetas de origen
+# antes de llegar aquí. En producción, solo con ESTATICOS_SERVIR, se sirven
+# los de collectstatic
+if getattr(settings, 'ESTATICOS_SERVIR', False):
+    urlpatterns.append(
+        re_path(r'^%s(?P<ruta>.*)$' % settings.STATIC_URL.lstrip('/'), servir_estatico)
+    )
\ No newline at end of file
@@ -0,0 +1,50 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Ajustes de cada conexión SQLite (señal connection_created), tomados de
+# settings.SQLITE_PRAGMAS:
+# - journal_mode=WAL: las lecturas no bloquean a las escrituras y viceversa.
+# - synchronous=NORMAL: con WAL solo sincroniza en los checkpoints; una caída
+#   del sistema puede perder la última transacción, nunca corromper la base.
+# - busy_timeout no se fija: sqlite3 ya espera 5 s al candado (el timeout de
+#   connect, que Django no cambia salvo OPTIONS['timeout']).
+# - mmap_size, cache_size, temp_store: lecturas desde memoria en vez de
+#   llamadas read() y tablas temporales (ORDER BY, DISTINCT) en RAM.
+# Las réplicas de lectura (NAME "file:...?mode=ro") no pueden cambiar el
+# journal_mode: conservan el de la copia.
+
+PRAGMAS_PERMITIDOS = {
+    'journal_mode', 'synchronous', 'busy_timeout', 'mmap_size',
+    'cache_size', 'temp_store', 'foreign_keys', 'wal_autocheckpoint',
+}
+VALOR_VALIDO = re.compile(r'^-?\w+$')
+
+
+def sentencias_pragma(pragmas):
+    sentencias = []
+    for nombre, valor in pragmas.items():
+        valor = str(valor)
+        if nombre not in PRAGMAS_PERMITIDOS or not VALOR_VALIDO.match(valor):
+            raise ImproperlyConfigured(f'SQLITE_PRAGMAS: valor no permitido {nombre}={valor}')
+        sentencias.append(f'PRAGMA {nombre} = {valor}')
+    return sentencias
+
+
+def aplicar_pragmas(cursor, pragmas):
+    for sentencia in sentencias_pragma(pragmas):
+        cursor.execute(sentencia)
+
+
+def configurar_conexion(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if connection.is_in_memory_db():
+        # WAL y mmap no aplican a bases en memoria (pruebas)
+        pragmas = {k: v for k, v in pragmas.items() if k not in ('journal_mode', 'mmap_size')}
+    elif 'mode=ro' in str(connection.settings_dict['NAME']):
+        pragmas = {k: v for k, v in pragmas.items() if k not in ('journal_mode', 'synchronous', 'wal_autocheckpoint')}
+    with connection.cursor() as cursor:
+        aplicar_pragmas(cursor, pragmas)
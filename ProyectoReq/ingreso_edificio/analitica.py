@@ -0,0 +1,213 @@
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Sum, Window
+from django.db.models.functions import ExtractHour, Rank
+from django.utils import timezone
+
+from .edificios import obtener_edificio, pk_edificio
+from .fechas import filtro_rango
+from .models import RegistroVisita, VisitaDiaria
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Analítica de visitas calculada en la base de datos: duración promedio y
+# percentiles, llegadas por hora, apartamentos con más visitas y visitantes
+# recurrentes. Nada recorre los registros fila a fila salvo los percentiles
+# con NumPy, que leen solo la columna de duración en bloques. El resultado se
+# guarda en caché por ventana de fechas y edificios.
+#
+# Con varios edificios en bases distintas cada cálculo recibe una fuente
+# (queryset) por base y los resultados se combinan aquí: sumas, promedio
+# ponderado, máximos y rankings recortados de nuevo. Los percentiles necesitan
+# las duraciones ordenadas: se leen de cada base y se mezclan.
+
+PERCENTILES = (50, 90, 95)
+DURACION = ExpressionWrapper(F('fecha_salida') - F('fecha_entrada'), output_field=DurationField())
+
+
+def _minutos(duracion):
+    return round(duracion.total_seconds() / 60, 1) if duracion is not None else None
+
+
+def _percentiles_sql(fuentes, total):
+    # Rango más cercano: la fila floor(p * (n - 1)) en orden de duración. Una
+    # sola lectura ordenada (con varias bases, mezclando las de cada una) en
+    # lugar de un OFFSET por percentil. total viene de un conteo previo: si
+    # desde entonces hay menos visitas, los percentiles que no se alcanzan
+    # toman la última duración leída
+    posiciones = {p: (total - 1) * p // 100 for p in PERCENTILES}
+    chunk_size = getattr(settings, 'REPORTE_CSV_CHUNK_SIZE', 2000)
+    ordenadas = heapq.merge(*(
+        duraciones.order_by('duracion').values_list('duracion', flat=True).iterator(chunk_size=chunk_size)
+        for duraciones in fuentes
+    ))
+    resultado = {}
+    ultima = None
+    for indice, ultima in enumerate(ordenadas):
+        for p, posicion in posiciones.items():
+            if posicion == indice:
+                resultado[p] = ultima
+        if len(resultado) == len(posiciones):
+            break
+    if ultima is not None:
+        for p in posiciones:
+            resultado.setdefault(p, ultima)
+    return resultado
+
+
+def _percentiles_numpy(fuentes):
+    # Sin count=: entre el conteo y esta lectura pueden cerrarse más visitas
+    chunk_size = getattr(settings, 'REPORTE_CSV_CHUNK_SIZE', 2000)
+    segundos = numpy.fromiter(
+        (
+            d.total_seconds()
+            for duraciones in fuentes
+            for d in duraciones.values_list('duracion', flat=True).iterator(chunk_size=chunk_size)
+        ),
+        dtype=numpy.float64,
+    )
+    if not segundos.size:
+        return {}
+    valores = numpy.percentile(segundos, PERCENTILES, method='lower')
+    return {p: timedelta(seconds=float(v)) for p, v in zip(PERCENTILES, valores)}
+
+
+def duracion_visitas(fuentes):
+    fuentes = [registros.filter(fecha_salida__isnull=False).annotate(duracion=DURACION) for registros in fuentes]
+    resumenes = [
+        duraciones.aggregate(completadas=Count('id'), promedio=Avg('duracion'), maxima=Max('duracion'))
+        for duraciones in fuentes
+    ]
+    completadas = sum(resumen['completadas'] for resumen in resumenes)
+    promedio = maxima = None
+    percentiles = {}
+    if completadas:
+        con_visitas = [resumen for resumen in resumenes if resumen['completadas']]
+        promedio = sum((r['promedio'] * r['completadas'] for r in con_visitas), timedelta()) / completadas
+        maxima = max(r['maxima'] for r in con_visitas)
+        if numpy is not None and getattr(settings, 'ANALITICA_USAR_NUMPY', True):
+            percentiles = _percentiles_numpy(fuentes)
+        else:
+            percentiles = _percentiles_sql(fuentes, completadas)
+    return {
+        'completadas': completadas,
+        'promedio_min': _minutos(promedio),
+        'maxima_min': _minutos(maxima),
+        'percentiles_min': {f'p{p}': _minutos(valor) for p, valor in percentiles.items()},
+    }
+
+
+def llegadas_por_hora(fuentes):
+    conteos = {}
+    for registros in fuentes:
+        for hora, total in registros.annotate(
+            hora=ExtractHour('fecha_entrada', tzinfo=timezone.get_current_timezone())
+        ).values_list('hora').annotate(total=Count('id')).order_by():
+            conteos[hora] = conteos.get(hora, 0) + total
+    maximo = max(conteos.values(), default=0)
+    return [
+        {
+            'hora': hora,
+            'total': conteos.get(hora, 0),
+            'porcentaje': round(conteos.get(hora, 0) * 100 / maximo) if maximo else 0,
+        }
+        for hora in range(24)
+    ]
+
+
+def apartamentos_mas_visitados(edificios, desde, hasta, limite):
+    # Sale del resumen diario (VisitaDiaria), no de los registros. Con varios
+    # edificios el mismo número de apartamento se cuenta por separado
+    filas = []
+    varios = len(edificios) > 1
+    for edificio in edificios:
+        por_apartamento = VisitaDiaria.objects.del_edificio(edificio).filter(
+            fecha__gte=desde, fecha__lte=hasta
+        ).exclude(apartamento='').values('apartamento').annotate(
+            ingresos=Sum('ingresos'),
+            pico_ocupacion=Max('pico_ocupacion'),
+        ).order_by('-ingresos', 'apartamento')[:limite]
+        for fila in por_apartamento:
+            if varios:
+                fila['edificio'] = obtener_edificio(edificio).nombre
+            filas.append(fila)
+    filas.sort(key=lambda fila: (-fila['ingresos'], fila['apartamento']))
+    return filas[:limite]
+
+
+def _posiciones(filas, campo):
+    # Rank(): las filas empatadas comparten posición y la siguiente salta
+    for indice, fila in enumerate(filas):
+        if indice and fila[campo] == filas[indice - 1][campo]:
+            fila['posicion'] = filas[indice - 1]['posicion']
+        else:
+            fila['posicion'] = indice + 1
+    return filas
+
+
+def visitantes_recurrentes(fuentes, limite):
+    if len(fuentes) > 1:
+        # Cada base aporta su propio ranking; se mezclan y se vuelven a numerar
+        filas = [fila for registros in fuentes for fila in visitantes_recurrentes([registros], limite)]
+        filas.sort(key=lambda fila: (-fila['visitas'], fila['nombre']))
+        return _posiciones(filas[:limite], 'visitas')
+    ranking = fuentes[0].values(
+        'visitante_id', 'visitante__nombre', 'visitante__documento'
+    ).annotate(
+        visitas=Count('id'),
+        ultima_visita=Max('fecha_entrada'),
+    ).filter(visitas__gt=1).annotate(
+        posicion=Window(Rank(), order_by=F('visitas').desc())
+    ).order_by('-visitas', 'visitante__nombre')[:limite]
+    return [
+        {
+            'posicion': fila['posicion'],
+            'nombre': fila['visitante__nombre'],
+            'documento': fila['visitante__documento'],
+            'visitas': fila['visitas'],
+            'ultima_visita': fila['ultima_visita'],
+        }
+        for fila in ranking
+    ]
+
+
+def calcular_analitica(edificios, desde, hasta):
+    limite = getattr(settings, 'ANALITICA_LIMITE_RANKING', 10)
+    fuentes = [
+        registros.filter(**filtro_rango('fecha_entrada', desde, hasta))
+        for registros in RegistroVisita.objects.de_edificios(edificios)
+    ]
+    # Los visitantes son de un edificio: los distintos de cada base se suman
+    totales = [
+        registros.aggregate(visitas=Count('id'), visitantes=Count('visitante', distinct=True))
+        for registros in fuentes
+    ]
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'total_visitas': sum(t['visitas'] for t in totales),
+        'visitantes_distintos': sum(t['visitantes'] for t in totales),
+        'duracion': duracion_visitas(fuentes),
+        'llegadas_por_hora': llegadas_por_hora(fuentes),
+        'apartamentos': apartamentos_mas_visitados(edificios, desde, hasta, limite),
+        'recurrentes': visitantes_recurrentes(fuentes, limite),
+        'generado': timezone.now(),
+    }
+
+
+def obtener_analitica(edificios, desde=None, hasta=None):
+    hasta = hasta or timezone.localdate()
+    desde = desde or hasta - timedelta(days=getattr(settings, 'ANALITICA_DIAS_POR_DEFECTO', 30) - 1)
+    pks = ','.join(str(pk) for pk in sorted(pk_edificio(edificio) for edificio in edificios))
+    clave = f'analitica:{pks}:{desde.isoformat()}:{hasta.isoformat()}'
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular_analitica(edificios, desde, hasta)
+        cache.set(clave, resultado, getattr(settings, 'ANALITICA_CACHE_TIMEOUT', 600))
+    return resultado
@@ -1,6 +1,42 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+
+def asegurar_indice_fts(sender, using='default', **kwargs):
+    # Al reconstruir la tabla de visitantes (ALTER en SQLite) se pierden los
+    # triggers del índice FTS; se vuelven a crear tras cada migrate. Sin la
+    # tabla FTS (migración 0005 revertida o sin aplicar) no se toca nada.
+    from django.db import connections
+    from . import fts
+
+    connection = connections[using]
+    if fts.disponible(connection) and fts.TABLA_FTS in connection.introspection.table_names():
+        fts.instalar(connection)
 
 
 class IngresoEdificioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ingreso_edificio'
+
+    def ready(self):
+        from .ajustes_sqlite import configurar_conexion
+        from .autenticacion import usuario_guardado
+        from .edificios import edificios_cambiados
+        from .respuestas import marcar_cambio
+
+        post_migrate.connect(asegurar_indice_fts, sender=self)
+        connection_created.connect(configurar_conexion, dispatch_uid='ingreso_edificio.ajustes_sqlite')
+        usuario = self.get_model('Usuario')
+        post_save.connect(usuario_guardado, sender=usuario, dispatch_uid='ingreso_edificio.usuario_guardado')
+        post_delete.connect(usuario_guardado, sender=usuario, dispatch_uid='ingreso_edificio.usuario_eliminado')
+        # Cambios que no mueven los máximos de los validadores HTTP (respuestas.py)
+        post_save.connect(marcar_cambio, sender=usuario, dispatch_uid='ingreso_edificio.respuestas.usuario_guardado')
+        post_delete.connect(marcar_cambio, sender=usuario, dispatch_uid='ingreso_edificio.respuestas.usuario_eliminado')
+        edificio = self.get_model('Edificio')
+        post_save.connect(edificios_cambiados, sender=edificio, dispatch_uid='ingreso_edificio.edificio_guardado')
+        post_delete.connect(edificios_cambiados, sender=edificio, dispatch_uid='ingreso_edificio.edificio_eliminado')
+        post_delete.connect(
+            marcar_cambio, sender=self.get_model('Visitante'),
+            dispatch_uid='ingreso_edificio.respuestas.visitante_eliminado',
+        )
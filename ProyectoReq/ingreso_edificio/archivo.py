@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .respuestas import marcar_cambio
+from .models import AuditoriaAccion, AuditoriaAccionArchivada, RegistroVisita, RegistroVisitaArchivado
+
+# Archivo histórico: las filas más antiguas que el horizonte configurado se
+# mueven por lotes a tablas de archivo con el mismo esquema, de modo que las
+# tablas vivas (y sus índices) solo crecen con la actividad reciente. Cada
+# lote copia y borra en una transacción corta para no bloquear a recepción.
+# Las visitas abiertas nunca se archivan. Se archiva cada base de edificios
+# por separado (el archivo no cambia de edificio ni de base a las filas).
+
+ARCHIVABLES = {
+    'registros': (RegistroVisita, RegistroVisitaArchivado, 'fecha_entrada', {'fecha_salida__isnull': False}),
+    'auditoria': (AuditoriaAccion, AuditoriaAccionArchivada, 'fecha', {}),
+}
+
+
+def horizonte(dias=None):
+    if dias is None:
+        dias = getattr(settings, 'ARCHIVO_HORIZONTE_DIAS', 365)
+    return timezone.now() - timedelta(days=dias)
+
+
+def _campos(modelo):
+    return [campo.attname for campo in modelo._meta.concrete_fields]
+
+
+def pendientes(nombre, limite, using='default'):
+    modelo, _, campo_fecha, filtros = ARCHIVABLES[nombre]
+    return modelo.objects.using(using).filter(**{f'{campo_fecha}__lt': limite}, **filtros)
+
+
+def archivar(nombre, limite, tam_lote=None, al_avanzar=None, using='default'):
+    if tam_lote is None:
+        tam_lote = getattr(settings, 'ARCHIVO_TAM_LOTE', 2000)
+    modelo, archivo, campo_fecha, _ = ARCHIVABLES[nombre]
+    campos = _campos(modelo)
+    movidas = 0
+    while True:
+        with transaction.atomic(using=using):
+            filas = list(
+                pendientes(nombre, limite, using).order_by(campo_fecha, 'pk').values(*campos)[:tam_lote]
+            )
+            if not filas:
+                break
+            # ignore_conflicts: un lote interrumpido a medias se puede repetir
+            archivo.objects.using(using).bulk_create([archivo(**fila) for fila in filas], ignore_conflicts=True)
+            modelo.objects.using(using).filter(pk__in=[fila['id'] for fila in filas]).delete()
+            marcar_cambio(using=using)
+        movidas += len(filas)
+        if al_avanzar:
+            al_avanzar(nombre, movidas)
+        if len(filas) < tam_lote:
+            break
+    return movidas
+
+
+def optimizar(using='default'):
+    # Tras borrar muchas filas, PRAGMA optimize vuelve a analizar las tablas
+    # que cambiaron para que el planificador siga eligiendo los índices
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA optimize')
+
+
+def compactar(using='default'):
+    # VACUUM devuelve el espacio libre al sistema pero reescribe la base completa
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+
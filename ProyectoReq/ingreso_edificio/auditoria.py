@@ -0,0 +1,138 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .edificios import agrupar_por_base, pk_edificio
+from .models import EDIFICIO_PRINCIPAL, AuditoriaAccion, Usuario
+
+# Registro de auditoría en lotes. Los eventos se encolan en memoria cuando la
+# transacción de la petición se confirma (si se revierte, no se auditan) y se
+# escriben con un solo bulk_create al llegar a AUDITORIA_TAM_LOTE eventos o
+# cada AUDITORIA_INTERVALO_FLUSH segundos. Al terminar el proceso se vacía la
+# cola. Con AUDITORIA_MODO = 'sincrono' cada evento se escribe en el momento.
+# Cada evento se guarda en la base del edificio donde ocurrió (por defecto, el
+# del usuario), así que un lote se escribe con un bulk_create por base.
+
+logger = logging.getLogger(__name__)
+
+_cola = []
+_lock = threading.Lock()
+_despertar = threading.Event()
+_hilo = None
+
+
+def _modo():
+    return getattr(settings, 'AUDITORIA_MODO', 'buffer')
+
+
+def _tam_lote():
+    return getattr(settings, 'AUDITORIA_TAM_LOTE', 50)
+
+
+def _intervalo():
+    return getattr(settings, 'AUDITORIA_INTERVALO_FLUSH', 5)
+
+
+def registrar_auditoria(usuario, accion, modelo, id_objeto, descripcion='', ip_address=None, edificio=None):
+    if edificio is None:
+        edificio = getattr(usuario, 'edificio_id', None) or EDIFICIO_PRINCIPAL
+    evento = AuditoriaAccion(
+        edificio_id=pk_edificio(edificio),
+        usuario=usuario,
+        accion=accion,
+        modelo=modelo,
+        id_objeto=id_objeto,
+        descripcion=descripcion,
+        ip_address=ip_address,
+        fecha=timezone.now(),
+    )
+
+    if _modo() == 'sincrono':
+        evento.save()
+        return
+
+    transaction.on_commit(lambda: _encolar(evento))
+
+
+def _encolar(evento):
+    with _lock:
+        _cola.append(evento)
+        lleno = len(_cola) >= _tam_lote()
+    _iniciar_hilo()
+    if lleno:
+        _despertar.set()
+
+
+def _iniciar_hilo():
+    global _hilo
+    if _hilo is not None:
+        return
+    with _lock:
+        if _hilo is None:
+            _hilo = threading.Thread(target=_bucle, name='auditoria-flush', daemon=True)
+            _hilo.start()
+
+
+def _bucle():
+    while True:
+        _despertar.wait(_intervalo())
+        _despertar.clear()
+        close_old_connections()
+        try:
+            vaciar_auditoria()
+        except Exception:
+            logger.exception('Error al escribir el lote de auditoría')
+
+
+def vaciar_auditoria():
+    with _lock:
+        lote = _cola[:]
+        del _cola[:]
+    if not lote:
+        return 0
+
+    try:
+        _escribir_lote(lote)
+    except Exception:
+        # Se devuelven a la cola para reintentar en el siguiente ciclo, con
+        # un tope para no crecer sin límite si la base no está disponible.
+        # Los de otras bases que ya se escribieron no se repiten
+        lote = [evento for evento in lote if evento._state.adding]
+        with _lock:
+            espacio = max(_tam_lote() * 20 - len(_cola), 0)
+            _cola[:0] = lote[:espacio]
+        raise
+    return len(lote)
+
+
+def _escribir_lote(lote):
+    # Un usuario pudo eliminarse mientras su evento esperaba en la cola
+    ids = {evento.usuario_id for evento in lote if evento.usuario_id}
+    existentes = set(Usuario.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    for evento in lote:
+        if evento.usuario_id and evento.usuario_id not in existentes:
+            evento.usuario = None
+    for alias, edificios in agrupar_por_base({evento.edificio_id for evento in lote}).items():
+        eventos = [evento for evento in lote if evento.edificio_id in edificios]
+        AuditoriaAccion.objects.using(alias).bulk_create(eventos, batch_size=_tam_lote())
+
+
+def pendientes():
+    with _lock:
+        return len(_cola)
+
+
+@atexit.register
+def _vaciar_al_salir():
+    inicio = time.monotonic()
+    while pendientes() and time.monotonic() - inicio < 10:
+        try:
+            vaciar_auditoria()
+        except Exception:
+            logger.exception('No se pudo vaciar la cola de auditoría al salir')
+            break
@@ -0,0 +1,84 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.sessions.backends import cached_db
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Usuario
+
+# Usuario autenticado desde la caché: cada petición con sesión llama a
+# get_user(); en lugar de leer la tabla de usuarios se guarda la instancia
+# (rol, is_active y el hash de la contraseña, que Django necesita para
+# validar la sesión). Cualquier save() o delete() de un Usuario descarta su
+# entrada (señales conectadas en apps.py), así que editar, desactivar o
+# eliminar un usuario surte efecto en su siguiente petición.
+#
+# La sesión sigue el mismo esquema (SESSION_ENGINE = este módulo): se lee de
+# la caché y se escribe también en la base. Con una caché por proceso
+# (LocMem) el descarte solo llega al worker que atendió el cambio; los demás
+# conservan su copia como mucho USUARIO_CACHE_TIMEOUT / SESION_CACHE_TIMEOUT
+# segundos, por eso sin CACHE_REDIS_URL esos plazos son cortos.
+
+
+def clave_usuario(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def _timeout():
+    return getattr(settings, 'USUARIO_CACHE_TIMEOUT', 300)
+
+
+def descartar_usuario(usuario_id):
+    clave = clave_usuario(usuario_id)
+    cache.delete(clave)
+    # Otra petición pudo guardar el estado anterior antes de confirmar
+    transaction.on_commit(lambda: cache.delete(clave))
+
+
+def usuario_guardado(sender, instance, **kwargs):
+    descartar_usuario(instance.pk)
+
+
+class BackendUsuarioCacheado(ModelBackend):
+    def get_user(self, user_id):
+        clave = clave_usuario(user_id)
+        usuario = cache.get(clave)
+        if usuario is None:
+            try:
+                usuario = Usuario._default_manager.get(pk=user_id)
+            except Usuario.DoesNotExist:
+                return None
+            cache.set(clave, usuario, _timeout())
+        return usuario if self.user_can_authenticate(usuario) else None
+
+    async def aget_user(self, user_id):
+        # request.auser() (vistas asíncronas) llama a aget_user, que en
+        # ModelBackend consulta la tabla sin pasar por get_user
+        return await sync_to_async(self.get_user)(user_id)
+
+
+class _CacheConTope:
+    # Caché de sesiones cuyas entradas no duran más de SESION_CACHE_TIMEOUT
+    # (cached_db las guarda por toda la vida de la sesión)
+    def __init__(self, cache, tope):
+        self._cache = cache
+        self._tope = tope
+
+    def __getattr__(self, nombre):
+        return getattr(self._cache, nombre)
+
+    def __contains__(self, clave):
+        return clave in self._cache
+
+    def set(self, clave, valor, timeout):
+        self._cache.set(clave, valor, min(timeout, self._tope))
+
+    async def aset(self, clave, valor, timeout):
+        await self._cache.aset(clave, valor, min(timeout, self._tope))
+
+
+class SessionStore(cached_db.SessionStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = _CacheConTope(self._cache, getattr(settings, 'SESION_CACHE_TIMEOUT', 300))
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+from . import fts
+from .edificios import base_de, comparte_base
+from .models import Visitante, normalizar_texto
+
+# Límite superior para rangos de prefijo: mayor que cualquier carácter UTF-8
+FIN_PREFIJO = '\U0010ffff'
+
+
+def rango_prefijo(campo, prefijo):
+    # "campo >= prefijo AND campo < prefijo + FIN" recorre solo el tramo del
+    # índice que empieza por el prefijo; LIKE 'x%' no usa el índice en SQLite
+    # porque es insensible a mayúsculas y Django le agrega ESCAPE.
+    return {f'{campo}__gte': prefijo, f'{campo}__lt': prefijo + FIN_PREFIJO}
+
+
+def buscar_visitantes_por_prefijo(texto, limite=None, queryset=None):
+    if limite is None:
+        limite = getattr(settings, 'AUTOCOMPLETAR_LIMITE', 10)
+    if queryset is None:
+        queryset = Visitante.objects.all()
+
+    texto = (texto or '').strip()
+    if not texto:
+        return []
+
+    campos = ('id', 'nombre', 'documento')
+    resultados = list(
+        queryset.filter(**rango_prefijo('documento', texto))
+        .order_by('documento')
+        .values(*campos)[:limite]
+    )
+
+    nombre = normalizar_texto(texto)
+    if nombre and len(resultados) < limite:
+        vistos = {r['id'] for r in resultados}
+        por_nombre = (
+            queryset.filter(**rango_prefijo('nombre_normalizado', nombre))
+            .order_by('nombre_normalizado')
+            .values(*campos)[:limite]
+        )
+        for fila in por_nombre:
+            if fila['id'] not in vistos:
+                resultados.append(fila)
+                if len(resultados) >= limite:
+                    break
+
+    return resultados
+
+
+def buscar_visitantes_texto(texto, edificio, limite=None):
+    # Búsqueda por relevancia con FTS5 (sin tildes, por prefijo de palabra)
+    # en la base del edificio; en motores sin FTS5 se conserva el filtro
+    # icontains original.
+    if limite is None:
+        limite = getattr(settings, 'BUSQUEDA_LIMITE', 100)
+
+    visitantes = Visitante.objects.del_edificio(edificio)
+    connection = connections[base_de(edificio)]
+    if not fts.disponible(connection):
+        return list(visitantes.filter(Q(nombre__icontains=texto) | Q(documento__icontains=texto))[:limite])
+
+    ids = fts.buscar_ids(connection, texto, limite, edificio if comparte_base(edificio) else None)
+    encontrados = visitantes.in_bulk(ids)
+    return [encontrados[pk] for pk in ids if pk in encontrados]
@@ -0,0 +1,192 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import ocupacion, resumen_diario
+from .edificios import base_de, pk_edificio
+from .estadisticas import invalidar_estadisticas
+from .models import EDIFICIO_PRINCIPAL, AuditoriaAccion, RegistroVisita, Usuario, Visitante, normalizar_texto
+
+# Generador de datos sintéticos reproducible (misma semilla, mismos datos)
+# para el comando bench y las pruebas de presupuesto de consultas. Inserta con
+# bulk_create por lotes y deja coherentes los derivados: contador de
+# ocupación, resumen diario y estadísticas.
+
+NOMBRES = [
+    'Ana', 'Andrés', 'Camila', 'Carlos', 'Daniela', 'David', 'Felipe', 'Juliana',
+    'Laura', 'Luis', 'María', 'Mateo', 'Natalia', 'Santiago', 'Sofía', 'Valentina',
+]
+APELLIDOS = [
+    'Álvarez', 'Castro', 'Díaz', 'Gómez', 'González', 'Hernández', 'López', 'Martínez',
+    'Muñoz', 'Ortiz', 'Pérez', 'Ramírez', 'Rodríguez', 'Sánchez', 'Torres', 'Vargas',
+]
+MOTIVOS = ['Visita familiar', 'Domicilio', 'Mantenimiento', 'Reunión', 'Entrega de paquete', 'Mudanza']
+ACCIONES = [accion for accion, _ in AuditoriaAccion.ACCIONES]
+
+ESCALAS = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def parsear_escala(valor):
+    valor = str(valor).strip().lower()
+    if valor in ESCALAS:
+        return ESCALAS[valor]
+    if valor.endswith('k'):
+        return int(float(valor[:-1]) * 1_000)
+    if valor.endswith('m'):
+        return int(float(valor[:-1]) * 1_000_000)
+    return int(valor)
+
+
+@contextmanager
+def fechas_manuales(*campos):
+    # auto_now/auto_now_add pisan las fechas generadas en bulk_create
+    originales = [(campo, campo.auto_now, campo.auto_now_add) for campo in campos]
+    for campo in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in originales:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+def _por_lotes(generador, tam_lote):
+    lote = []
+    for objeto in generador:
+        lote.append(objeto)
+        if len(lote) >= tam_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def crear_usuarios(aleatorio, cantidad, ahora):
+    clave = make_password(None)
+    usuarios = [
+        Usuario(
+            username=f'recepcion{i:03d}',
+            password=clave,
+            first_name=aleatorio.choice(NOMBRES),
+            last_name=aleatorio.choice(APELLIDOS),
+            rol='recepcionista' if i else 'administrador',
+            documento=f'9{i:09d}',
+            fecha_creacion=ahora,
+            fecha_actualizacion=ahora,
+        )
+        for i in range(cantidad)
+    ]
+    modelo = Usuario._meta
+    with fechas_manuales(modelo.get_field('fecha_creacion'), modelo.get_field('fecha_actualizacion')):
+        Usuario.objects.bulk_create(usuarios)
+    return list(Usuario.objects.filter(username__startswith='recepcion').order_by('id').values_list('id', flat=True))
+
+
+def _visitantes(aleatorio, edificio_id, cantidad, apartamentos, inicio, dias):
+    for i in range(cantidad):
+        nombre = f'{aleatorio.choice(NOMBRES)} {aleatorio.choice(APELLIDOS)} {aleatorio.choice(APELLIDOS)}'
+        registro = inicio + timedelta(seconds=aleatorio.randrange(dias * 86400))
+        yield Visitante(
+            edificio_id=edificio_id,
+            nombre=nombre,
+            nombre_normalizado=normalizar_texto(nombre),
+            tipo_documento=aleatorio.choice(['CC', 'CC', 'CC', 'CE', 'PP', 'TI']),
+            documento=str(10_000_000 + i),
+            telefono=f'3{aleatorio.randrange(10**9):09d}',
+            motivo_visita=aleatorio.choice(MOTIVOS),
+            apartamento_visitado=aleatorio.choice(apartamentos),
+            persona_a_visitar=f'{aleatorio.choice(NOMBRES)} {aleatorio.choice(APELLIDOS)}',
+            fecha_registro=registro,
+            fecha_actualizacion=registro,
+        )
+
+
+def _visitas(aleatorio, edificio_id, cantidad, visitante_ids, usuario_ids, inicio, dias, ahora):
+    # Entradas ordenadas en el tiempo, con más tráfico de día que de noche
+    paso = dias * 86400 / max(cantidad, 1)
+    for i in range(cantidad):
+        entrada = inicio + timedelta(seconds=i * paso + aleatorio.random() * paso)
+        if timezone.localtime(entrada).hour < 5 and aleatorio.random() < 0.7:
+            entrada += timedelta(hours=8)
+        entrada = min(entrada, ahora)
+        salida = entrada + timedelta(minutes=aleatorio.lognormvariate(3.8, 0.7))
+        # Las visitas de las últimas horas pueden seguir abiertas
+        if salida > ahora or (ahora - entrada < timedelta(hours=4) and aleatorio.random() < 0.5):
+            salida = None
+        yield RegistroVisita(
+            edificio_id=edificio_id,
+            visitante_id=aleatorio.choice(visitante_ids),
+            fecha_entrada=entrada,
+            fecha_salida=salida,
+            registrado_por_id=aleatorio.choice(usuario_ids),
+        )
+
+
+def _auditorias(aleatorio, edificio_id, cantidad, usuario_ids, inicio, dias):
+    for _ in range(cantidad):
+        yield AuditoriaAccion(
+            edificio_id=edificio_id,
+            usuario_id=aleatorio.choice(usuario_ids),
+            accion=aleatorio.choice(ACCIONES),
+            modelo=aleatorio.choice(['Visitante', 'RegistroVisita', 'Usuario']),
+            id_objeto=aleatorio.randrange(1, 100_000),
+            fecha=inicio + timedelta(seconds=aleatorio.randrange(dias * 86400)),
+        )
+
+
+def generar_datos(visitas, semilla=42, visitantes=None, auditorias=None, usuarios=5,
+                  apartamentos=200, dias=365, tam_lote=5000, al_avanzar=None, edificio=EDIFICIO_PRINCIPAL):
+    # Los datos se crean en la base del edificio; los usuarios, en la principal
+    aleatorio = random.Random(semilla)
+    edificio_id = pk_edificio(edificio)
+    alias = base_de(edificio)
+    visitantes = visitantes if visitantes is not None else max(visitas // 10, 1)
+    auditorias = auditorias if auditorias is not None else visitas // 2
+    ahora = timezone.now()
+    inicio = ahora - timedelta(days=dias)
+    lista_apartamentos = [f'{piso}{puerta:02d}' for piso in range(1, 41) for puerta in range(1, 11)][:apartamentos]
+
+    def avanzar(etapa, cantidad):
+        if al_avanzar:
+            al_avanzar(etapa, cantidad)
+
+    usuario_ids = crear_usuarios(aleatorio, usuarios, ahora)
+
+    modelo = Visitante._meta
+    with fechas_manuales(modelo.get_field('fecha_registro'), modelo.get_field('fecha_actualizacion')):
+        creados = 0
+        for lote in _por_lotes(_visitantes(aleatorio, edificio_id, visitantes, lista_apartamentos, inicio, dias), tam_lote):
+            with transaction.atomic(using=alias):
+                Visitante.objects.using(alias).bulk_create(lote)
+            creados += len(lote)
+            avanzar('visitantes', creados)
+    visitante_ids = list(Visitante.objects.del_edificio(edificio).order_by('id').values_list('id', flat=True))
+
+    with fechas_manuales(RegistroVisita._meta.get_field('fecha_entrada')):
+        creados = 0
+        for lote in _por_lotes(_visitas(aleatorio, edificio_id, visitas, visitante_ids, usuario_ids, inicio, dias, ahora), tam_lote):
+            with transaction.atomic(using=alias):
+                RegistroVisita.objects.using(alias).bulk_create(lote)
+            creados += len(lote)
+            avanzar('visitas', creados)
+
+    creados = 0
+    for lote in _por_lotes(_auditorias(aleatorio, edificio_id, auditorias, usuario_ids, inicio, dias), tam_lote):
+        with transaction.atomic(using=alias):
+            AuditoriaAccion.objects.using(alias).bulk_create(lote)
+        creados += len(lote)
+        avanzar('auditorias', creados)
+
+    ocupacion.recalcular_ocupacion(edificio)
+    resumen_diario.recalcular_rango(edificio)
+    invalidar_estadisticas()
+    return {
+        'usuarios': len(usuario_ids),
+        'visitantes': len(visitante_ids),
+        'visitas': visitas,
+        'auditorias': auditorias,
+    }
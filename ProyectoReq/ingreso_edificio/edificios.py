@@ -0,0 +1,199 @@
+import threading
+
+from django.core.cache import cache
+
+from .models import EDIFICIO_PRINCIPAL
+from .replicas import alias_lectura, replicas
+
+# Varios edificios, cada uno con sus datos en la base de datos que indique
+# Edificio.base_datos. Visitantes, visitas, auditoría, ocupación y resumen
+# diario viajan juntos (los JOIN entre ellos nunca cruzan bases); edificios,
+# usuarios, sesiones y reportes quedan en 'default'.
+#
+# Varios edificios pueden compartir una base: entonces cada consulta filtra
+# por edificio. Un edificio con base propia no necesita el filtro y sus
+# consultas son las mismas que con un solo edificio.
+#
+# La tabla de edificios cambia muy poco: se guarda en memoria del proceso y
+# una versión en la caché avisa a los demás procesos de que la vuelvan a leer
+# tras un alta o un cambio de base. Eso requiere una caché compartida
+# (CACHE_REDIS_URL); con la caché local de cada proceso, reiniciar los workers
+# tras editar edificios.
+
+CLAVE_VERSION = 'edificios:version'
+CLAVE_SESION = 'edificio_id'
+# Valor de la sesión para "Todos los edificios" (solo administradores)
+TODOS = 'todos'
+
+# Modelos cuyas filas viven en la base de su edificio
+MODELOS_POR_EDIFICIO = {
+    'visitante', 'registrovisita', 'registrovisitaarchivado',
+    'auditoriaaccion', 'auditoriaaccionarchivada', 'ocupacion', 'visitadiaria',
+}
+
+_lock = threading.Lock()
+_memoria = {'version': None, 'edificios': None}
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Caché vaciada: se conserva lo que ya tiene el proceso
+        version = _memoria['version'] or 1
+        cache.add(CLAVE_VERSION, version, None)
+    return version
+
+
+def edificios_por_pk():
+    from .models import Edificio
+
+    version = _version()
+    with _lock:
+        if _memoria['edificios'] is None or _memoria['version'] != version:
+            _memoria['edificios'] = {edificio.pk: edificio for edificio in Edificio.objects.using('default')}
+            _memoria['version'] = version
+        return _memoria['edificios']
+
+
+def edificios_cambiados(**kwargs):
+    # Receptor de post_save / post_delete de Edificio
+    olvidar_edificios()
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, 1, None)
+
+
+def olvidar_edificios():
+    with _lock:
+        _memoria['edificios'] = None
+
+
+def pk_edificio(edificio):
+    return getattr(edificio, 'pk', edificio)
+
+
+def obtener_edificio(edificio):
+    return edificios_por_pk()[pk_edificio(edificio)]
+
+
+def edificio_por_codigo(codigo):
+    # Para los comandos de gestión (--edificio CODIGO)
+    return next((edificio for edificio in edificios_por_pk().values() if edificio.codigo == codigo), None)
+
+
+def edificios_activos():
+    return [edificio for edificio in edificios_por_pk().values() if edificio.activo]
+
+
+def base_de(edificio):
+    edificio = edificios_por_pk().get(pk_edificio(edificio))
+    return edificio.base_datos if edificio else 'default'
+
+
+def comparte_base(edificio):
+    alias = base_de(edificio)
+    return sum(1 for otro in edificios_por_pk().values() if otro.base_datos == alias) > 1
+
+
+def agrupar_por_base(edificios):
+    grupos = {}
+    for edificio in edificios:
+        grupos.setdefault(base_de(edificio), []).append(pk_edificio(edificio))
+    return grupos
+
+
+def bases_de_edificios():
+    return sorted({edificio.base_datos for edificio in edificios_por_pk().values()} | {'default'})
+
+
+# ===== EDIFICIO DE LA PETICIÓN =====
+
+def edificio_actual(request):
+    # Recepción trabaja en su edificio; un administrador sin edificio asignado
+    # elige uno (o todos) en el menú y, mientras tanto, registra en el principal
+    edificios = edificios_por_pk()
+    usuario = request.user
+    if usuario.edificio_id in edificios:
+        return edificios[usuario.edificio_id]
+    elegido = request.session.get(CLAVE_SESION)
+    if elegido in edificios:
+        return edificios[elegido]
+    return edificios.get(EDIFICIO_PRINCIPAL) or next(iter(edificios.values()))
+
+
+def puede_elegir_edificio(usuario):
+    return usuario.is_authenticated and usuario.rol == 'administrador' and usuario.edificio_id is None
+
+
+def todos_los_edificios(request):
+    return puede_elegir_edificio(request.user) and request.session.get(CLAVE_SESION) == TODOS
+
+
+def edificios_consultados(request):
+    # Edificios de los listados y reportes: todos los activos si un
+    # administrador eligió "Todos los edificios"
+    if todos_los_edificios(request):
+        return edificios_activos()
+    return [edificio_actual(request)]
+
+
+def contexto(request):
+    # Context processor: edificio actual y, para quien puede cambiarlo, la lista
+    if not getattr(request, 'user', None) or not request.user.is_authenticated:
+        return {}
+    return {
+        'edificio_actual': edificio_actual(request),
+        'edificios_disponibles': edificios_activos() if puede_elegir_edificio(request.user) else [],
+        'todos_los_edificios': todos_los_edificios(request),
+    }
+
+
+# ===== ENRUTADOR =====
+
+class RouterEdificios:
+    """Dirige los modelos de MODELOS_POR_EDIFICIO a la base de su edificio.
+
+    Las escrituras y las relaciones desde una instancia usan el edificio de
+    esa instancia; las consultas sin instancia (Modelo.objects...) van a
+    'default' salvo que usen del_edificio() / de_edificios() o .using().
+    """
+
+    def _base(self, model, instance=None, **hints):
+        if model._meta.app_label != 'ingreso_edificio':
+            return None
+        if model._meta.model_name not in MODELOS_POR_EDIFICIO:
+            # Usuarios, edificios y reportes: siempre en la base principal,
+            # también cuando se llega a ellos desde una fila de otra base
+            return 'default'
+        # instance puede ser request.user (SimpleLazyObject): _meta se delega.
+        # edificio_id se lee sin consultar: si estuviera diferido (.only()),
+        # cargarlo volvería a preguntar al enrutador sin fin
+        if instance is not None and instance._meta.model_name in MODELOS_POR_EDIFICIO:
+            edificio_id = instance.__dict__.get('edificio_id')
+            if edificio_id is not None:
+                return base_de(edificio_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        alias = self._base(model, **hints)
+        if model._meta.model_name in MODELOS_POR_EDIFICIO:
+            return alias_lectura(alias or 'default')
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return self._base(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las relaciones con usuarios y edificios cruzan bases a propósito
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas().values():
+            # Las réplicas son copias: se actualizan desde su base principal
+            return False
+        if model_name is None:
+            return None
+        if app_label == 'ingreso_edificio' and model_name in MODELOS_POR_EDIFICIO:
+            return True
+        return db == 'default'
@@ -0,0 +1,196 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import ocupacion
+from .edificios import base_de, pk_edificio
+from .fechas import filtro_rango
+from .models import RegistroVisita, Usuario, Visitante
+
+# Estadísticas del dashboard en la caché de Django. Los contadores se ajustan
+# con incr/decr desde los caminos de escritura (entrada, salida, alta de
+# visitantes y usuarios) una vez confirmada la transacción; si una clave no
+# está en caché se calcula desde la base de datos y se guarda. Las claves son
+# por edificio (salvo los usuarios activos, que son globales) y llevan la
+# versión actual, así que invalidar_estadisticas() descarta el conjunto
+# completo con un solo incremento.
+#
+# aobtener_estadisticas() es la variante para vistas asíncronas: los cálculos
+# faltantes se lanzan juntos con el ORM asíncrono en lugar de uno tras otro,
+# y mientras esperan a la base el event loop sigue atendiendo otras pantallas.
+
+CLAVE_VERSION = 'estadisticas:version'
+CLAVE_USUARIOS_ACTIVOS = 'estadisticas:usuarios_activos'
+
+
+def _timeout():
+    return getattr(settings, 'ESTADISTICAS_CACHE_TIMEOUT', 300)
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, 1, None)
+        version = cache.get(CLAVE_VERSION, 1)
+    return version
+
+
+def _claves(edificio, hoy):
+    prefijo = f'estadisticas:{pk_edificio(edificio)}'
+    return {
+        'total_visitantes': f'{prefijo}:total_visitantes',
+        'ingresos_hoy': f'{prefijo}:ingresos:{hoy.isoformat()}',
+        'egresos_hoy': f'{prefijo}:egresos:{hoy.isoformat()}',
+        'usuarios_activos': CLAVE_USUARIOS_ACTIVOS,
+        'en_edificio': f'{prefijo}:en_edificio',
+        'ultimas_visitas': f'{prefijo}:ultimas_visitas',
+    }
+
+
+async def _aversion():
+    version = await cache.aget(CLAVE_VERSION)
+    if version is None:
+        await cache.aadd(CLAVE_VERSION, 1, None)
+        version = await cache.aget(CLAVE_VERSION, 1)
+    return version
+
+
+def _filas_ultimas_visitas(edificio):
+    return RegistroVisita.objects.del_edificio(edificio).values_list(
+        'visitante__nombre',
+        'visitante__documento',
+        'fecha_entrada',
+        'fecha_salida',
+    )[:10]
+
+
+def _visita(fila):
+    nombre, documento, fecha_entrada, fecha_salida = fila
+    return {
+        'visitante': {'nombre': nombre, 'documento': documento},
+        'fecha_entrada': fecha_entrada,
+        'fecha_salida': fecha_salida,
+    }
+
+
+def _ultimas_visitas(edificio):
+    return [_visita(fila) for fila in _filas_ultimas_visitas(edificio)]
+
+
+async def _aultimas_visitas(edificio):
+    # No aiterator(): con values_list Django ejecuta la consulta al crearlo,
+    # dentro del event loop; iterar el queryset la lleva a un hilo
+    return [_visita(fila) async for fila in _filas_ultimas_visitas(edificio)]
+
+
+def _registros(edificio, campo, hoy):
+    return RegistroVisita.objects.del_edificio(edificio).filter(**filtro_rango(campo, hoy, hoy))
+
+
+CALCULOS = {
+    'total_visitantes': lambda edificio, hoy: Visitante.objects.del_edificio(edificio).count(),
+    'ingresos_hoy': lambda edificio, hoy: _registros(edificio, 'fecha_entrada', hoy).count(),
+    'egresos_hoy': lambda edificio, hoy: _registros(edificio, 'fecha_salida', hoy).count(),
+    'usuarios_activos': lambda edificio, hoy: Usuario.objects.filter(is_active=True).count(),
+    'en_edificio': lambda edificio, hoy: ocupacion.personas_dentro(edificio),
+    'ultimas_visitas': lambda edificio, hoy: _ultimas_visitas(edificio),
+}
+
+# Mismos cálculos con el ORM asíncrono; cada uno devuelve una corrutina
+CALCULOS_ASYNC = {
+    'total_visitantes': lambda edificio, hoy: Visitante.objects.del_edificio(edificio).acount(),
+    'ingresos_hoy': lambda edificio, hoy: _registros(edificio, 'fecha_entrada', hoy).acount(),
+    'egresos_hoy': lambda edificio, hoy: _registros(edificio, 'fecha_salida', hoy).acount(),
+    'usuarios_activos': lambda edificio, hoy: Usuario.objects.filter(is_active=True).acount(),
+    'en_edificio': lambda edificio, hoy: sync_to_async(ocupacion.personas_dentro)(edificio),
+    'ultimas_visitas': lambda edificio, hoy: _aultimas_visitas(edificio),
+}
+
+
+def obtener_estadisticas(edificio):
+    hoy = timezone.localdate()
+    version = _version()
+    claves = _claves(edificio, hoy)
+
+    en_cache = cache.get_many(claves.values(), version=version)
+    resultado = {}
+    faltantes = {}
+    for nombre, clave in claves.items():
+        if clave in en_cache:
+            resultado[nombre] = en_cache[clave]
+        else:
+            resultado[nombre] = faltantes[clave] = CALCULOS[nombre](edificio, hoy)
+
+    if faltantes:
+        cache.set_many(faltantes, _timeout(), version=version)
+    return resultado
+
+
+async def aobtener_estadisticas(edificio):
+    hoy = timezone.localdate()
+    version = await _aversion()
+    claves = _claves(edificio, hoy)
+
+    en_cache = await cache.aget_many(claves.values(), version=version)
+    resultado = {nombre: en_cache[clave] for nombre, clave in claves.items() if clave in en_cache}
+    nombres = [nombre for nombre in claves if nombre not in resultado]
+    valores = await asyncio.gather(*(CALCULOS_ASYNC[nombre](edificio, hoy) for nombre in nombres))
+    resultado.update(zip(nombres, valores))
+
+    if nombres:
+        await cache.aset_many({claves[nombre]: resultado[nombre] for nombre in nombres}, _timeout(), version=version)
+    return {nombre: resultado[nombre] for nombre in claves}
+
+
+def _al_confirmar(funcion, edificio=None):
+    # Solo se toca la caché si la escritura se confirma (en la base del edificio)
+    transaction.on_commit(funcion, using=base_de(edificio) if edificio is not None else None)
+
+
+def _ajustar(edificio, nombre, delta):
+    clave = _claves(edificio, timezone.localdate())[nombre]
+
+    def aplicar():
+        try:
+            cache.incr(clave, delta, version=_version())
+        except ValueError:
+            # La clave no está en caché: la próxima lectura la calcula
+            pass
+
+    _al_confirmar(aplicar, edificio)
+
+
+def _descartar(edificio, nombre):
+    clave = _claves(edificio, timezone.localdate())[nombre]
+    _al_confirmar(lambda: cache.delete(clave, version=_version()), edificio)
+
+
+def visita_registrada(edificio, cantidad=1):
+    _ajustar(edificio, 'ingresos_hoy', cantidad)
+    _ajustar(edificio, 'en_edificio', cantidad)
+    _descartar(edificio, 'ultimas_visitas')
+
+
+def salida_registrada(edificio, cantidad=1):
+    _ajustar(edificio, 'egresos_hoy', cantidad)
+    _ajustar(edificio, 'en_edificio', -cantidad)
+    _descartar(edificio, 'ultimas_visitas')
+
+
+def visitante_registrado(edificio, cantidad=1):
+    _ajustar(edificio, 'total_visitantes', cantidad)
+
+
+def usuarios_modificados():
+    _al_confirmar(lambda: cache.delete(CLAVE_USUARIOS_ACTIVOS, version=_version()))
+
+
+def invalidar_estadisticas():
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, 1, None)
@@ -0,0 +1,129 @@
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+from .respuestas import codificaciones_aceptadas
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Archivos estáticos con huella y precomprimidos. collectstatic copia cada
+# archivo con el hash de su contenido en el nombre (styles.3f2a9c.css), y
+# junto a los de texto deja variantes .gz y .br (esta solo si el paquete
+# brotli está instalado). servir_estatico entrega la variante que acepta el
+# navegador; los nombres con hash nunca cambian de contenido, así que se
+# sirven con Cache-Control immutable por un año.
+
+EXTENSIONES_COMPRIMIBLES = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+
+# Orden de preferencia al negociar Accept-Encoding
+CODIFICACIONES = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _comprimir_gzip(datos):
+    # mtime=0: el mismo archivo produce siempre el mismo .gz
+    return gzip.compress(datos, compresslevel=9, mtime=0)
+
+
+def _comprimir_brotli(datos):
+    return brotli.compress(datos, quality=11)
+
+
+def compresores():
+    lista = [('.gz', _comprimir_gzip)]
+    if brotli is not None:
+        lista.insert(0, ('.br', _comprimir_brotli))
+    return lista
+
+
+class AlmacenamientoComprimido(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        # Después del manifiesto: se comprimen los nombres con hash y los originales
+        for nombre in list(paths) + list(self.hashed_files.values()):
+            self.comprimir(nombre)
+
+    def comprimir(self, nombre):
+        if not nombre.endswith(EXTENSIONES_COMPRIMIBLES):
+            return
+        ruta = self.path(nombre)
+        if not os.path.exists(ruta):
+            return
+        with open(ruta, 'rb') as archivo:
+            datos = archivo.read()
+        if len(datos) < getattr(settings, 'ESTATICOS_TAMANO_MINIMO_COMPRESION', 512):
+            return
+        for extension, comprimir in compresores():
+            comprimido = comprimir(datos)
+            # Una variante que no ahorra nada solo añade una lectura al servir
+            if len(comprimido) < len(datos):
+                with open(ruta + extension, 'wb') as archivo:
+                    archivo.write(comprimido)
+
+    def stored_name(self, name):
+        # Sin collectstatic no hay manifiesto. En desarrollo se usa el nombre
+        # original; en producción falla como ManifestStaticFilesStorage en
+        # lugar de servir nombres sin hash (ESTATICOS_MANIFIESTO_ESTRICTO)
+        if not self.hashed_files and not getattr(settings, 'ESTATICOS_MANIFIESTO_ESTRICTO', not settings.DEBUG):
+            return name
+        return super().stored_name(name)
+
+
+# ===== SERVIR =====
+
+def elegir_codificacion(cabecera, disponibles):
+    # La de mayor peso entre las disponibles; a igual peso, el orden de CODIFICACIONES
+    pesos = codificaciones_aceptadas(cabecera)
+    candidatas = [
+        (pesos.get(nombre, pesos.get('*', 0.0)), -orden, nombre)
+        for orden, (nombre, _) in enumerate(CODIFICACIONES)
+        if nombre in disponibles
+    ]
+    peso, _, nombre = max(candidatas, default=(0.0, 0, None))
+    return nombre if peso > 0 else None
+
+
+def tiene_hash(nombre):
+    # El manifiesto tiene pocas decenas de entradas
+    return nombre in getattr(staticfiles_storage, 'hashed_files', {}).values()
+
+
+def cache_control(nombre):
+    if tiene_hash(nombre):
+        return f"public, max-age={getattr(settings, 'ESTATICOS_MAX_AGE', 31536000)}, immutable"
+    # Sin hash el contenido puede cambiar con el siguiente despliegue
+    return 'public, max-age=0, must-revalidate'
+
+
+@require_safe
+def servir_estatico(request, ruta):
+    if not settings.STATIC_ROOT:
+        raise Http404
+    # safe_join rechaza rutas fuera de STATIC_ROOT (SuspiciousFileOperation → 400)
+    completo = safe_join(settings.STATIC_ROOT, ruta)
+    if not os.path.isfile(completo):
+        raise Http404
+
+    extensiones = dict(CODIFICACIONES)
+    disponibles = {nombre for nombre, extension in CODIFICACIONES if os.path.isfile(completo + extension)}
+    codificacion = elegir_codificacion(request.headers.get('Accept-Encoding', ''), disponibles)
+    archivo = completo + extensiones[codificacion] if codificacion else completo
+
+    tipo, _ = mimetypes.guess_type(completo)
+    response = FileResponse(open(archivo, 'rb'), content_type=tipo or 'application/octet-stream')
+    if codificacion:
+        response['Content-Encoding'] = codificacion
+    response['Cache-Control'] = cache_control(ruta)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
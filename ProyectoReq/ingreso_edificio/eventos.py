@@ -0,0 +1,172 @@
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import estadisticas
+from .edificios import base_de, pk_edificio
+
+# Eventos en vivo para los dashboards (Server-Sent Events). Hay un único
+# canal por proceso: las entradas y salidas registradas en este proceso se
+# publican al confirmar la transacción, cada evento se serializa una sola vez
+# y se reparte a la cola de cada pantalla conectada al mismo edificio. Para
+# los cambios hechos en otros procesos (otros workers, comandos) un único
+# sondeo por proceso revisa los contadores de los edificios con pantallas
+# conectadas, en lugar de que cada pantalla recargue el dashboard. Los
+# contadores viven en la caché: solo con una caché compartida
+# (CACHE_REDIS_URL) el sondeo ve lo registrado en otros procesos.
+#
+# Los publicadores pueden correr en cualquier hilo (vistas síncronas,
+# sync_to_async); las colas viven en el event loop del servidor ASGI y se
+# alimentan con call_soon_threadsafe.
+
+
+def _ajuste(nombre, por_defecto):
+    return getattr(settings, nombre, por_defecto)
+
+
+def formato_sse(tipo, datos):
+    return f'event: {tipo}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n'.encode('utf-8')
+
+
+def contadores(edificio):
+    datos = estadisticas.obtener_estadisticas(edificio)
+    return {clave: datos[clave] for clave in ('en_edificio', 'ingresos_hoy', 'egresos_hoy', 'total_visitantes')}
+
+
+class Suscripcion:
+    def __init__(self, loop, tam_cola, edificio):
+        self.loop = loop
+        self.cola = asyncio.Queue(maxsize=tam_cola)
+        self.edificio = edificio
+
+    def entregar(self, evento):
+        # Corre en el loop. Una pantalla lenta pierde los eventos más viejos
+        # en lugar de acumular memoria; los contadores llegan siempre completos
+        if self.cola.full():
+            self.cola.get_nowait()
+        self.cola.put_nowait(evento)
+
+
+class CanalEventos:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones = set()
+        self._sondeos = {}
+        # edificio (pk): últimos contadores publicados
+        self._ultimos_contadores = {}
+
+    def hay_suscriptores(self, edificio):
+        edificio = pk_edificio(edificio)
+        return any(s.edificio == edificio for s in list(self._suscripciones))
+
+    def suscribir(self, edificio):
+        loop = asyncio.get_running_loop()
+        suscripcion = Suscripcion(loop, _ajuste('EVENTOS_COLA_MAXIMA', 100), pk_edificio(edificio))
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+            if loop not in self._sondeos:
+                self._sondeos[loop] = loop.create_task(self._sondear(loop))
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+            if not any(s.edificio == suscripcion.edificio for s in self._suscripciones):
+                # Sin pantallas nadie los mantiene al día: la siguiente que se
+                # conecte no debe partir de contadores de hace horas
+                self._ultimos_contadores.pop(suscripcion.edificio, None)
+
+    def publicar(self, edificio, tipo, datos):
+        edificio = pk_edificio(edificio)
+        evento = formato_sse(tipo, datos)
+        with self._lock:
+            suscripciones = [s for s in self._suscripciones if s.edificio == edificio]
+        for suscripcion in suscripciones:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion.entregar, evento)
+            except RuntimeError:
+                # El loop ya se cerró (servidor detenido)
+                self.cancelar(suscripcion)
+
+    def publicar_contadores(self, edificio, valores):
+        edificio = pk_edificio(edificio)
+        with self._lock:
+            if valores == self._ultimos_contadores.get(edificio):
+                return
+            self._ultimos_contadores[edificio] = valores
+        self.publicar(edificio, 'contadores', valores)
+
+    def ultimos_contadores(self, edificio):
+        return self._ultimos_contadores.get(pk_edificio(edificio))
+
+    async def _sondear(self, loop):
+        intervalo = _ajuste('EVENTOS_INTERVALO_SONDEO', 5)
+        while True:
+            await asyncio.sleep(intervalo)
+            with self._lock:
+                edificios = {s.edificio for s in self._suscripciones if s.loop is loop}
+                if not edificios:
+                    del self._sondeos[loop]
+                    return
+            for edificio in edificios:
+                try:
+                    self.publicar_contadores(edificio, await sync_to_async(contadores)(edificio))
+                except Exception:
+                    # Un fallo puntual de la base no debe detener el canal
+                    continue
+
+
+canal = CanalEventos()
+
+
+# ===== PUBLICACIÓN DESDE LOS CAMINOS DE ESCRITURA =====
+
+def _visitante(registro):
+    # Solo datos ya cargados: publicar no debe agregar consultas por registro
+    from .models import RegistroVisita
+    if not RegistroVisita.visitante.is_cached(registro):
+        return {}
+    return {
+        'visitante': registro.visitante.nombre,
+        'documento': registro.visitante.documento,
+        'apartamento': registro.visitante.apartamento_visitado,
+    }
+
+
+def _al_confirmar(edificio, tipo, construir):
+    # Sin pantallas del edificio conectadas en este proceso no se construye nada
+    edificio = pk_edificio(edificio)
+    if not canal.hay_suscriptores(edificio):
+        return
+
+    def publicar():
+        canal.publicar(edificio, tipo, construir())
+        canal.publicar_contadores(edificio, contadores(edificio))
+    transaction.on_commit(publicar, using=base_de(edificio))
+
+
+def entradas_registradas(edificio, registros):
+    _al_confirmar(edificio, 'entrada', lambda: {
+        'cantidad': len(registros),
+        'registros': [
+            {
+                'id': registro.pk,
+                'fecha_entrada': timezone.localtime(registro.fecha_entrada).isoformat(),
+                **_visitante(registro),
+            }
+            for registro in registros
+        ],
+    })
+
+
+def salidas_registradas(edificio, registro_ids, fecha_salida):
+    _al_confirmar(edificio, 'salida', lambda: {
+        'cantidad': len(registro_ids),
+        'registros': list(registro_ids),
+        'fecha_salida': timezone.localtime(fecha_salida).isoformat(),
+    })
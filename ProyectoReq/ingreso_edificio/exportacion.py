@@ -0,0 +1,97 @@
+import csv
+import heapq
+import json
+import zlib
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Columnas del CSV y proyección equivalente sobre RegistroVisita
+ENCABEZADO_REPORTE = ['Visitante', 'Documento', 'Entrada', 'Salida', 'Motivo']
+CAMPOS_REPORTE = (
+    'visitante__nombre',
+    'visitante__documento',
+    'fecha_entrada',
+    'fecha_salida',
+    'visitante__motivo_visita',
+)
+# Claves de cada objeto en la exportación NDJSON (una línea JSON por registro)
+CLAVES_NDJSON = ('visitante', 'documento', 'fecha_entrada', 'fecha_salida', 'motivo')
+
+
+class Eco:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def filas_reporte(registros, chunk_size=None):
+    # values_list evita construir instancias y iterator() lee por bloques
+    # desde el cursor del servidor, así la memoria no crece con el reporte.
+    # Con una lista de querysets (vivos y archivados) se combinan los flujos,
+    # ya ordenados por fecha de entrada descendente, sin cargarlos en memoria.
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'REPORTE_CSV_CHUNK_SIZE', 2000)
+    if not isinstance(registros, (list, tuple)):
+        return registros.values_list(*CAMPOS_REPORTE).iterator(chunk_size=chunk_size)
+    posicion = CAMPOS_REPORTE.index('fecha_entrada')
+    return heapq.merge(
+        *(
+            qs.order_by('-fecha_entrada').values_list(*CAMPOS_REPORTE).iterator(chunk_size=chunk_size)
+            for qs in registros
+        ),
+        key=lambda fila: fila[posicion],
+        reverse=True,
+    )
+
+
+def lineas_csv(filas):
+    writer = csv.writer(Eco())
+    yield writer.writerow(ENCABEZADO_REPORTE)
+    for fila in filas:
+        yield writer.writerow(fila)
+
+
+def lineas_ndjson(filas):
+    for fila in filas:
+        objeto = dict(zip(CLAVES_NDJSON, fila))
+        for clave in ('fecha_entrada', 'fecha_salida'):
+            if objeto[clave] is not None:
+                objeto[clave] = timezone.localtime(objeto[clave]).isoformat()
+        yield json.dumps(objeto, ensure_ascii=False) + '\n'
+
+
+def comprimir_gzip(lineas, tam_bloque=64 * 1024):
+    # wbits=31 produce un contenedor gzip completo de forma incremental
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pendiente = []
+    tam_pendiente = 0
+    for linea in lineas:
+        datos = linea.encode('utf-8')
+        pendiente.append(datos)
+        tam_pendiente += len(datos)
+        if tam_pendiente >= tam_bloque:
+            bloque = compresor.compress(b''.join(pendiente))
+            pendiente, tam_pendiente = [], 0
+            if bloque:
+                yield bloque
+    if pendiente:
+        bloque = compresor.compress(b''.join(pendiente))
+        if bloque:
+            yield bloque
+    yield compresor.flush()
+
+
+def respuesta_csv_streaming(registros, nombre_archivo='reporte_ingresos.csv', gzip=False):
+    lineas = lineas_csv(filas_reporte(registros))
+
+    if gzip:
+        response = StreamingHttpResponse(comprimir_gzip(lineas), content_type='application/gzip')
+        nombre_archivo += '.gz'
+    else:
+        response = StreamingHttpResponse(lineas, content_type='text/csv')
+
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return response
@@ -0,0 +1,26 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+# Rangos de fechas semiabiertos [inicio, fin) en la zona horaria del
+# edificio (TIME_ZONE). Filtrar con fecha_entrada__gte/__lt usa el índice de
+# la columna; fecha_entrada__date envuelve la columna en una conversión de
+# zona horaria y obliga a recorrer la tabla.
+
+
+def inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min), timezone.get_current_timezone())
+
+
+def rango_dia(fecha):
+    return inicio_dia(fecha), inicio_dia(fecha + timedelta(days=1))
+
+
+def filtro_rango(campo, desde=None, hasta=None):
+    # desde y hasta son fechas inclusivas; el día "hasta" se incluye completo
+    filtros = {}
+    if desde:
+        filtros[f'{campo}__gte'] = inicio_dia(desde)
+    if hasta:
+        filtros[f'{campo}__lt'] = inicio_dia(hasta + timedelta(days=1))
+    return filtros
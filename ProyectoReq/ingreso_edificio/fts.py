@@ -0,0 +1,93 @@
+import re
+
+# Índice de texto completo (SQLite FTS5) sobre Visitante. La tabla virtual usa
+# contenido externo: solo guarda el índice invertido y lee las columnas de la
+# tabla de visitantes por rowid. Los triggers la mantienen sincronizada con
+# cualquier escritura (save, bulk_create, update o SQL directo).
+
+TABLA = 'ingreso_edificio_visitante'
+TABLA_FTS = 'ingreso_edificio_visitante_fts'
+COLUMNAS = ('nombre', 'documento', 'persona_a_visitar', 'apartamento_visitado')
+# Pesos bm25 por columna, en el mismo orden que COLUMNAS
+PESOS = (10.0, 10.0, 2.0, 2.0)
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def disponible(connection):
+    return connection.vendor == 'sqlite'
+
+
+def _sentencias_triggers():
+    columnas = ', '.join(COLUMNAS)
+    nuevos = ', '.join(f'new.{c}' for c in COLUMNAS)
+    viejos = ', '.join(f'old.{c}' for c in COLUMNAS)
+    borrar = (
+        f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {columnas}) "
+        f"VALUES ('delete', old.id, {viejos});"
+    )
+    insertar = f"INSERT INTO {TABLA_FTS}(rowid, {columnas}) VALUES (new.id, {nuevos});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ai AFTER INSERT ON {TABLA} BEGIN {insertar} END",
+        f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ad AFTER DELETE ON {TABLA} BEGIN {borrar} END",
+        f"CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_au AFTER UPDATE OF {columnas} ON {TABLA} "
+        f"BEGIN {borrar} {insertar} END",
+    ]
+
+
+def instalar(connection):
+    if not disponible(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+            f"{', '.join(COLUMNAS)}, content='{TABLA}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        for sentencia in _sentencias_triggers():
+            cursor.execute(sentencia)
+    return True
+
+
+def desinstalar(connection):
+    if not disponible(connection):
+        return
+    with connection.cursor() as cursor:
+        for sufijo in ('ai', 'ad', 'au'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {TABLA_FTS}_{sufijo}")
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+
+
+def reconstruir(connection):
+    # Regenera el índice completo desde la tabla de contenido
+    instalar(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('optimize')")
+
+
+def consulta_fts(texto):
+    # Cada palabra se busca como prefijo y todas deben aparecer (AND implícito).
+    # Las comillas evitan que la sintaxis de FTS5 (AND, NEAR, -, :) se interprete.
+    tokens = TOKEN.findall(texto or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def buscar_ids(connection, texto, limite, edificio=None):
+    # Con edificio (base compartida por varios) solo cuentan sus visitantes:
+    # el límite no se gasta en coincidencias de otros edificios
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+    pesos = ', '.join(str(p) for p in PESOS)
+    filtro, parametros = '', [consulta]
+    if edificio is not None:
+        filtro = f"AND rowid IN (SELECT id FROM {TABLA} WHERE edificio_id = %s) "
+        parametros.append(getattr(edificio, 'pk', edificio))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s {filtro}"
+            f"ORDER BY bm25({TABLA_FTS}, {pesos}) LIMIT %s",
+            parametros + [limite],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+
+from .busqueda import rango_prefijo
+from .models import normalizar_texto
+
+# Orden y filtros de los listados (HTML y API JSON). Solo se ordena por
+# columnas con índice, así que cada página es un recorrido de índice con
+# paginar_keyset sin importar el tamaño de la tabla. La clave pública del
+# orden se recibe en ?orden= (con '-' para descendente).
+
+ORDENES = {
+    'registros': {
+        'fecha_entrada': 'fecha_entrada',
+        'fecha_salida': 'fecha_salida',
+    },
+    'visitantes': {
+        'fecha_registro': 'fecha_registro',
+        'nombre': 'nombre_normalizado',
+        'documento': 'documento',
+    },
+    'usuarios': {
+        'fecha_creacion': 'fecha_creacion',
+        'username': 'username',
+    },
+}
+
+ORDEN_POR_DEFECTO = {
+    'registros': '-fecha_entrada',
+    'visitantes': '-fecha_registro',
+    'usuarios': '-fecha_creacion',
+}
+
+
+class OrdenInvalido(ValueError):
+    pass
+
+
+def orden_solicitado(request, listado, estricto=False):
+    # Devuelve (clave, campo, descendente). Una clave desconocida lanza
+    # OrdenInvalido en la API (estricto) y usa el orden por defecto en el HTML
+    clave = request.GET.get('orden') or ORDEN_POR_DEFECTO[listado]
+    campo = ORDENES[listado].get(clave.lstrip('-'))
+    if campo is None:
+        if estricto:
+            raise OrdenInvalido(
+                f"Orden no válido: {clave}. Opciones: {', '.join(ORDENES[listado])} (prefijo '-' para descendente)"
+            )
+        clave = ORDEN_POR_DEFECTO[listado]
+        campo = ORDENES[listado][clave.lstrip('-')]
+    return clave, campo, clave.startswith('-')
+
+
+def en_cada_fuente(registros, funcion):
+    # registros_filtrados devuelve un queryset o [vivos, archivados]
+    if isinstance(registros, (list, tuple)):
+        return [funcion(fuente) for fuente in registros]
+    return funcion(registros)
+
+
+def filtrar_visitantes(queryset, texto):
+    # Prefijo de documento o de nombre, sobre los índices de ambas columnas
+    texto = (texto or '').strip()
+    if not texto:
+        return queryset
+    if texto[:1].isdigit():
+        return queryset.filter(**rango_prefijo('documento', texto))
+    return queryset.filter(**rango_prefijo('nombre_normalizado', normalizar_texto(texto)))
+
+
+def tam_pagina_api(request):
+    por_defecto = getattr(settings, 'PAGINACION_TAM_PAGINA', 50)
+    maximo = getattr(settings, 'API_TAM_PAGINA_MAXIMO', 200)
+    try:
+        tam = int(request.GET.get('tam', por_defecto))
+    except ValueError:
+        tam = por_defecto
+    return max(1, min(tam, maximo))
+
+
+# ===== SERIALIZACIÓN =====
+
+def _fecha(valor):
+    return timezone.localtime(valor).isoformat() if valor else None
+
+
+def serializar_registro(registro):
+    return {
+        'id': registro.id,
+        'visitante': registro.visitante.nombre,
+        'documento': registro.visitante.documento,
+        'apartamento': registro.visitante.apartamento_visitado,
+        'motivo_visita': registro.visitante.motivo_visita,
+        'fecha_entrada': _fecha(registro.fecha_entrada),
+        'fecha_salida': _fecha(registro.fecha_salida),
+        'registrado_por': registro.registrado_por.username if registro.registrado_por else None,
+        'edificio': registro.nombre_edificio,
+    }
+
+
+def serializar_visitante(visitante):
+    return {
+        'id': visitante.id,
+        'nombre': visitante.nombre,
+        'tipo_documento': visitante.get_tipo_documento_display(),
+        'documento': visitante.documento,
+        'telefono': visitante.telefono,
+        'motivo_visita': visitante.motivo_visita,
+        'persona_a_visitar': visitante.persona_a_visitar,
+        'fecha_registro': _fecha(visitante.fecha_registro),
+        'url_editar': reverse('editar_visitante', args=[visitante.id]),
+    }
+
+
+def serializar_usuario(usuario):
+    return {
+        'id': usuario.id,
+        'username': usuario.username,
+        'nombre': usuario.get_full_name(),
+        'email': usuario.email,
+        'documento': usuario.documento,
+        'rol': usuario.rol,
+        'rol_nombre': usuario.get_rol_display(),
+        'activo': usuario.is_active,
+        'fecha_creacion': _fecha(usuario.fecha_creacion),
+        'url_editar': reverse('editar_usuario', args=[usuario.id]),
+        'url_eliminar': reverse('eliminar_usuario', args=[usuario.id]),
+    }
+
+
+def respuesta_listado(request, pagina, clave_orden, serializar):
+    def absoluta(url):
+        return request.path + url if url else None
+
+    return JsonResponse({
+        'orden': clave_orden,
+        'resultados': [serializar(objeto) for objeto in pagina],
+        'siguiente': absoluta(pagina.url_siguiente),
+        'anterior': absoluta(pagina.url_anterior),
+        'total': pagina.total,
+        'total_exacto': pagina.total_exacto,
+        'contar': absoluta(pagina.url_contar),
+    })
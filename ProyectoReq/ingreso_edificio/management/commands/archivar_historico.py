@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from ingreso_edificio.archivo import ARCHIVABLES, archivar, compactar, horizonte, optimizar, pendientes
+from ingreso_edificio.edificios import bases_de_edificios
+from ingreso_edificio.estadisticas import invalidar_estadisticas
+
+class Command(BaseCommand):
+    help = 'Mueve registros de visita y auditorías más antiguos que el horizonte a las tablas de archivo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help='Horizonte en días (por defecto ARCHIVO_HORIZONTE_DIAS)')
+        parser.add_argument('--lote', type=int, help='Filas por transacción (por defecto ARCHIVO_TAM_LOTE)')
+        parser.add_argument('--solo', choices=list(ARCHIVABLES), help='Archivar solo registros o solo auditoría')
+        parser.add_argument('--dry-run', action='store_true', help='Cuenta las filas a archivar sin moverlas')
+        parser.add_argument('--compactar', action='store_true', help='Ejecuta VACUUM al terminar para liberar espacio')
+        parser.add_argument('--database', help='Archivar solo esta base (por defecto todas las de los edificios)')
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['dias'] < 0:
+            raise CommandError('--dias no puede ser negativo')
+        if options['lote'] is not None and options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0')
+
+        bases = bases_de_edificios()
+        if options['database']:
+            if options['database'] not in bases:
+                raise CommandError(f"Ninguna base de edificios se llama {options['database']}: {', '.join(bases)}")
+            bases = [options['database']]
+
+        limite = horizonte(options['dias'])
+        nombres = [options['solo']] if options['solo'] else list(ARCHIVABLES)
+        self.stdout.write(f'Archivando filas anteriores a {timezone.localtime(limite):%Y-%m-%d %H:%M}')
+
+        total = 0
+        for base in bases:
+            movidas_base = 0
+            for nombre in nombres:
+                if options['dry_run']:
+                    movidas = pendientes(nombre, limite, base).count()
+                else:
+                    movidas = archivar(nombre, limite, options['lote'], al_avanzar=self.progreso, using=base)
+                movidas_base += movidas
+                self.stdout.write(f'  [{base}] {nombre}: {movidas} filas')
+            if movidas_base and not options['dry_run']:
+                optimizar(base)
+            if options['compactar'] and not options['dry_run']:
+                compactar(base)
+            total += movidas_base
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'✓ [dry-run] {total} filas por archivar'))
+            return
+
+        if total:
+            invalidar_estadisticas()
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} filas archivadas'))
+
+    def progreso(self, nombre, movidas):
+        self.stdout.write(f'    {nombre}: {movidas} filas movidas...')
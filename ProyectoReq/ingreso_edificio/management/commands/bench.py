@@ -0,0 +1,179 @@
+import json
+import platform
+import sqlite3
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from ingreso_edificio.datos_sinteticos import generar_datos, parsear_escala
+from ingreso_edificio.models import RegistroVisita, Usuario
+
+def escenarios():
+    hoy = timezone.localdate()
+    rango = f'fecha_inicio={hoy - timedelta(days=30)}&fecha_fin={hoy}'
+    return [
+        ('dashboard', reverse('dashboard')),
+        ('listar_visitantes', reverse('listar_visitantes')),
+        ('listar_visitantes_buscar', reverse('listar_visitantes') + '?buscar=maria'),
+        ('buscar_visitantes', reverse('buscar_visitantes') + '?q=mar'),
+        ('consultar_registros', reverse('consultar_registros')),
+        ('consultar_registros_30d', reverse('consultar_registros') + '?' + rango),
+        ('generar_reporte', reverse('generar_reporte') + '?' + rango),
+        ('generar_reporte_csv_30d', reverse('generar_reporte') + '?exportar_csv=1&' + rango),
+        ('lista_evacuacion', reverse('lista_evacuacion')),
+        ('analitica_visitas', reverse('analitica_visitas')),
+    ]
+
+def percentil(valores, p):
+    # Rango más cercano sobre la lista ordenada
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+def consumir(respuesta):
+    # Las exportaciones son streaming: se lee el cuerpo completo para medirlas
+    if respuesta.streaming:
+        return sum(len(bloque) for bloque in respuesta.streaming_content)
+    return len(respuesta.content)
+
+class Command(BaseCommand):
+    help = ('Genera datos sintéticos reproducibles en una base de pruebas y mide las vistas principales '
+            '(latencia p50/p95/p99, consultas SQL, memoria pico)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', default='10k', help='Visitas a generar: 10k, 100k, 1M o un número')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--repeticiones', type=int, default=20, help='Peticiones medidas por vista')
+        parser.add_argument('--calentamiento', type=int, default=2, help='Peticiones descartadas antes de medir')
+        parser.add_argument('--solo', nargs='+', metavar='VISTA', help='Medir solo estas vistas')
+        parser.add_argument('--sin-cache', action='store_true', help='Vacía la caché antes de cada petición')
+        parser.add_argument('--base', help='Archivo SQLite para la base de pruebas (por defecto en memoria)')
+        parser.add_argument('--keepdb', action='store_true', help='Reutiliza la base de --base si ya tiene los datos')
+        parser.add_argument('--json', dest='salida_json', metavar='ARCHIVO', help="Escribe el resultado en JSON ('-' para stdout)")
+
+    def handle(self, *args, **options):
+        try:
+            visitas = parsear_escala(options['escala'])
+        except ValueError:
+            raise CommandError(f"Escala inválida: {options['escala']}")
+        if visitas < 1 or options['repeticiones'] < 1:
+            raise CommandError('--escala y --repeticiones deben ser mayores que 0')
+
+        disponibles = dict(escenarios())
+        solo = options['solo'] or list(disponibles)
+        desconocidas = set(solo) - set(disponibles)
+        if desconocidas:
+            raise CommandError(f"Vistas desconocidas: {', '.join(sorted(desconocidas))}. Disponibles: {', '.join(disponibles)}")
+
+        if options['base']:
+            connection.settings_dict['TEST']['NAME'] = options['base']
+        nombre_original = connection.settings_dict['NAME']
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            # Sin el middleware de medición: se mide la aplicación, no la instrumentación
+            with override_settings(AUDITORIA_MODO='sincrono', MEDICION_ACTIVA=False):
+                datos = self.preparar_datos(visitas, options)
+                resultados = self.medir([(n, disponibles[n]) for n in solo], options)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        informe = {
+            'escala': visitas,
+            'semilla': options['semilla'],
+            'repeticiones': options['repeticiones'],
+            'sin_cache': options['sin_cache'],
+            'datos': datos,
+            'entorno': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+            },
+            'vistas': resultados,
+        }
+        self.mostrar(informe)
+        if options['salida_json'] == '-':
+            self.stdout.write(json.dumps(informe, indent=2, ensure_ascii=False))
+        elif options['salida_json']:
+            with open(options['salida_json'], 'w', encoding='utf-8') as archivo:
+                json.dump(informe, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"✓ Resultado guardado en {options['salida_json']}"))
+
+    def preparar_datos(self, visitas, options):
+        if options['keepdb'] and RegistroVisita.objects.count() == visitas:
+            self.stdout.write('Reutilizando los datos existentes de la base de pruebas')
+        else:
+            inicio = time.monotonic()
+            self.stdout.write(f'Generando {visitas} visitas (semilla {options["semilla"]})...')
+            generar_datos(visitas, semilla=options['semilla'], al_avanzar=self.progreso)
+            self.stdout.write(f'  datos generados en {time.monotonic() - inicio:.1f}s')
+        return {
+            'usuarios': Usuario.objects.count(),
+            'visitas': RegistroVisita.objects.count(),
+        }
+
+    def progreso(self, etapa, cantidad):
+        if cantidad % 100_000 == 0:
+            self.stdout.write(f'  {etapa}: {cantidad}')
+
+    def medir(self, vistas, options):
+        cliente = Client()
+        cliente.force_login(Usuario.objects.filter(rol='administrador').first())
+        resultados = {}
+        for nombre, url in vistas:
+            for _ in range(options['calentamiento']):
+                consumir(cliente.get(url))
+
+            latencias = []
+            for _ in range(options['repeticiones']):
+                if options['sin_cache']:
+                    cache.clear()
+                inicio = time.perf_counter()
+                respuesta = cliente.get(url)
+                bytes_respuesta = consumir(respuesta)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                if respuesta.status_code != 200:
+                    raise CommandError(f'{nombre} respondió {respuesta.status_code}')
+
+            # Consultas y memoria en una petición aparte: tracemalloc y el
+            # registro de SQL encarecen la ejecución y sesgarían la latencia
+            if options['sin_cache']:
+                cache.clear()
+            tracemalloc.start()
+            with CaptureQueriesContext(connection) as consultas:
+                consumir(cliente.get(url))
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            latencias.sort()
+            resultados[nombre] = {
+                'url': url,
+                'p50_ms': round(percentil(latencias, 50), 2),
+                'p95_ms': round(percentil(latencias, 95), 2),
+                'p99_ms': round(percentil(latencias, 99), 2),
+                'media_ms': round(statistics.fmean(latencias), 2),
+                'consultas': len(consultas.captured_queries),
+                'sql_ms': round(sum(float(c['time']) for c in consultas.captured_queries) * 1000, 2),
+                'memoria_pico_kb': round(pico / 1024, 1),
+                'bytes': bytes_respuesta,
+            }
+        return resultados
+
+    def mostrar(self, informe):
+        self.stdout.write(f"\nEscala: {informe['escala']} visitas · {informe['repeticiones']} repeticiones por vista")
+        self.stdout.write(
+            f"{'vista':<26} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'consultas':>9} {'mem KB':>9} {'bytes':>10}"
+        )
+        for nombre, r in informe['vistas'].items():
+            self.stdout.write(
+                f"{nombre:<26} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                f"{r['consultas']:>9} {r['memoria_pico_kb']:>9.0f} {r['bytes']:>10}"
+            )
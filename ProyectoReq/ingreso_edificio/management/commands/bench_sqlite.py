@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ingreso_edificio.ajustes_sqlite import aplicar_pragmas
+
+ESQUEMA = [
+    'CREATE TABLE registro (id INTEGER PRIMARY KEY AUTOINCREMENT, visitante_id INTEGER NOT NULL, '
+    'fecha_entrada TEXT NOT NULL, fecha_salida TEXT NULL, observaciones TEXT NOT NULL)',
+    'CREATE INDEX registro_fecha ON registro (fecha_entrada DESC)',
+    'CREATE TABLE ocupacion (id INTEGER PRIMARY KEY, personas_dentro INTEGER NOT NULL)',
+    'INSERT INTO ocupacion VALUES (1, 0)',
+]
+
+class Command(BaseCommand):
+    help = ('Mide el rendimiento de escritura concurrente en SQLite con la configuración por defecto '
+            'de Django y con WAL, synchronous=NORMAL y BEGIN IMMEDIATE (varias recepciones '
+            'registrando entradas a la vez)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help='Recepciones escribiendo en paralelo')
+        parser.add_argument('--operaciones', type=int, default=200, help='Entradas registradas por hilo')
+        parser.add_argument('--lectores', type=int, default=2, help='Hilos consultando el dashboard en paralelo')
+        parser.add_argument('--directorio', help='Dónde crear las bases temporales (por defecto el de la base real)')
+
+    def handle(self, *args, **options):
+        if options['hilos'] < 1 or options['operaciones'] < 1:
+            raise CommandError('--hilos y --operaciones deben ser mayores que 0')
+        # El disco importa (fsync): por defecto se mide junto a la base real
+        directorio = options['directorio'] or os.path.dirname(str(settings.DATABASES['default']['NAME'])) or None
+
+        # Solo lo que cambia la escritura concurrente; mmap_size, cache_size y
+        # temp_store afectan a las lecturas
+        pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+        ajustes = {k: pragmas[k] for k in ('journal_mode', 'synchronous') if k in pragmas}
+        escenarios = [
+            # Django sin ajustes: journal DELETE, synchronous FULL, BEGIN diferido
+            ('por defecto', {}, 'BEGIN'),
+            ('ajustado', ajustes, 'BEGIN IMMEDIATE'),
+        ]
+        resultados = []
+        with tempfile.TemporaryDirectory(dir=directorio) as tmp:
+            for nombre, pragmas, inicio in escenarios:
+                ruta = os.path.join(tmp, f'bench_{len(resultados)}.sqlite3')
+                resultados.append((nombre, self.medir(ruta, pragmas, inicio, options)))
+
+        self.stdout.write(f"{'configuración':<14} {'escrituras/s':>13} {'p50 ms':>8} {'p95 ms':>8} {'bloqueos':>9}")
+        for nombre, r in resultados:
+            self.stdout.write(
+                f"{nombre:<14} {r['por_segundo']:>13.0f} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['errores']:>9}"
+            )
+        base, ajustado = resultados[0][1], resultados[1][1]
+        if base['por_segundo']:
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ Escrituras por segundo x{ajustado['por_segundo'] / base['por_segundo']:.1f} "
+                f"con {', '.join(f'{k}={v}' for k, v in ajustes.items())} y BEGIN IMMEDIATE"
+            ))
+
+    def conectar(self, ruta, pragmas):
+        # Como Django: timeout por defecto de sqlite3 (5 s esperando el candado)
+        # y autocommit con BEGIN explícito
+        conexion = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False)
+        aplicar_pragmas(conexion.cursor(), pragmas)
+        return conexion
+
+    def medir(self, ruta, pragmas, inicio, options):
+        conexion = self.conectar(ruta, pragmas)
+        for sentencia in ESQUEMA:
+            conexion.execute(sentencia)
+        conexion.close()
+
+        latencias = []
+        errores = [0]
+        candado = threading.Lock()
+        terminado = threading.Event()
+
+        def recepcion(numero):
+            conexion = self.conectar(ruta, pragmas)
+            propias = []
+            for i in range(options['operaciones']):
+                t0 = time.perf_counter()
+                try:
+                    # Lo mismo que registrar_ingreso: visita + contador en una transacción
+                    conexion.execute(inicio)
+                    conexion.execute(
+                        "INSERT INTO registro (visitante_id, fecha_entrada, observaciones) "
+                        "VALUES (?, datetime('now'), '')", (numero * 100000 + i,)
+                    )
+                    conexion.execute('UPDATE ocupacion SET personas_dentro = personas_dentro + 1 WHERE id = 1')
+                    conexion.execute('COMMIT')
+                    propias.append(time.perf_counter() - t0)
+                except sqlite3.OperationalError:
+                    if conexion.in_transaction:
+                        conexion.execute('ROLLBACK')
+                    with candado:
+                        errores[0] += 1
+            conexion.close()
+            with candado:
+                latencias.extend(propias)
+
+        def dashboard():
+            conexion = self.conectar(ruta, pragmas)
+            while not terminado.is_set():
+                try:
+                    conexion.execute(
+                        "SELECT COUNT(*) FROM registro WHERE fecha_entrada >= datetime('now', '-1 day')"
+                    ).fetchone()
+                except sqlite3.OperationalError:
+                    pass
+            conexion.close()
+
+        lectores = [threading.Thread(target=dashboard) for _ in range(options['lectores'])]
+        escritores = [threading.Thread(target=recepcion, args=(n,)) for n in range(options['hilos'])]
+        for hilo in lectores:
+            hilo.start()
+        t0 = time.perf_counter()
+        for hilo in escritores:
+            hilo.start()
+        for hilo in escritores:
+            hilo.join()
+        duracion = time.perf_counter() - t0
+        terminado.set()
+        for hilo in lectores:
+            hilo.join()
+
+        latencias.sort()
+        return {
+            'por_segundo': len(latencias) / duracion if duracion else 0,
+            'p50': statistics.median(latencias) * 1000 if latencias else 0,
+            'p95': latencias[int(len(latencias) * 0.95) - 1] * 1000 if latencias else 0,
+            'errores': errores[0],
+        }
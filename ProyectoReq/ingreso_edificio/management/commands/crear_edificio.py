@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from ingreso_edificio.models import Edificio
+from ingreso_edificio.ocupacion import recalcular_ocupacion
+
+class Command(BaseCommand):
+    help = 'Crea un edificio con sus datos en la base indicada (migrada antes con migrate --database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('codigo', help='Código corto del edificio (letras, números y guiones)')
+        parser.add_argument('nombre')
+        parser.add_argument('--direccion', default='')
+        parser.add_argument('--base', default='default', help='Alias de DATABASES donde se guardan sus datos')
+
+    def handle(self, *args, **options):
+        if Edificio.objects.filter(codigo=options['codigo']).exists():
+            raise CommandError(f'El edificio {options["codigo"]} ya existe')
+
+        edificio = Edificio(
+            codigo=options['codigo'],
+            nombre=options['nombre'],
+            direccion=options['direccion'],
+            base_datos=options['base'],
+        )
+        try:
+            edificio.full_clean()
+        except ValidationError as exc:
+            raise CommandError('; '.join(f'{campo}: {" ".join(mensajes)}' for campo, mensajes in exc.message_dict.items()))
+        edificio.save()
+        # Fila del contador de ocupación en la base del edificio
+        recalcular_ocupacion(edificio)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Edificio {edificio.nombre} creado'))
+        self.stdout.write(f'  Código: {edificio.codigo}')
+        self.stdout.write(f'  Base de datos: {edificio.base_datos} ({settings.DATABASES[edificio.base_datos]["NAME"]})')
@@ -0,0 +1,174 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from ingreso_edificio.edificios import base_de, edificio_por_codigo, obtener_edificio
+from ingreso_edificio.estadisticas import invalidar_estadisticas
+from ingreso_edificio.models import EDIFICIO_PRINCIPAL, Visitante, normalizar_texto
+
+CAMPOS = [
+    'nombre', 'tipo_documento', 'documento', 'email', 'telefono',
+    'motivo_visita', 'apartamento_visitado', 'persona_a_visitar', 'descripcion',
+]
+# Campos que se sobrescriben cuando el documento ya existe en el edificio
+CAMPOS_ACTUALIZAR = [c for c in CAMPOS if c != 'documento'] + ['nombre_normalizado', 'fecha_actualizacion']
+
+class Command(BaseCommand):
+    help = 'Importa visitantes desde CSV o JSONL, creando o actualizando por documento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo o '-' para leer de la entrada estándar")
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Por defecto se deduce de la extensión')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por bulk_create (por defecto 1000)')
+        parser.add_argument('--delimitador', default=',', help='Delimitador del CSV')
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--rechazos', help='Archivo donde escribir las filas rechazadas con su error')
+        parser.add_argument('--dry-run', action='store_true', help='Valida y cuenta sin escribir en la base de datos')
+        parser.add_argument('--edificio', help='Código del edificio de los visitantes; por defecto el principal')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or self.deducir_formato(options['archivo'])
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0')
+        if options['edificio']:
+            self.edificio = edificio_por_codigo(options['edificio'])
+            if self.edificio is None:
+                raise CommandError(f'No existe el edificio {options["edificio"]}')
+        else:
+            self.edificio = obtener_edificio(EDIFICIO_PRINCIPAL)
+        self.alias = base_de(self.edificio)
+
+        if options['archivo'] == '-':
+            entrada = sys.stdin
+        else:
+            try:
+                entrada = open(options['archivo'], encoding=options['encoding'], newline='')
+            except OSError as exc:
+                raise CommandError(f'No se pudo abrir {options["archivo"]}: {exc}')
+
+        rechazos = open(options['rechazos'], 'w', encoding='utf-8', newline='') if options['rechazos'] else None
+        self.escritor_rechazos = None
+        self.vistos = set()
+
+        self.totales = {'leidas': 0, 'creados': 0, 'actualizados': 0, 'rechazadas': 0}
+        self.inicio = time.monotonic()
+        try:
+            filas = self.leer_csv(entrada, options['delimitador']) if formato == 'csv' else self.leer_jsonl(entrada)
+            lote = {}
+            for linea, fila in filas:
+                self.totales['leidas'] += 1
+                visitante, errores = self.validar(fila)
+                if errores:
+                    self.rechazar(rechazos, formato, linea, fila, errores)
+                    continue
+                # Dentro de un lote gana la última fila de cada documento
+                lote[visitante.documento] = visitante
+                if len(lote) >= options['lote']:
+                    self.guardar(lote, options['dry_run'])
+                    lote = {}
+            if lote:
+                self.guardar(lote, options['dry_run'])
+        finally:
+            if entrada is not sys.stdin:
+                entrada.close()
+            if rechazos:
+                rechazos.close()
+
+        if not options['dry_run'] and (self.totales['creados'] or self.totales['actualizados']):
+            invalidar_estadisticas()
+
+        prefijo = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {prefijo}{self.totales['leidas']} filas leídas: "
+            f"{self.totales['creados']} creados, {self.totales['actualizados']} actualizados, "
+            f"{self.totales['rechazadas']} rechazadas ({time.monotonic() - self.inicio:.1f}s)"
+        ))
+
+    def deducir_formato(self, archivo):
+        if archivo.lower().endswith(('.jsonl', '.ndjson')):
+            return 'jsonl'
+        if archivo.lower().endswith('.csv'):
+            return 'csv'
+        raise CommandError('No se pudo deducir el formato; use --formato csv|jsonl')
+
+    def leer_csv(self, entrada, delimitador):
+        lector = csv.DictReader(entrada, delimiter=delimitador)
+        for fila in lector:
+            yield lector.line_num, fila
+
+    def leer_jsonl(self, entrada):
+        for linea, texto in enumerate(entrada, start=1):
+            if not texto.strip():
+                continue
+            try:
+                fila = json.loads(texto)
+            except ValueError as exc:
+                fila = {'_texto': texto.rstrip('\n'), '_error_json': str(exc)}
+            yield linea, fila
+
+    def validar(self, fila):
+        if not isinstance(fila, dict):
+            return None, {'__all__': ['Cada línea debe ser un objeto JSON']}
+        if '_error_json' in fila:
+            return None, {'__all__': [f"JSON inválido: {fila['_error_json']}"]}
+
+        datos = {campo: str(fila.get(campo) or '').strip() for campo in CAMPOS}
+        datos['tipo_documento'] = datos['tipo_documento'].upper()
+        visitante = Visitante(edificio_id=self.edificio.pk, **datos)
+        visitante.nombre_normalizado = normalizar_texto(visitante.nombre)
+        try:
+            # La unicidad de documento se resuelve con el upsert, sin consultar fila a fila
+            visitante.full_clean(validate_unique=False, validate_constraints=False)
+        except ValidationError as exc:
+            return None, exc.message_dict
+        return visitante, None
+
+    def rechazar(self, rechazos, formato, linea, fila, errores):
+        self.totales['rechazadas'] += 1
+        if not rechazos:
+            return
+        texto_errores = '; '.join(f'{campo}: {" ".join(mensajes)}' for campo, mensajes in errores.items())
+        if formato == 'jsonl':
+            registro = dict(fila) if isinstance(fila, dict) else {'_valor': fila}
+            registro.update({'_linea': linea, '_errores': texto_errores})
+            rechazos.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            return
+        if self.escritor_rechazos is None:
+            columnas = ['linea', 'errores'] + [c for c in fila.keys() if c is not None]
+            self.escritor_rechazos = csv.DictWriter(rechazos, fieldnames=columnas, extrasaction='ignore')
+            self.escritor_rechazos.writeheader()
+        self.escritor_rechazos.writerow({**fila, 'linea': linea, 'errores': texto_errores})
+
+    def guardar(self, lote, dry_run):
+        existentes = set(
+            Visitante.objects.del_edificio(self.edificio).filter(
+                documento__in=list(lote)
+            ).values_list('documento', flat=True)
+        )
+        if dry_run:
+            # Sin escribir, los documentos de lotes anteriores no están en la base
+            existentes |= self.vistos.intersection(lote)
+            self.vistos.update(lote)
+        self.totales['actualizados'] += len(existentes)
+        self.totales['creados'] += len(lote) - len(existentes)
+
+        if not dry_run:
+            with transaction.atomic(using=self.alias):
+                Visitante.objects.using(self.alias).bulk_create(
+                    lote.values(),
+                    batch_size=len(lote),
+                    update_conflicts=True,
+                    unique_fields=['edificio', 'documento'],
+                    update_fields=CAMPOS_ACTUALIZAR,
+                )
+
+        transcurrido = time.monotonic() - self.inicio
+        self.stdout.write(
+            f"  {self.totales['leidas']} filas procesadas "
+            f"({self.totales['leidas'] / transcurrido if transcurrido else 0:.0f} filas/s), "
+            f"{self.totales['rechazadas']} rechazadas"
+        )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from ingreso_edificio.reportes import limpiar_vencidos, procesar_pendientes
+
+class Command(BaseCommand):
+    help = 'Genera los reportes en cola (exportaciones en segundo plano) y borra los vencidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help='Sigue esperando trabajos nuevos en lugar de terminar')
+        parser.add_argument('--intervalo', type=float, default=5, help='Segundos entre revisiones de la cola con --continuo')
+        parser.add_argument('--limite', type=int, help='Máximo de reportes a generar en esta ejecución')
+
+    def handle(self, *args, **options):
+        if options['intervalo'] <= 0:
+            raise CommandError('--intervalo debe ser mayor que 0')
+        if options['limite'] is not None and options['limite'] < 1:
+            raise CommandError('--limite debe ser mayor que 0')
+
+        borrados = limpiar_vencidos()
+        if borrados:
+            self.stdout.write(f'  {borrados} reportes vencidos eliminados')
+
+        total = 0
+        while True:
+            restantes = None if options['limite'] is None else options['limite'] - total
+            total += procesar_pendientes(restantes, al_terminar=self.terminado)
+            if not options['continuo'] or (options['limite'] is not None and total >= options['limite']):
+                break
+            # Entre revisiones se descartan conexiones caídas, como tras cada petición
+            close_old_connections()
+            time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} reportes procesados'))
+
+    def terminado(self, job_id, completado):
+        if completado:
+            self.stdout.write(f'  Reporte {job_id}: completado')
+        else:
+            self.stdout.write(self.style.ERROR(f'  Reporte {job_id}: fallido'))
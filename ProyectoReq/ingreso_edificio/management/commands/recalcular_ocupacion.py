@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from ingreso_edificio.edificios import edificio_por_codigo, edificios_activos
+from ingreso_edificio.estadisticas import invalidar_estadisticas
+from ingreso_edificio.ocupacion import recalcular_ocupacion
+
+class Command(BaseCommand):
+    help = 'Recalcula el contador de ocupación a partir de las visitas abiertas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--edificio', help='Código del edificio; por defecto todos los activos')
+
+    def handle(self, *args, **options):
+        if options['edificio']:
+            edificio = edificio_por_codigo(options['edificio'])
+            if edificio is None:
+                raise CommandError(f'No existe el edificio {options["edificio"]}')
+            edificios = [edificio]
+        else:
+            edificios = edificios_activos()
+
+        for edificio in edificios:
+            total = recalcular_ocupacion(edificio)
+            self.stdout.write(self.style.SUCCESS(f'✓ Ocupación recalculada: {total} personas en {edificio.nombre}'))
+        invalidar_estadisticas()
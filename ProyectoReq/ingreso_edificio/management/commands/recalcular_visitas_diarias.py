@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from ingreso_edificio.edificios import edificio_por_codigo, edificios_activos
+from ingreso_edificio.resumen_diario import recalcular_rango
+
+def fecha_iso(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor} (use AAAA-MM-DD)')
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen diario de visitas (VisitaDiaria) desde los registros de visita'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=fecha_iso, help='Primer día (AAAA-MM-DD); por defecto el de la primera visita')
+        parser.add_argument('--hasta', type=fecha_iso, help='Último día incluido (AAAA-MM-DD); por defecto hoy')
+        parser.add_argument('--edificio', help='Código del edificio; por defecto todos los activos')
+
+    def handle(self, *args, **options):
+        if options['edificio']:
+            edificio = edificio_por_codigo(options['edificio'])
+            if edificio is None:
+                raise CommandError(f'No existe el edificio {options["edificio"]}')
+            edificios = [edificio]
+        else:
+            edificios = edificios_activos()
+
+        for edificio in edificios:
+            try:
+                desde, hasta, filas = recalcular_rango(edificio, options['desde'], options['hasta'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Resumen diario de {edificio.nombre} recalculado del {desde} al {hasta}: {filas} filas'
+            ))
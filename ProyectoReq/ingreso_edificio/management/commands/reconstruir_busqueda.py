@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from ingreso_edificio import fts
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de texto completo (FTS5) de visitantes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Alias de la base de datos')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        
+        if not fts.disponible(connection):
+            self.stdout.write(self.style.WARNING('✗ La base de datos no es SQLite; no hay índice FTS5 que reconstruir'))
+            return
+        
+        fts.reconstruir(connection)
+        self.stdout.write(self.style.SUCCESS('✓ Índice de búsqueda de visitantes reconstruido'))
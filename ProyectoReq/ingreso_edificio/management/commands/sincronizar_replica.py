@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ingreso_edificio.replicas import replicas, ruta_sqlite, sincronizar_sqlite
+
+class Command(BaseCommand):
+    help = 'Copia cada base SQLite sobre su réplica de lectura (REPLICAS_LECTURA)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help='Alias de la base principal; por defecto todas las que tienen réplica')
+        parser.add_argument('--continuo', action='store_true', help='Repite la copia cada --intervalo segundos')
+        parser.add_argument('--intervalo', type=float, help='Segundos entre copias (por defecto REPLICA_INTERVALO_SINCRONIZACION)')
+
+    def handle(self, *args, **options):
+        intervalo = options['intervalo']
+        if intervalo is None:
+            intervalo = getattr(settings, 'REPLICA_INTERVALO_SINCRONIZACION', 30)
+        if intervalo <= 0:
+            raise CommandError('--intervalo debe ser mayor que 0')
+
+        configuradas = replicas()
+        if options['database']:
+            if options['database'] not in configuradas:
+                raise CommandError(f'La base {options["database"]} no tiene réplica en REPLICAS_LECTURA')
+            configuradas = {options['database']: configuradas[options['database']]}
+        if not configuradas:
+            raise CommandError('No hay réplicas configuradas (REPLICAS_LECTURA o REPLICAS_SQLITE)')
+
+        pares = []
+        for alias, replica in configuradas.items():
+            if not all(settings.DATABASES[a]['ENGINE'].endswith('sqlite3') for a in (alias, replica)):
+                raise CommandError(f'{alias} → {replica}: solo se copian bases SQLite')
+            pares.append((alias, replica))
+
+        while True:
+            for alias, replica in pares:
+                origen = ruta_sqlite(settings.DATABASES[alias]['NAME'])
+                destino = ruta_sqlite(settings.DATABASES[replica]['NAME'])
+                segundos = sincronizar_sqlite(origen, destino)
+                self.stdout.write(self.style.SUCCESS(f'✓ {alias} → {replica} ({destino}) en {segundos:.1f}s'))
+            if not options['continuo']:
+                break
+            time.sleep(intervalo)
@@ -0,0 +1,195 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+# Medición por petición: consultas SQL (cantidad, tiempo, repetidas), tiempo
+# de plantillas, de la vista y total. Se publica en la cabecera Server-Timing
+# y en una línea JSON del logger 'ingreso_edificio.medicion'. Con
+# MEDICION_ACTIVA = False (por defecto fuera de DEBUG) el middleware se
+# descarta al arrancar (MiddlewareNotUsed) y las plantillas no se envuelven.
+# Bajo ASGI el middleware es asíncrono, así que no obliga a Django a pasar
+# cada petición por un hilo antes de llegar a las vistas asíncronas.
+
+logger = logging.getLogger('ingreso_edificio.medicion')
+
+_actual = ContextVar('medicion', default=None)
+
+
+class Medicion:
+    def __init__(self):
+        self.consultas = 0
+        self.sql = 0.0
+        self.plantillas = 0.0
+        self.profundidad_plantilla = 0
+        self.inicio_vista = None
+        self.vista = None
+        self.por_sentencia = Counter()
+        self.duplicadas = Counter()
+
+    def registrar_consulta(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - inicio
+            self.consultas += 1
+            # La misma sentencia con distintos parámetros sugiere N+1; con los
+            # mismos parámetros es una consulta duplicada
+            self.por_sentencia[sql] += 1
+            if not many:
+                self.duplicadas[sql, repr(params)] += 1
+
+    def repetidas(self, umbral):
+        return [
+            {'sql': sql[:200], 'veces': veces}
+            for sql, veces in self.por_sentencia.most_common()
+            if veces >= umbral
+        ]
+
+    def total_duplicadas(self):
+        return sum(veces - 1 for veces in self.duplicadas.values() if veces > 1)
+
+
+class MedicionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'MEDICION_ACTIVA', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+        self.umbral_lento = getattr(settings, 'MEDICION_UMBRAL_LENTO_MS', 500)
+        self.umbral_repetidas = getattr(settings, 'MEDICION_UMBRAL_REPETIDAS', 5)
+        self.server_timing = getattr(settings, 'MEDICION_SERVER_TIMING', True)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        medicion = Medicion()
+        token = _actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with self.envolver_conexiones(medicion):
+                response = self.get_response(request)
+        finally:
+            _actual.reset(token)
+        return self.terminar(request, response, medicion, inicio)
+
+    async def __acall__(self, request):
+        medicion = Medicion()
+        token = _actual.set(medicion)
+        inicio = time.perf_counter()
+        # Las conexiones son por hilo: el ORM asíncrono consulta desde el hilo
+        # de sync_to_async de la petición, así que el envoltorio va en ese hilo
+        pila = await sync_to_async(self.envolver_conexiones)(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(pila.close)()
+            _actual.reset(token)
+        return self.terminar(request, response, medicion, inicio)
+
+    def envolver_conexiones(self, medicion):
+        pila = ExitStack()
+        for conexion in connections.all():
+            pila.enter_context(conexion.execute_wrapper(medicion.registrar_consulta))
+        return pila
+
+    def terminar(self, request, response, medicion, inicio):
+        fin = time.perf_counter()
+        total = fin - inicio
+        if medicion.inicio_vista is not None:
+            medicion.vista = fin - medicion.inicio_vista
+
+        if self.server_timing:
+            response['Server-Timing'] = self.server_timing_header(medicion, total)
+        self.registrar(request, response, medicion, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicion = _actual.get()
+        if medicion is not None:
+            medicion.inicio_vista = time.perf_counter()
+
+    def server_timing_header(self, medicion, total):
+        metricas = [
+            f'sql;dur={medicion.sql * 1000:.1f};desc="{medicion.consultas} consultas"',
+            f'plantilla;dur={medicion.plantillas * 1000:.1f}',
+        ]
+        if medicion.vista is not None:
+            metricas.append(f'vista;dur={medicion.vista * 1000:.1f}')
+        metricas.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metricas)
+
+    def registrar(self, request, response, medicion, total):
+        total_ms = total * 1000
+        repetidas = medicion.repetidas(self.umbral_repetidas)
+        datos = {
+            'metodo': request.method,
+            'ruta': request.path,
+            'vista': getattr(request.resolver_match, 'view_name', None),
+            'estado': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'vista_ms': round(medicion.vista * 1000, 1) if medicion.vista is not None else None,
+            'sql_ms': round(medicion.sql * 1000, 1),
+            'consultas': medicion.consultas,
+            'duplicadas': medicion.total_duplicadas(),
+            'plantilla_ms': round(medicion.plantillas * 1000, 1),
+            # En respuestas streaming (CSV) las consultas ocurren al enviar el cuerpo
+            'streaming': response.streaming,
+        }
+        logger.info(json.dumps(datos, ensure_ascii=False))
+        if repetidas:
+            logger.warning(json.dumps({**datos, 'evento': 'consultas_repetidas', 'repetidas': repetidas}, ensure_ascii=False))
+        if total_ms >= self.umbral_lento:
+            logger.warning(json.dumps({**datos, 'evento': 'peticion_lenta'}, ensure_ascii=False))
+
+
+# ===== PLANTILLAS =====
+
+class PlantillaMedida:
+    def __init__(self, plantilla):
+        self.plantilla = plantilla
+        self.template = plantilla.template
+        self.origin = plantilla.origin
+
+    def render(self, context=None, request=None):
+        medicion = _actual.get()
+        if medicion is None:
+            return self.plantilla.render(context, request)
+        medicion.profundidad_plantilla += 1
+        inicio = time.perf_counter()
+        try:
+            return self.plantilla.render(context, request)
+        finally:
+            medicion.profundidad_plantilla -= 1
+            # Solo la plantilla exterior suma: las anidadas ya están incluidas
+            if not medicion.profundidad_plantilla:
+                medicion.plantillas += time.perf_counter() - inicio
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """Backend DjangoTemplates que suma el tiempo de render a la medición."""
+
+    def from_string(self, template_code):
+        return self.medir(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return self.medir(super().get_template(template_name))
+
+    def medir(self, plantilla):
+        if not getattr(settings, 'MEDICION_ACTIVA', False):
+            return plantilla
+        return PlantillaMedida(plantilla)
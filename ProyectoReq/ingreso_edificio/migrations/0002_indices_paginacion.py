@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('ingreso_edificio', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['-fecha_creacion'], name='ingreso_edi_fecha_c_d877af_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitante',
+            index=models.Index(fields=['-fecha_registro'], name='ingreso_edi_fecha_r_17a463_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:13
+
+from django.db import migrations, models
+
+
+def inicializar_ocupacion(apps, schema_editor):
+    Ocupacion = apps.get_model('ingreso_edificio', 'Ocupacion')
+    RegistroVisita = apps.get_model('ingreso_edificio', 'RegistroVisita')
+    Ocupacion.objects.update_or_create(
+        pk=1,
+        defaults={'personas_dentro': RegistroVisita.objects.filter(fecha_salida__isnull=True).count()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingreso_edificio', '0002_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ocupacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('personas_dentro', models.PositiveIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Ocupación',
+                'verbose_name_plural': 'Ocupación',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='registrovisita',
+            index=models.Index(condition=models.Q(('fecha_salida__isnull', True)), fields=['-fecha_entrada'], name='registro_abierto_idx'),
+        ),
+        migrations.RunPython(inicializar_ocupacion, migrations.RunPython.noop),
+    ]
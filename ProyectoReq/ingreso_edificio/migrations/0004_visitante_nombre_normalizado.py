@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:14
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalizar_texto(texto):
+    # Copia de models.normalizar_texto a la fecha de esta migración
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold().strip()
+
+
+def poblar_nombre_normalizado(apps, schema_editor):
+    Visitante = apps.get_model('ingreso_edificio', 'Visitante')
+    visitantes = list(Visitante.objects.only('id', 'nombre'))
+    for visitante in visitantes:
+        visitante.nombre_normalizado = normalizar_texto(visitante.nombre)
+    Visitante.objects.bulk_update(visitantes, ['nombre_normalizado'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingreso_edificio', '0003_ocupacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitante',
+            name='nombre_normalizado',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(poblar_nombre_normalizado, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Índice FTS5 de visitantes (solo SQLite). Las sentencias se copian aquí tal
+# como eran al crear la migración: fts.py puede cambiar después y el
+# post_migrate de apps.py reinstala los triggers con su versión vigente.
+
+from django.db import migrations
+
+CREAR = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS ingreso_edificio_visitante_fts USING fts5("
+    "nombre, documento, persona_a_visitar, apartamento_visitado, "
+    "content='ingreso_edificio_visitante', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS ingreso_edificio_visitante_fts_ai AFTER INSERT ON ingreso_edificio_visitante "
+    "BEGIN INSERT INTO ingreso_edificio_visitante_fts(rowid, nombre, documento, persona_a_visitar, "
+    "apartamento_visitado) VALUES (new.id, new.nombre, new.documento, new.persona_a_visitar, "
+    "new.apartamento_visitado); END",
+    "CREATE TRIGGER IF NOT EXISTS ingreso_edificio_visitante_fts_ad AFTER DELETE ON ingreso_edificio_visitante "
+    "BEGIN INSERT INTO ingreso_edificio_visitante_fts(ingreso_edificio_visitante_fts, rowid, nombre, documento, "
+    "persona_a_visitar, apartamento_visitado) VALUES ('delete', old.id, old.nombre, old.documento, "
+    "old.persona_a_visitar, old.apartamento_visitado); END",
+    "CREATE TRIGGER IF NOT EXISTS ingreso_edificio_visitante_fts_au AFTER UPDATE OF nombre, documento, "
+    "persona_a_visitar, apartamento_visitado ON ingreso_edificio_visitante "
+    "BEGIN INSERT INTO ingreso_edificio_visitante_fts(ingreso_edificio_visitante_fts, rowid, nombre, documento, "
+    "persona_a_visitar, apartamento_visitado) VALUES ('delete', old.id, old.nombre, old.documento, "
+    "old.persona_a_visitar, old.apartamento_visitado); "
+    "INSERT INTO ingreso_edificio_visitante_fts(rowid, nombre, documento, persona_a_visitar, "
+    "apartamento_visitado) VALUES (new.id, new.nombre, new.documento, new.persona_a_visitar, "
+    "new.apartamento_visitado); END",
+    "INSERT INTO ingreso_edificio_visitante_fts(ingreso_edificio_visitante_fts) VALUES ('rebuild')",
+    "INSERT INTO ingreso_edificio_visitante_fts(ingreso_edificio_visitante_fts) VALUES ('optimize')",
+]
+
+ELIMINAR = [
+    "DROP TRIGGER IF EXISTS ingreso_edificio_visitante_fts_ai",
+    "DROP TRIGGER IF EXISTS ingreso_edificio_visitante_fts_ad",
+    "DROP TRIGGER IF EXISTS ingreso_edificio_visitante_fts_au",
+    "DROP TABLE IF EXISTS ingreso_edificio_visitante_fts",
+]
+
+
+def _ejecutar(sentencias):
+    def ejecutar(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            for sentencia in sentencias:
+                cursor.execute(sentencia)
+    return ejecutar
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingreso_edificio', '0004_visitante_nombre_normalizado'),
+    ]
+
+    operations = [
+        migrations.RunPython(_ejecutar(CREAR), _ejecutar(ELIMINAR)),
+    ]
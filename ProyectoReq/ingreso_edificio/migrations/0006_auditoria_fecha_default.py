@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingreso_edificio', '0005_visitante_fts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditoriaaccion',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
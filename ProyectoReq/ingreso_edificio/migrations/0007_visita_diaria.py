@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingreso_edificio', '0006_auditoria_fecha_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('apartamento', models.CharField(blank=True, max_length=50)),
+                ('ingresos', models.PositiveIntegerField(default=0)),
+                ('egresos', models.PositiveIntegerField(default=0)),
+                ('pico_ocupacion', models.PositiveIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Visita Diaria',
+                'verbose_name_plural': 'Visitas Diarias',
+                'ordering': ['-fecha', 'apartamento'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='registrovisita',
+            index=models.Index(condition=models.Q(('fecha_salida__isnull', False)), fields=['-fecha_salida'], name='registro_salida_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='visitadiaria',
+            constraint=models.UniqueConstraint(fields=('fecha', 'apartamento'), name='visita_diaria_unica'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingreso_edificio', '0007_visita_diaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditoriaAccionArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('accion', models.CharField(choices=[('CREATE', 'Crear'), ('UPDATE', 'Actualizar'), ('DELETE', 'Eliminar'), ('LOGIN', 'Iniciar Sesión'), ('LOGOUT', 'Cerrar Sesión')], max_length=20)),
+                ('modelo', models.CharField(max_length=50)),
+                ('id_objeto', models.IntegerField()),
+                ('descripcion', models.TextField(blank=True)),
+                ('fecha', models.DateTimeField()),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('fecha_archivado', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='auditorias_archivadas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Auditoría Archivada',
+                'verbose_name_plural': 'Auditorías Archivadas',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['-fecha'], name='ingreso_edi_fecha_2a3e55_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RegistroVisitaArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha_entrada', models.DateTimeField()),
+                ('fecha_salida', models.DateTimeField(blank=True, null=True)),
+                ('observaciones', models.TextField(blank=True)),
+                ('fecha_archivado', models.DateTimeField(auto_now_add=True)),
+                ('registrado_por', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='registros_archivados', to=settings.AUTH_USER_MODEL)),
+                ('visitante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registros_archivados', to='ingreso_edificio.visitante')),
+            ],
+            options={
+                'verbose_name': 'Registro de Visita Archivado',
+                'verbose_name_plural': 'Registros de Visita Archivados',
+                'ordering': ['-fecha_entrada'],
+                'indexes': [models.Index(fields=['-fecha_entrada'], name='ingreso_edi_fecha_e_f702bd_idx'), models.Index(fields=['visitante', '-fecha_entrada'], name='ingreso_edi_visitan_c29772_idx')],
+            },
+        ),
+    ]
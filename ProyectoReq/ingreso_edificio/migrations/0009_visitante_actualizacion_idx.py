@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingreso_edificio', '0008_archivo_historico'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitante',
+            index=models.Index(fields=['-fecha_actualizacion'], name='ingreso_edi_fecha_a_48592c_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingreso_edificio', '0009_visitante_actualizacion_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReporteJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('huella', models.CharField(max_length=64)),
+                ('parametros', models.JSONField(default=dict)),
+                ('formato', models.CharField(choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')], default='csv', max_length=10)),
+                ('version_datos', models.CharField(max_length=40)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completado', 'Completado'), ('fallido', 'Fallido')], default='pendiente', max_length=20)),
+                ('filas_totales', models.PositiveIntegerField(blank=True, null=True)),
+                ('filas_procesadas', models.PositiveIntegerField(default=0)),
+                ('archivo', models.CharField(blank=True, max_length=255)),
+                ('tamano', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio_proceso', models.DateTimeField(blank=True, null=True)),
+                ('fecha_finalizacion', models.DateTimeField(blank=True, null=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('solicitado_por', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reportes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Reporte en Segundo Plano',
+                'verbose_name_plural': 'Reportes en Segundo Plano',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['-fecha_creacion'], name='ingreso_edi_fecha_c_38b820_idx'), models.Index(fields=['huella', '-fecha_creacion'], name='ingreso_edi_huella_3eb4ac_idx'), models.Index(condition=models.Q(('estado__in', ['pendiente', 'en_proceso'])), fields=['fecha_creacion'], name='reporte_activo_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado__in', ['pendiente', 'en_proceso'])), fields=('huella',), name='reporte_activo_unico')],
+            },
+        ),
+    ]
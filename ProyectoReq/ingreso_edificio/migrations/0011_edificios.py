@@ -0,0 +1,129 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, router
+
+
+def crear_edificio_principal(apps, schema_editor):
+    # Los datos existentes pasan a ser del edificio principal (pk 1)
+    Edificio = apps.get_model('ingreso_edificio', 'Edificio')
+    alias = schema_editor.connection.alias
+    if router.allow_migrate_model(alias, Edificio):
+        Edificio.objects.using(alias).get_or_create(
+            pk=1, defaults={'nombre': 'Edificio principal', 'codigo': 'principal'}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingreso_edificio', '0010_reporte_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Edificio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255)),
+                ('codigo', models.SlugField(max_length=30, unique=True)),
+                ('direccion', models.CharField(blank=True, max_length=255)),
+                ('base_datos', models.CharField(default='default', max_length=100)),
+                ('activo', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Edificio',
+                'verbose_name_plural': 'Edificios',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.RunPython(crear_edificio_principal, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='visitadiaria',
+            name='visita_diaria_unica',
+        ),
+        migrations.AlterField(
+            model_name='auditoriaaccion',
+            name='usuario',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='auditorias', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='auditoriaaccionarchivada',
+            name='usuario',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='auditorias_archivadas', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='registrovisita',
+            name='registrado_por',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='registros_creados', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='registrovisitaarchivado',
+            name='registrado_por',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='registros_archivados', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='visitante',
+            name='documento',
+            field=models.CharField(max_length=20),
+        ),
+        migrations.AddField(
+            model_name='auditoriaaccion',
+            name='edificio',
+            field=models.ForeignKey(db_constraint=False, default=1, editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='auditorias', to='ingreso_edificio.edificio'),
+        ),
+        migrations.AddField(
+            model_name='auditoriaaccionarchivada',
+            name='edificio',
+            field=models.ForeignKey(db_constraint=False, default=1, editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='auditorias_archivadas', to='ingreso_edificio.edificio'),
+        ),
+        migrations.AddField(
+            model_name='ocupacion',
+            name='edificio',
+            field=models.OneToOneField(db_constraint=False, default=1, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ingreso_edificio.edificio'),
+        ),
+        migrations.AddField(
+            model_name='registrovisita',
+            name='edificio',
+            field=models.ForeignKey(db_constraint=False, default=1, editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='registros', to='ingreso_edificio.edificio'),
+        ),
+        migrations.AddField(
+            model_name='registrovisitaarchivado',
+            name='edificio',
+            field=models.ForeignKey(db_constraint=False, default=1, editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='registros_archivados', to='ingreso_edificio.edificio'),
+        ),
+        migrations.AddField(
+            model_name='reportejob',
+            name='edificio',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reportes', to='ingreso_edificio.edificio'),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='edificio',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usuarios', to='ingreso_edificio.edificio'),
+        ),
+        migrations.AddField(
+            model_name='visitadiaria',
+            name='edificio',
+            field=models.ForeignKey(db_constraint=False, default=1, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ingreso_edificio.edificio'),
+        ),
+        migrations.AddField(
+            model_name='visitante',
+            name='edificio',
+            field=models.ForeignKey(db_constraint=False, default=1, editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='visitantes', to='ingreso_edificio.edificio'),
+        ),
+        migrations.AddIndex(
+            model_name='visitante',
+            index=models.Index(fields=['documento'], name='visitante_documento_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='visitadiaria',
+            constraint=models.UniqueConstraint(fields=('fecha', 'apartamento', 'edificio'), name='visita_diaria_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='visitante',
+            constraint=models.UniqueConstraint(fields=('edificio', 'documento'), name='visitante_documento_unico'),
+        ),
+    ]
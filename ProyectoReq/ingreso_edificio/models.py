@@ -2,6 +2,86 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.core.validators import RegexValidator
+import unicodedata
+
+from .replicas import alias_lectura
+
+# Edificio de las instalaciones de un solo edificio y de los datos anteriores
+# al soporte de varios edificios (migración 0011)
+EDIFICIO_PRINCIPAL = 1
+
+def normalizar_texto(texto):
+    # Minúsculas y sin tildes, para búsquedas por prefijo sobre un índice
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold().strip()
+
+# ===== EDIFICIOS =====
+# Cada edificio guarda sus visitantes, visitas, auditoría, ocupación y resumen
+# diario en la base de datos indicada por base_datos (un alias de
+# settings.DATABASES); edificios.RouterEdificios dirige allí sus consultas.
+# Los edificios, usuarios y reportes viven siempre en la base 'default'.
+
+class Edificio(models.Model):
+    nombre = models.CharField(max_length=255)
+    codigo = models.SlugField(max_length=30, unique=True)
+    direccion = models.CharField(max_length=255, blank=True)
+    base_datos = models.CharField(max_length=100, default='default')
+    activo = models.BooleanField(default=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Edificio'
+        verbose_name_plural = 'Edificios'
+        ordering = ['nombre']
+    
+    def __str__(self):
+        return self.nombre
+    
+    def clean(self):
+        from django.conf import settings
+        from django.core.exceptions import ValidationError
+        if self.base_datos not in settings.DATABASES:
+            raise ValidationError({'base_datos': f'No existe la base de datos "{self.base_datos}" en DATABASES'})
+
+class EdificioQuerySet(models.QuerySet):
+    """Consultas de los modelos que viven en la base de cada edificio."""
+    
+    @property
+    def db(self):
+        # Las lecturas de las vistas de reportes pueden ir a la réplica de la
+        # base (ver replicas.py); las escrituras, siempre a la principal
+        alias = super().db
+        return alias if self._for_write else alias_lectura(alias)
+    
+    def del_edificio(self, edificio):
+        # edificio: instancia o pk. En una base dedicada todas las filas son
+        # del edificio y no hace falta filtrar (los índices se usan igual que
+        # con un solo edificio)
+        from .edificios import base_de, comparte_base
+        queryset = self.using(base_de(edificio))
+        if comparte_base(edificio):
+            queryset = queryset.filter(edificio=edificio)
+        return queryset
+    
+    def de_edificios(self, edificios):
+        # Una consulta por base de datos con los edificios que aloja: las
+        # vistas de varios edificios combinan los resultados
+        from .edificios import agrupar_por_base, comparte_base
+        consultas = []
+        for alias, pks in agrupar_por_base(edificios).items():
+            queryset = self.using(alias)
+            if len(pks) > 1 or comparte_base(pks[0]):
+                queryset = queryset.filter(edificio__in=pks)
+            consultas.append(queryset)
+        return consultas
+
+def _edificio(related_name, **kwargs):
+    # Sin restricción en la base: la tabla de edificios está en 'default' y la
+    # del modelo puede estar en la base de otro edificio
+    return models.ForeignKey(
+        Edificio, on_delete=models.PROTECT, related_name=related_name,
+        default=EDIFICIO_PRINCIPAL, db_constraint=False, **kwargs
+    )
 
 class Usuario(AbstractUser):
     ROLES = [
@@ -14,6 +94,8 @@ class Usuario(AbstractUser):
     telefono = models.CharField(max_length=20, blank=True)
     direccion = models.CharField(max_length=255, blank=True)
     documento = models.CharField(max_length=20, unique=True, null=True, blank=True)
+    # Edificio donde trabaja; vacío = puede consultar y elegir cualquiera
+    edificio = models.ForeignKey(Edificio, on_delete=models.SET_NULL, null=True, blank=True, related_name='usuarios')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
@@ -21,6 +103,9 @@ class Usuario(AbstractUser):
         verbose_name = 'Usuario'
         verbose_name_plural = 'Usuarios'
         ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['-fecha_creacion']),
+        ]
     
     def __str__(self):
         return f"{self.get_full_name()} ({self.rol})"
@@ -33,9 +118,11 @@ class Visitante(models.Model):
         ('CE', 'Cédula de Extranjería'),
     ]
     
+    edificio = _edificio('visitantes', editable=False)
     nombre = models.CharField(max_length=255)
+    nombre_normalizado = models.CharField(max_length=255, blank=True, editable=False, db_index=True)
     tipo_documento = models.CharField(max_length=3, choices=TIPO_DOCUMENTO)
-    documento = models.CharField(max_length=20, unique=True)
+    documento = models.CharField(max_length=20)
     email = models.EmailField(blank=True)
     telefono = models.CharField(max_length=20, blank=True)
     motivo_visita = models.CharField(max_length=255)
@@ -45,20 +132,45 @@ class Visitante(models.Model):
     fecha_registro = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
+    objects = EdificioQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Visitante'
         verbose_name_plural = 'Visitantes'
         ordering = ['-fecha_registro']
+        indexes = [
+            models.Index(fields=['-fecha_registro']),
+            # max(fecha_actualizacion) valida las respuestas condicionales
+            models.Index(fields=['-fecha_actualizacion']),
+            # Búsqueda por prefijo de documento en una base dedicada
+            models.Index(fields=['documento'], name='visitante_documento_idx'),
+        ]
+        constraints = [
+            # Un visitante se registra en cada edificio que visita
+            models.UniqueConstraint(fields=['edificio', 'documento'], name='visitante_documento_unico'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} ({self.documento})"
+    
+    def save(self, *args, **kwargs):
+        self.nombre_normalizado = normalizar_texto(self.nombre)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nombre' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'nombre_normalizado'}
+        super().save(*args, **kwargs)
 
 class RegistroVisita(models.Model):
+    edificio = _edificio('registros', editable=False)
     visitante = models.ForeignKey(Visitante, on_delete=models.CASCADE, related_name='registros')
     fecha_entrada = models.DateTimeField(auto_now_add=True)
     fecha_salida = models.DateTimeField(null=True, blank=True)
     observaciones = models.TextField(blank=True)
-    registrado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, related_name='registros_creados')
+    registrado_por = models.ForeignKey(
+        Usuario, on_delete=models.SET_NULL, null=True, related_name='registros_creados', db_constraint=False
+    )
+    
+    objects = EdificioQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Registro de Visita'
@@ -67,6 +179,19 @@ class RegistroVisita(models.Model):
         indexes = [
             models.Index(fields=['-fecha_entrada']),
             models.Index(fields=['visitante', '-fecha_entrada']),
+            # Índice parcial: solo las visitas abiertas, crece con la ocupación
+            # actual y no con el histórico
+            models.Index(
+                fields=['-fecha_entrada'],
+                condition=models.Q(fecha_salida__isnull=True),
+                name='registro_abierto_idx',
+            ),
+            # Egresos por rango de fechas (dashboard, resumen diario)
+            models.Index(
+                fields=['-fecha_salida'],
+                condition=models.Q(fecha_salida__isnull=False),
+                name='registro_salida_idx',
+            ),
         ]
     
     def __str__(self):
@@ -75,6 +200,55 @@ class RegistroVisita(models.Model):
     @property
     def en_edificio(self):
         return self.fecha_salida is None
+    
+    @property
+    def nombre_edificio(self):
+        # Desde la memoria de edificios: sin una consulta por fila en los listados
+        from .edificios import obtener_edificio
+        return obtener_edificio(self.edificio_id).nombre
+
+class Ocupacion(models.Model):
+    # Una fila por edificio con el contador de personas dentro; se actualiza
+    # en la misma transacción que cada entrada y salida
+    edificio = models.OneToOneField(
+        Edificio, on_delete=models.PROTECT, related_name='+', default=EDIFICIO_PRINCIPAL, db_constraint=False
+    )
+    personas_dentro = models.PositiveIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    objects = EdificioQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Ocupación'
+        verbose_name_plural = 'Ocupación'
+    
+    def __str__(self):
+        return f"{self.personas_dentro} personas en el edificio"
+
+class VisitaDiaria(models.Model):
+    # Resumen por edificio, día (zona horaria del edificio) y apartamento; la
+    # fila con apartamento vacío es el total del edificio. Se mantiene en la
+    # misma transacción que cada entrada y salida.
+    edificio = _edificio('+')
+    fecha = models.DateField()
+    apartamento = models.CharField(max_length=50, blank=True)
+    ingresos = models.PositiveIntegerField(default=0)
+    egresos = models.PositiveIntegerField(default=0)
+    pico_ocupacion = models.PositiveIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    objects = EdificioQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Visita Diaria'
+        verbose_name_plural = 'Visitas Diarias'
+        ordering = ['-fecha', 'apartamento']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'apartamento', 'edificio'], name='visita_diaria_unica'),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} {self.apartamento or 'Edificio'}: {self.ingresos} ingresos, {self.egresos} egresos"
 
 class AuditoriaAccion(models.Model):
     ACCIONES = [
@@ -85,14 +259,21 @@ class AuditoriaAccion(models.Model):
         ('LOGOUT', 'Cerrar Sesión'),
     ]
     
-    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, related_name='auditorias')
+    edificio = _edificio('auditorias', editable=False)
+    usuario = models.ForeignKey(
+        Usuario, on_delete=models.SET_NULL, null=True, related_name='auditorias', db_constraint=False
+    )
     accion = models.CharField(max_length=20, choices=ACCIONES)
     modelo = models.CharField(max_length=50)
     id_objeto = models.IntegerField()
     descripcion = models.TextField(blank=True)
-    fecha = models.DateTimeField(auto_now_add=True)
+    # default en lugar de auto_now_add: los eventos se escriben en lote y deben
+    # conservar la hora en que ocurrieron, no la del bulk_create
+    fecha = models.DateTimeField(default=timezone.now, editable=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     
+    objects = EdificioQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Auditoría de Acción'
         verbose_name_plural = 'Auditorías de Acciones'
@@ -104,3 +285,152 @@ class AuditoriaAccion(models.Model):
     
     def __str__(self):
         return f"{self.usuario} - {self.accion} - {self.fecha}"
+
+# ===== ARCHIVO HISTÓRICO =====
+# Copias de las filas antiguas de RegistroVisita y AuditoriaAccion movidas por
+# el comando archivar_historico. Conservan el id original (SQLite no reutiliza
+# ids con AUTOINCREMENT), así que se pueden combinar con las tablas vivas
+# ordenando por (fecha, id).
+
+class RegistroVisitaArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    edificio = _edificio('registros_archivados', editable=False)
+    visitante = models.ForeignKey(Visitante, on_delete=models.CASCADE, related_name='registros_archivados')
+    fecha_entrada = models.DateTimeField()
+    fecha_salida = models.DateTimeField(null=True, blank=True)
+    observaciones = models.TextField(blank=True)
+    registrado_por = models.ForeignKey(
+        Usuario, on_delete=models.SET_NULL, null=True, related_name='registros_archivados', db_constraint=False
+    )
+    fecha_archivado = models.DateTimeField(auto_now_add=True)
+    
+    objects = EdificioQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Registro de Visita Archivado'
+        verbose_name_plural = 'Registros de Visita Archivados'
+        ordering = ['-fecha_entrada']
+        indexes = [
+            models.Index(fields=['-fecha_entrada']),
+            models.Index(fields=['visitante', '-fecha_entrada']),
+        ]
+    
+    def __str__(self):
+        return f"{self.visitante.nombre} - {self.fecha_entrada.date()} (archivado)"
+    
+    @property
+    def en_edificio(self):
+        return self.fecha_salida is None
+    
+    @property
+    def nombre_edificio(self):
+        # Desde la memoria de edificios: sin una consulta por fila en los listados
+        from .edificios import obtener_edificio
+        return obtener_edificio(self.edificio_id).nombre
+
+class AuditoriaAccionArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    edificio = _edificio('auditorias_archivadas', editable=False)
+    usuario = models.ForeignKey(
+        Usuario, on_delete=models.SET_NULL, null=True, related_name='auditorias_archivadas', db_constraint=False
+    )
+    accion = models.CharField(max_length=20, choices=AuditoriaAccion.ACCIONES)
+    modelo = models.CharField(max_length=50)
+    id_objeto = models.IntegerField()
+    descripcion = models.TextField(blank=True)
+    fecha = models.DateTimeField()
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    fecha_archivado = models.DateTimeField(auto_now_add=True)
+    
+    objects = EdificioQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Auditoría Archivada'
+        verbose_name_plural = 'Auditorías Archivadas'
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['-fecha']),
+        ]
+    
+    def __str__(self):
+        return f"{self.usuario} - {self.accion} - {self.fecha} (archivada)"
+
+# ===== REPORTES EN SEGUNDO PLANO =====
+# Exportaciones grandes que se generan fuera de la petición (reportes.py).
+# Un trabajo activo es único por huella (parámetros + formato): pedir el mismo
+# reporte mientras se genera devuelve el trabajo existente.
+
+class ReporteJob(models.Model):
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    ]
+    FORMATOS = [
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+    ]
+    
+    huella = models.CharField(max_length=64)
+    parametros = models.JSONField(default=dict)
+    formato = models.CharField(max_length=10, choices=FORMATOS, default='csv')
+    # Versión de los datos al pedir el reporte: uno completado solo se reutiliza
+    # si los registros no cambiaron desde entonces
+    version_datos = models.CharField(max_length=40)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    solicitado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, related_name='reportes')
+    # Edificio del reporte; vacío si abarca varios edificios
+    edificio = models.ForeignKey(Edificio, on_delete=models.SET_NULL, null=True, blank=True, related_name='reportes')
+    filas_totales = models.PositiveIntegerField(null=True, blank=True)
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    archivo = models.CharField(max_length=255, blank=True)
+    tamano = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio_proceso = models.DateTimeField(null=True, blank=True)
+    fecha_finalizacion = models.DateTimeField(null=True, blank=True)
+    # El trabajador la actualiza con cada bloque; si deja de moverse el
+    # trabajo se considera abandonado y vuelve a la cola
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Reporte en Segundo Plano'
+        verbose_name_plural = 'Reportes en Segundo Plano'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['-fecha_creacion']),
+            models.Index(fields=['huella', '-fecha_creacion']),
+            # Cola de trabajo: solo los pendientes y en proceso
+            models.Index(
+                fields=['fecha_creacion'],
+                condition=models.Q(estado__in=['pendiente', 'en_proceso']),
+                name='reporte_activo_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['huella'],
+                condition=models.Q(estado__in=['pendiente', 'en_proceso']),
+                name='reporte_activo_unico',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Reporte {self.pk} ({self.formato}, {self.get_estado_display()})"
+    
+    @property
+    def activo(self):
+        return self.estado in ('pendiente', 'en_proceso')
+    
+    @property
+    def progreso(self):
+        if self.estado == 'completado':
+            return 100
+        if not self.filas_totales:
+            return 0
+        return min(99, self.filas_procesadas * 100 // self.filas_totales)
+    
+    @property
+    def nombre_descarga(self):
+        return f"reporte_ingresos_{self.pk}.{self.formato}.gz"
@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import estadisticas, eventos, resumen_diario
+from .edificios import base_de, pk_edificio
+from .models import Ocupacion, RegistroVisita
+
+# Ocupación en vivo: el contador de cada edificio se mantiene en la misma
+# transacción que la entrada o salida, y la lista nominal usa el índice
+# parcial de visitas abiertas (registro_abierto_idx), así que ninguna consulta
+# recorre el histórico. Las transacciones se abren en la base del edificio.
+
+
+def visitas_abiertas(edificio):
+    return RegistroVisita.objects.del_edificio(edificio).filter(fecha_salida__isnull=True).order_by('-fecha_entrada')
+
+
+def _ajustar_contador(edificio, delta):
+    actualizadas = Ocupacion.objects.using(base_de(edificio)).filter(edificio=edificio).update(
+        personas_dentro=F('personas_dentro') + delta,
+        fecha_actualizacion=timezone.now(),
+    )
+    if not actualizadas:
+        # Sin fila todavía (edificio nuevo o base creada sin migración de
+        # datos): el conteo ya incluye el cambio actual porque corre en la transacción
+        recalcular_ocupacion(edificio)
+
+
+def registrar_ingreso(registro):
+    edificio = registro.edificio_id
+    with transaction.atomic(using=base_de(edificio)):
+        registro.save()
+        _ajustar_contador(edificio, 1)
+        resumen_diario.ingresos_registrados(edificio, [registro], personas_dentro(edificio))
+        estadisticas.visita_registrada(edificio)
+        eventos.entradas_registradas(edificio, [registro])
+    return registro
+
+
+def registrar_egreso(registro, fecha_salida=None):
+    edificio = registro.edificio_id
+    fecha_salida = fecha_salida or timezone.now()
+    with transaction.atomic(using=base_de(edificio)):
+        # La actualización condicional evita descontar dos veces la misma
+        # visita si dos recepcionistas marcan la salida a la vez
+        cerradas = RegistroVisita.objects.del_edificio(edificio).filter(
+            pk=registro.pk,
+            fecha_salida__isnull=True
+        ).update(fecha_salida=fecha_salida)
+        if cerradas:
+            _ajustar_contador(edificio, -1)
+            resumen_diario.egresos_registrados(edificio, fecha_salida, [registro.visitante.apartamento_visitado])
+            estadisticas.salida_registrada(edificio)
+            eventos.salidas_registradas(edificio, [registro.pk], fecha_salida)
+    if cerradas:
+        registro.fecha_salida = fecha_salida
+    return bool(cerradas)
+
+
+def registrar_ingresos(edificio, registros):
+    # Entrada de un grupo: un solo INSERT por lote y un solo ajuste del contador
+    for registro in registros:
+        registro.edificio_id = pk_edificio(edificio)
+    alias = base_de(edificio)
+    with transaction.atomic(using=alias):
+        creados = RegistroVisita.objects.using(alias).bulk_create(registros)
+        if creados:
+            _ajustar_contador(edificio, len(creados))
+            resumen_diario.ingresos_registrados(edificio, creados, personas_dentro(edificio))
+            estadisticas.visita_registrada(edificio, len(creados))
+            eventos.entradas_registradas(edificio, creados)
+    return creados
+
+
+def registrar_egresos(edificio, visitante_ids, fecha_salida=None):
+    fecha_salida = fecha_salida or timezone.now()
+    with transaction.atomic(using=base_de(edificio)):
+        abiertas = RegistroVisita.objects.del_edificio(edificio).filter(
+            visitante_id__in=visitante_ids,
+            fecha_salida__isnull=True
+        )
+        filas = list(abiertas.values_list('pk', 'visitante__apartamento_visitado'))
+        cerradas = abiertas.update(fecha_salida=fecha_salida)
+        if cerradas:
+            _ajustar_contador(edificio, -cerradas)
+            resumen_diario.egresos_registrados(edificio, fecha_salida, [apartamento for _, apartamento in filas[:cerradas]])
+            estadisticas.salida_registrada(edificio, cerradas)
+            eventos.salidas_registradas(edificio, [pk for pk, _ in filas[:cerradas]], fecha_salida)
+    return cerradas
+
+
+def personas_dentro(edificio):
+    ocupacion = Ocupacion.objects.using(base_de(edificio)).filter(
+        edificio=edificio
+    ).values_list('personas_dentro', flat=True).first()
+    if ocupacion is None:
+        return recalcular_ocupacion(edificio)
+    return ocupacion
+
+
+def recalcular_ocupacion(edificio):
+    total = visitas_abiertas(edificio).count()
+    Ocupacion.objects.using(base_de(edificio)).update_or_create(
+        edificio_id=pk_edificio(edificio), defaults={'personas_dentro': total}
+    )
+    return total
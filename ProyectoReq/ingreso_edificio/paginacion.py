@@ -0,0 +1,228 @@
+import asyncio
+import heapq
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+# Paginación por cursor (keyset): en lugar de OFFSET se filtra a partir de la
+# última fila vista usando (campo, pk). En SQLite los índices secundarios
+# terminan implícitamente en el rowid, así que el índice sobre el campo de
+# fecha ya cubre el desempate por pk y cada página cuesta lo mismo.
+#
+# paginar_keyset también acepta una lista de querysets con los mismos campos
+# (por ejemplo, registros vivos y archivados): cada uno aporta su página y se
+# combinan por (campo, pk), que es único entre tablas porque los ids se
+# conservan. Las fuentes también pueden venir de bases distintas (un queryset
+# por base de edificios): ahí los ids se repiten, pero con campos de fecha un
+# empate exacto en (campo, pk) entre dos bases no ocurre en la práctica.
+#
+# El campo puede ser una fecha o un texto (nombre, documento) y el orden
+# ascendente o descendente; el cursor guarda el campo con el que se generó y
+# se ignora si la petición pide otro orden.
+#
+# Un campo que admite NULL (fecha_salida de las visitas abiertas) se recorre
+# en dos segmentos: las filas con valor por (campo, pk) sobre su índice y las
+# filas sin valor solo por pk, que ordenan como posteriores a cualquier valor
+# (primero en orden descendente). La clave completa es (sin valor, campo, pk)
+# y el cursor de una fila sin valor guarda None.
+#
+# apaginar_keyset es la variante asíncrona: las páginas de cada fuente y los
+# totales se piden juntos con el ORM asíncrono y se arma la misma página.
+
+
+class PaginaKeyset:
+    def __init__(self, objetos, url_siguiente=None, url_anterior=None, total=None,
+                 total_exacto=False, url_contar=None):
+        self.objetos = objetos
+        self.url_siguiente = url_siguiente
+        self.url_anterior = url_anterior
+        self.total = total
+        self.total_exacto = total_exacto
+        self.url_contar = url_contar
+
+    @property
+    def hay_siguiente(self):
+        return self.url_siguiente is not None
+
+    @property
+    def hay_anterior(self):
+        return self.url_anterior is not None
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    def __bool__(self):
+        return bool(self.objetos)
+
+
+def codificar_cursor(valor, pk, direccion, campo=None):
+    datos = {'pk': pk, 'd': direccion}
+    if isinstance(valor, datetime):
+        datos['v'] = valor.isoformat()
+    else:
+        datos['v'], datos['t'] = valor, 's'
+    if campo:
+        datos['c'] = campo
+    return urlsafe_base64_encode(json.dumps(datos).encode('utf-8'))
+
+
+def decodificar_cursor(token, campo=None):
+    if not token:
+        return None
+    try:
+        datos = json.loads(force_str(urlsafe_base64_decode(token)))
+        if campo and datos.get('c', campo) != campo:
+            return None
+        # Los cursores sin tipo son de antes de admitir campos de texto: fechas
+        valor = datos['v'] if datos.get('t') == 's' else datetime.fromisoformat(datos['v'])
+        return valor, int(datos['pk']), datos['d']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def estimar_total(queryset):
+    # Sin filtros, el rango de claves primarias aproxima el total leyendo
+    # solo los extremos del índice de pk; con filtros no hay estimación barata.
+    if queryset.query.where:
+        return None
+    extremos = queryset.model._default_manager.using(queryset.db).aggregate(minimo=Min('pk'), maximo=Max('pk'))
+    if extremos['minimo'] is None:
+        return 0
+    return extremos['maximo'] - extremos['minimo'] + 1
+
+
+async def aestimar_total(queryset):
+    if queryset.query.where:
+        return None
+    extremos = await queryset.model._default_manager.using(queryset.db).aaggregate(minimo=Min('pk'), maximo=Max('pk'))
+    if extremos['minimo'] is None:
+        return 0
+    return extremos['maximo'] - extremos['minimo'] + 1
+
+
+def _url_con(request, **cambios):
+    params = request.GET.copy()
+    for clave, valor in cambios.items():
+        params[clave] = valor
+    return '?' + params.urlencode()
+
+
+def _segmentos(queryset, campo):
+    # (queryset, sin_valor) por cada parte que se recorre por separado
+    if not queryset.model._meta.get_field(campo).null:
+        return [(queryset, False)]
+    return [
+        (queryset.filter(**{f'{campo}__isnull': False}), False),
+        (queryset.filter(**{f'{campo}__isnull': True}), True),
+    ]
+
+
+def _consulta_pagina(segmento, campo, cursor, tam_pagina, descendente=True):
+    queryset, sin_valor = segmento
+    # Hacia atrás ('a') se recorre en el sentido contrario al de la página
+    ascendente = descendente == bool(cursor and cursor[2] == 'a')
+    operador = 'gt' if ascendente else 'lt'
+    if sin_valor:
+        if cursor and cursor[0] is None:
+            queryset = queryset.filter(**{f'pk__{operador}': cursor[1]})
+        elif cursor and not ascendente:
+            # Antes de una fila con valor no hay filas sin valor
+            queryset = queryset.none()
+        return queryset.order_by('pk' if ascendente else '-pk')[:tam_pagina + 1]
+    if cursor:
+        valor, pk, _ = cursor
+        if valor is None:
+            # Las filas con valor van todas antes de las que no tienen
+            queryset = queryset.none() if ascendente else queryset
+        else:
+            queryset = queryset.filter(Q(**{f'{campo}__{operador}': valor}) | Q(**{campo: valor, f'pk__{operador}': pk}))
+    orden = (campo, 'pk') if ascendente else (f'-{campo}', '-pk')
+    return queryset.order_by(*orden)[:tam_pagina + 1]
+
+
+def _pagina(segmento, campo, cursor, tam_pagina, descendente=True):
+    return list(_consulta_pagina(segmento, campo, cursor, tam_pagina, descendente))
+
+
+async def _apagina(segmento, campo, cursor, tam_pagina, descendente=True):
+    return [obj async for obj in _consulta_pagina(segmento, campo, cursor, tam_pagina, descendente).aiterator()]
+
+
+def _preparar(request, queryset, campo, tam_pagina):
+    if tam_pagina is None:
+        tam_pagina = getattr(settings, 'PAGINACION_TAM_PAGINA', 50)
+    fuentes = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+    segmentos = [segmento for fuente in fuentes for segmento in _segmentos(fuente, campo)]
+    cursor = decodificar_cursor(request.GET.get('cursor'), campo)
+    return segmentos, cursor, tam_pagina, request.GET.get('total') == '1'
+
+
+def _clave(obj, campo):
+    valor = getattr(obj, campo)
+    return (valor is None, valor, obj.pk)
+
+
+def paginar_keyset(request, queryset, campo, tam_pagina=None, descendente=True):
+    segmentos, cursor, tam_pagina, exacto = _preparar(request, queryset, campo, tam_pagina)
+    paginas = [_pagina(segmento, campo, cursor, tam_pagina, descendente) for segmento in segmentos]
+    if exacto:
+        totales = [fuente.count() for fuente, _ in segmentos]
+    else:
+        totales = [estimar_total(fuente) for fuente, _ in segmentos]
+    return _armar_pagina(request, campo, cursor, tam_pagina, descendente, paginas, totales, exacto)
+
+
+async def apaginar_keyset(request, queryset, campo, tam_pagina=None, descendente=True):
+    segmentos, cursor, tam_pagina, exacto = _preparar(request, queryset, campo, tam_pagina)
+    resultados = await asyncio.gather(
+        *(_apagina(segmento, campo, cursor, tam_pagina, descendente) for segmento in segmentos),
+        *(fuente.acount() if exacto else aestimar_total(fuente) for fuente, _ in segmentos),
+    )
+    paginas, totales = resultados[:len(segmentos)], resultados[len(segmentos):]
+    return _armar_pagina(request, campo, cursor, tam_pagina, descendente, paginas, totales, exacto)
+
+
+def _armar_pagina(request, campo, cursor, tam_pagina, descendente, paginas, totales, exacto):
+    hay_siguiente = hay_anterior = False
+    hacia_atras = bool(cursor and cursor[2] == 'a')
+
+    filas = list(heapq.merge(
+        *paginas,
+        key=lambda obj: _clave(obj, campo),
+        reverse=descendente != hacia_atras,
+    ))[:tam_pagina + 1]
+
+    if hacia_atras:
+        hay_anterior = len(filas) > tam_pagina
+        filas = filas[:tam_pagina]
+        filas.reverse()
+        hay_siguiente = True
+    else:
+        hay_anterior = cursor is not None
+        hay_siguiente = len(filas) > tam_pagina
+        filas = filas[:tam_pagina]
+
+    url_siguiente = url_anterior = None
+    if filas and hay_siguiente:
+        ultimo = filas[-1]
+        url_siguiente = _url_con(request, cursor=codificar_cursor(getattr(ultimo, campo), ultimo.pk, 's', campo))
+    if filas and hay_anterior:
+        primero = filas[0]
+        url_anterior = _url_con(request, cursor=codificar_cursor(getattr(primero, campo), primero.pk, 'a', campo))
+
+    url_contar = None
+    if exacto:
+        total, total_exacto = sum(totales), True
+    else:
+        total = None if None in totales else sum(totales)
+        total_exacto = False
+        url_contar = _url_con(request, total='1')
+
+    return PaginaKeyset(filas, url_siguiente, url_anterior, total, total_exacto, url_contar)
@@ -0,0 +1,94 @@
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .edificios import base_de
+from .models import RegistroVisita, Visitante
+from .ocupacion import registrar_egresos, registrar_ingresos
+
+# Entrada o salida de un grupo (tours, cuadrillas, invitados de un evento):
+# todos los visitantes del edificio se validan con dos consultas y se
+# registran en la misma transacción que la validación (con transaction_mode
+# IMMEDIATE dos recepciones con el mismo grupo se turnan y la segunda ya ve
+# las entradas de la primera); cada identificador recibe su propio resultado.
+
+SEPARADORES = re.compile(r'[\s,;]+')
+
+
+def separar_documentos(texto):
+    return [token for token in SEPARADORES.split(texto or '') if token]
+
+
+def _resultado(identificador, visitante=None, ok=False, mensaje=''):
+    return {
+        'identificador': identificador,
+        'visitante': visitante,
+        'ok': ok,
+        'mensaje': mensaje,
+    }
+
+
+def procesar_grupo(operacion, edificio, documentos=(), ids=(), usuario=None, observaciones=''):
+    maximo = getattr(settings, 'REGISTRO_GRUPAL_MAXIMO', 500)
+    identificadores = [('documento', d) for d in documentos] + [('id', str(i)) for i in ids]
+    if len(identificadores) > maximo:
+        raise ValueError(f'El grupo supera el máximo de {maximo} visitantes')
+
+    with transaction.atomic(using=base_de(edificio)):
+        resultados = _procesar(operacion, edificio, identificadores, usuario, observaciones)
+
+    for resultado in resultados:
+        if resultado['ok']:
+            resultado['mensaje'] = 'Entrada registrada' if operacion == 'entrada' else 'Salida registrada'
+    return resultados
+
+
+def _procesar(operacion, edificio, identificadores, usuario, observaciones):
+    ids_validos = {int(valor) for tipo, valor in identificadores if tipo == 'id' and valor.isdigit()}
+    encontrados = Visitante.objects.del_edificio(edificio).filter(
+        Q(documento__in=[valor for tipo, valor in identificadores if tipo == 'documento'])
+        | Q(id__in=ids_validos)
+    ).only('id', 'edificio', 'nombre', 'documento', 'apartamento_visitado')
+    por_documento = {v.documento: v for v in encontrados}
+    por_id = {v.id: v for v in por_documento.values()}
+
+    abiertas = set(
+        RegistroVisita.objects.del_edificio(edificio).filter(
+            visitante_id__in=list(por_id),
+            fecha_salida__isnull=True
+        ).values_list('visitante_id', flat=True)
+    )
+
+    resultados = []
+    aceptados = []
+    vistos = set()
+    for tipo, valor in identificadores:
+        if tipo == 'documento':
+            visitante = por_documento.get(valor)
+        else:
+            visitante = por_id.get(int(valor)) if valor.isdigit() else None
+
+        if visitante is None:
+            resultados.append(_resultado(valor, mensaje='Visitante no registrado'))
+        elif visitante.id in vistos:
+            resultados.append(_resultado(valor, visitante, mensaje='Repetido en el grupo'))
+        elif operacion == 'entrada' and visitante.id in abiertas:
+            resultados.append(_resultado(valor, visitante, mensaje='Ya tiene una entrada activa'))
+        elif operacion == 'salida' and visitante.id not in abiertas:
+            resultados.append(_resultado(valor, visitante, mensaje='No hay registro de entrada'))
+        else:
+            resultados.append(_resultado(valor, visitante, ok=True))
+            aceptados.append(visitante)
+        if visitante is not None:
+            vistos.add(visitante.id)
+
+    if aceptados and operacion == 'entrada':
+        registrar_ingresos(edificio, [
+            RegistroVisita(visitante=v, registrado_por=usuario, observaciones=observaciones)
+            for v in aceptados
+        ])
+    elif aceptados:
+        registrar_egresos(edificio, [v.id for v in aceptados])
+    return resultados
@@ -0,0 +1,209 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+# Réplicas de lectura para consultas, reportes y analítica. Los escaneos
+# largos de esas vistas compiten con las entradas y salidas de recepción por
+# la misma base; con REPLICAS_LECTURA = {'default': 'default_replica'} (y lo
+# mismo para la base de cada edificio) las vistas marcadas con @en_replica y
+# los reportes en segundo plano leen de la réplica.
+#
+# Solo se usa la réplica si está al día:
+# - no va más atrás que REPLICA_RETRASO_MAXIMO segundos, y
+# - ya incluye la última escritura de quien pide la página: cada POST deja
+#   la hora en la cookie COOKIE_ESCRITURA y, hasta que la réplica la alcance,
+#   sus lecturas van a la base principal (leer lo que uno mismo escribió).
+# En cualquier otro caso, dentro de una transacción o fuera de esas vistas
+# se lee de la base principal. Las tablas globales (usuarios, edificios,
+# reportes) siempre van a la principal.
+#
+# Una réplica SQLite es una copia de solo lectura que mantiene el comando
+# sincronizar_replica; la hora de la copia es la fecha de modificación del
+# archivo. Con otros motores no se conoce el retraso y se supone el máximo.
+
+COOKIE_ESCRITURA = 'ultima_escritura'
+
+# Momento que la réplica debe incluir para poder usarla; None fuera de las
+# vistas y tareas de solo lectura
+_lectura = ContextVar('lectura_replica', default=None)
+
+
+def replicas():
+    return getattr(settings, 'REPLICAS_LECTURA', {})
+
+
+def retraso_maximo():
+    return getattr(settings, 'REPLICA_RETRASO_MAXIMO', 120)
+
+
+def ruta_sqlite(nombre):
+    # NAME de una réplica: "file:/ruta/copia.sqlite3?mode=ro"
+    nombre = str(nombre)
+    if nombre.startswith('file:'):
+        nombre = nombre[len('file:'):].split('?', 1)[0]
+    return nombre
+
+
+def sincronizada(replica):
+    # Hasta qué momento tiene datos la réplica (None: no disponible)
+    ajustes = settings.DATABASES.get(replica)
+    if ajustes is None:
+        return None
+    if ajustes['ENGINE'].endswith('sqlite3'):
+        try:
+            return os.stat(ruta_sqlite(ajustes['NAME'])).st_mtime
+        except OSError:
+            return None
+    return time.time() - retraso_maximo()
+
+
+def alias_lectura(alias):
+    """Alias desde el que leer los datos de `alias`: su réplica si está al día."""
+    lectura = _lectura.get()
+    if lectura is None:
+        return alias
+    if alias not in lectura['elegidas']:
+        # Se decide una vez por petición: todas sus consultas ven la misma copia
+        replica = replicas().get(alias)
+        sincronia = sincronizada(replica) if replica else None
+        vigente = (
+            sincronia is not None
+            and sincronia >= lectura['desde']
+            and time.time() - sincronia <= retraso_maximo()
+        )
+        lectura['elegidas'][alias] = replica if vigente else alias
+    if connections[alias].in_atomic_block:
+        # Dentro de una transacción se leen sus propias escrituras
+        return alias
+    return lectura['elegidas'][alias]
+
+
+@contextmanager
+def lectura_replica(desde=0):
+    # desde: marca de tiempo (epoch) que la réplica debe incluir
+    token = _lectura.set({'desde': desde, 'elegidas': {}})
+    try:
+        yield
+    finally:
+        _lectura.reset(token)
+
+
+def _ultima_escritura(request):
+    try:
+        return float(request.COOKIES.get(COOKIE_ESCRITURA, 0))
+    except ValueError:
+        return 0
+
+
+def _iterar_en_replica(contenido, desde):
+    # Las respuestas en streaming consultan la base al enviarse, después de
+    # que la vista terminó: cada bloque se genera dentro del contexto
+    iterador = iter(contenido)
+    while True:
+        with lectura_replica(desde):
+            try:
+                bloque = next(iterador)
+            except StopIteration:
+                return
+        yield bloque
+
+
+def _en_streaming(response, desde):
+    if response.streaming and not response.is_async:
+        response.streaming_content = _iterar_en_replica(response.streaming_content, desde)
+    return response
+
+
+def en_replica(vista):
+    """Decorador: las lecturas de la vista van a la réplica cuando está al día."""
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envoltura_async(request, *args, **kwargs):
+            desde = _ultima_escritura(request)
+            with lectura_replica(desde):
+                response = await vista(request, *args, **kwargs)
+            return _en_streaming(response, desde)
+        return envoltura_async
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        desde = _ultima_escritura(request)
+        with lectura_replica(desde):
+            response = vista(request, *args, **kwargs)
+        return _en_streaming(response, desde)
+    return envoltura
+
+
+class EscrituraMiddleware:
+    """Anota en una cookie la hora de cada petición que escribe (POST, etc.)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        return self.marcar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.marcar(request, await self.get_response(request))
+
+    def marcar(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            # Hora al responder: la transacción de la petición ya se confirmó
+            response.set_cookie(
+                COOKIE_ESCRITURA, f'{time.time():.3f}',
+                max_age=retraso_maximo(), httponly=True, samesite='Lax',
+            )
+        return response
+
+
+# ===== COPIA SQLITE =====
+
+def sincronizar_sqlite(origen, destino):
+    """Copia la base SQLite `origen` sobre `destino` (réplica de solo lectura).
+
+    La copia se hace con la API de backup, que lee una instantánea coherente
+    sin bloquear a los escritores (WAL). Primero se copia a un archivo
+    temporal y se pasa a journal_mode=DELETE, que se puede abrir con
+    mode=ro; después se vuelca sobre la réplica, cuyas conexiones abiertas
+    ven los datos nuevos en su siguiente consulta. La fecha de modificación
+    queda en el inicio de la copia: los datos son al menos de ese momento.
+    """
+    inicio = time.time()
+    temporal = f'{destino}.sincronizando'
+    fuente = sqlite3.connect(f'file:{origen}?mode=ro', uri=True)
+    try:
+        copia = sqlite3.connect(temporal)
+        try:
+            fuente.backup(copia)
+            copia.execute('PRAGMA journal_mode = DELETE')
+            replica = sqlite3.connect(destino, timeout=30)
+            try:
+                copia.backup(replica)
+            finally:
+                replica.close()
+        finally:
+            copia.close()
+    finally:
+        fuente.close()
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    os.utime(destino, (inicio, inicio))
+    return time.time() - inicio
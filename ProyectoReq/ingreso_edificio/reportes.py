@@ -0,0 +1,346 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import respuestas
+from .edificios import agrupar_por_base, pk_edificio
+from .exportacion import comprimir_gzip, filas_reporte, lineas_csv, lineas_ndjson
+from .fechas import filtro_rango
+from .models import EDIFICIO_PRINCIPAL, RegistroVisita, RegistroVisitaArchivado, ReporteJob
+from .replicas import lectura_replica, replicas
+
+# Reportes en segundo plano. Una exportación de varios años no debe ocupar un
+# worker web durante minutos ni reiniciarse si el proxy corta la conexión:
+# la petición solo crea un ReporteJob y un trabajador (hilos del proceso o el
+# comando procesar_reportes) escribe el archivo comprimido por bloques,
+# guardando el avance, y la página de reportes lo ofrece para descargar.
+#
+# Deduplicación: la huella resume filtros y formato. Mientras un trabajo con
+# la misma huella está pendiente o en proceso se devuelve ese (la restricción
+# reporte_activo_unico lo garantiza aun con peticiones simultáneas); uno ya
+# completado se reutiliza si los datos no cambiaron desde que se pidió.
+
+logger = logging.getLogger('ingreso_edificio.reportes')
+
+ACTIVOS = ('pendiente', 'en_proceso')
+
+LINEAS = {
+    'csv': lineas_csv,
+    'ndjson': lineas_ndjson,
+}
+
+# Relaciones con tablas de la base principal: desde la base de otro edificio
+# no hay JOIN posible y se cargan con una consulta aparte (la réplica de la
+# principal es una copia completa y sí admite el JOIN)
+RELACIONES_GLOBALES = {'registrado_por'}
+
+
+def _ajuste(nombre, por_defecto):
+    return getattr(settings, nombre, por_defecto)
+
+
+def directorio():
+    return Path(_ajuste('REPORTES_DIR', settings.BASE_DIR / 'reportes'))
+
+
+def ruta_archivo(job):
+    return directorio() / job.archivo
+
+
+# ===== FILTROS =====
+
+def filtrar_registros(registros, filtros):
+    # Rango semiabierto: fecha_fin incluye su día completo
+    registros = registros.filter(**filtro_rango(
+        'fecha_entrada', filtros.get('fecha_inicio'), filtros.get('fecha_fin')
+    ))
+    if filtros.get('visitante'):
+        registros = registros.filter(visitante=filtros['visitante'])
+    return registros
+
+
+def edificios_de_filtros(filtros):
+    # Un visitante pertenece a un solo edificio: filtrar por él acota la consulta
+    visitante = filtros.get('visitante')
+    if hasattr(visitante, 'edificio_id'):
+        return [visitante.edificio_id]
+    return [pk_edificio(edificio) for edificio in filtros.get('edificios') or [EDIFICIO_PRINCIPAL]]
+
+
+def _con_relaciones(queryset, relaciones):
+    if queryset.db in ('default', replicas().get('default')):
+        return queryset.select_related(*relaciones)
+    return queryset.select_related(
+        *(relacion for relacion in relaciones if relacion not in RELACIONES_GLOBALES)
+    ).prefetch_related(*(relacion for relacion in relaciones if relacion in RELACIONES_GLOBALES))
+
+
+def fuentes_registros(filtros, *relaciones):
+    # filtros['edificios']: edificios consultados. Devuelve un queryset o,
+    # con varias bases o "incluir archivados", la lista de fuentes (vivos y
+    # archivados de cada base); la paginación y la exportación las combinan
+    # por fecha de entrada
+    edificios = edificios_de_filtros(filtros)
+    modelos = [RegistroVisita, RegistroVisitaArchivado] if filtros.get('incluir_archivados') else [RegistroVisita]
+    fuentes = [
+        filtrar_registros(_con_relaciones(queryset, relaciones), filtros)
+        for modelo in modelos
+        for queryset in modelo.objects.de_edificios(edificios)
+    ]
+    return fuentes[0] if len(fuentes) == 1 else fuentes
+
+
+def exportacion_grande(fuentes):
+    # Cuenta como mucho umbral + 1 filas por fuente: el costo no crece con el rango
+    umbral = _ajuste('REPORTES_UMBRAL_SEGUNDO_PLANO', 50000)
+    if not umbral:
+        return False
+    fuentes = fuentes if isinstance(fuentes, (list, tuple)) else [fuentes]
+    return sum(fuente[:umbral + 1].count() for fuente in fuentes) > umbral
+
+
+# ===== SOLICITUD Y DEDUPLICACIÓN =====
+
+def parametros_de_filtros(filtros):
+    fecha_inicio, fecha_fin = filtros.get('fecha_inicio'), filtros.get('fecha_fin')
+    visitante = filtros.get('visitante')
+    return {
+        'fecha_inicio': fecha_inicio.isoformat() if fecha_inicio else None,
+        'fecha_fin': fecha_fin.isoformat() if fecha_fin else None,
+        'visitante': visitante.pk if visitante else None,
+        'incluir_archivados': bool(filtros.get('incluir_archivados')),
+        'edificios': sorted(edificios_de_filtros(filtros)),
+    }
+
+
+def filtros_de_parametros(parametros):
+    fecha_inicio, fecha_fin = parametros.get('fecha_inicio'), parametros.get('fecha_fin')
+    return {
+        'fecha_inicio': date.fromisoformat(fecha_inicio) if fecha_inicio else None,
+        'fecha_fin': date.fromisoformat(fecha_fin) if fecha_fin else None,
+        'visitante': parametros.get('visitante'),
+        'incluir_archivados': parametros.get('incluir_archivados', False),
+        'edificios': parametros.get('edificios') or [EDIFICIO_PRINCIPAL],
+    }
+
+
+def huella(parametros, formato):
+    texto = json.dumps({'parametros': parametros, 'formato': formato}, sort_keys=True)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def version_datos(edificios):
+    # Los mismos validadores del GET condicional en la base de cada edificio:
+    # entradas, salidas, ediciones de visitantes y la generación que avanzan
+    # los borrados y el archivo
+    valores = [
+        valor
+        for alias in sorted(agrupar_por_base(edificios))
+        for valor in respuestas.maximos('registros', 'visitantes', using=alias)
+    ]
+    valores.append(respuestas.generacion())
+    return hashlib.sha1('|'.join(str(valor) for valor in valores).encode('utf-8')).hexdigest()
+
+
+def solicitar_reporte(filtros, formato, usuario=None):
+    """Devuelve (job, creado): el trabajo equivalente existente o uno nuevo en cola."""
+    parametros = parametros_de_filtros(filtros)
+    clave = huella(parametros, formato)
+    version = version_datos(parametros['edificios'])
+
+    existente = ReporteJob.objects.filter(
+        Q(estado__in=ACTIVOS) | Q(estado='completado', version_datos=version),
+        huella=clave,
+    ).order_by('-fecha_creacion').first()
+    if existente and existente.activo:
+        if existente.fecha_actualizacion < _abandonados_desde():
+            # Sin avances: su trabajador murió o la cola del proceso se perdió
+            # al reiniciar. Se vuelve a encolar; reclamar() evita que lo
+            # procesen dos trabajadores
+            encolar(existente.pk)
+        return existente, False
+    if existente and ruta_archivo(existente).exists():
+        return existente, False
+
+    try:
+        with transaction.atomic():
+            job = ReporteJob.objects.create(
+                huella=clave,
+                parametros=parametros,
+                formato=formato,
+                version_datos=version,
+                solicitado_por=usuario,
+                # Vacío si abarca varios edificios (solo administradores lo ven)
+                edificio_id=parametros['edificios'][0] if len(parametros['edificios']) == 1 else None,
+            )
+    except IntegrityError:
+        # Otra petición creó el mismo trabajo entre la consulta y el INSERT
+        return ReporteJob.objects.get(huella=clave, estado__in=ACTIVOS), False
+
+    transaction.on_commit(lambda: encolar(job.pk))
+    return job, True
+
+
+# ===== TRABAJADOR =====
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def encolar(job_id):
+    # Sin trabajador local el trabajo espera al comando procesar_reportes
+    global _pool
+    if not _ajuste('REPORTES_TRABAJADOR_LOCAL', True):
+        return
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=_ajuste('REPORTES_HILOS', 1),
+                thread_name_prefix='reportes',
+            )
+    _pool.submit(_procesar_en_hilo, job_id)
+
+
+def _procesar_en_hilo(job_id):
+    try:
+        if reclamar(job_id):
+            generar(job_id)
+    except Exception:
+        logger.exception('Error procesando el reporte %s', job_id)
+    finally:
+        # El hilo no pasa por el ciclo de petición que cierra conexiones
+        # (la principal, las de cada edificio y sus réplicas)
+        connections.close_all()
+
+
+def _abandonados_desde():
+    return timezone.now() - timedelta(seconds=_ajuste('REPORTES_TIEMPO_ABANDONO', 300))
+
+
+def reclamar(job_id):
+    # UPDATE condicional: si dos trabajadores toman el mismo trabajo solo uno
+    # lo cambia de estado. Un trabajo en proceso sin avances recientes (el
+    # trabajador murió) también se puede reclamar
+    ahora = timezone.now()
+    return bool(ReporteJob.objects.filter(
+        Q(estado='pendiente') | Q(estado='en_proceso', fecha_actualizacion__lt=_abandonados_desde()),
+        pk=job_id,
+    ).update(estado='en_proceso', fecha_inicio_proceso=ahora, fecha_actualizacion=ahora, filas_procesadas=0))
+
+
+def reclamar_siguiente():
+    candidatos = ReporteJob.objects.filter(estado__in=ACTIVOS).order_by('fecha_creacion')
+    abandonados = _abandonados_desde()
+    for job_id, estado, actualizado in candidatos.values_list('pk', 'estado', 'fecha_actualizacion')[:20]:
+        if estado == 'en_proceso' and actualizado >= abandonados:
+            continue
+        if reclamar(job_id):
+            return job_id
+    return None
+
+
+def procesar_pendientes(limite=None, al_terminar=None):
+    procesados = 0
+    while limite is None or procesados < limite:
+        job_id = reclamar_siguiente()
+        if job_id is None:
+            break
+        completado = generar(job_id)
+        procesados += 1
+        if al_terminar:
+            al_terminar(job_id, completado)
+    return procesados
+
+
+class Progreso:
+    """Cuenta las filas escritas y guarda el avance cada `paso` filas."""
+
+    def __init__(self, job_id, paso):
+        self.job_id = job_id
+        self.paso = paso
+        self.filas = 0
+
+    def contar(self, filas):
+        for fila in filas:
+            yield fila
+            self.filas += 1
+            if self.filas % self.paso == 0:
+                self.guardar()
+
+    def guardar(self):
+        ReporteJob.objects.filter(pk=self.job_id).update(
+            filas_procesadas=self.filas,
+            fecha_actualizacion=timezone.now(),
+        )
+
+
+def generar(job_id):
+    # Cualquier error deja el trabajo como fallido: uno que quedara en
+    # proceso bloquearía nuevas solicitudes con los mismos parámetros
+    job = ReporteJob.objects.get(pk=job_id)
+    try:
+        # Los registros se leen de la réplica si ya incluye lo que había al pedirlo
+        with lectura_replica(desde=job.fecha_creacion.timestamp()):
+            _generar(job)
+    except Exception as error:
+        logger.exception('Falló el reporte %s', job.pk)
+        ahora = timezone.now()
+        ReporteJob.objects.filter(pk=job.pk).update(
+            estado='fallido', error=str(error)[:1000], fecha_finalizacion=ahora, fecha_actualizacion=ahora,
+        )
+        return False
+    return True
+
+
+def _generar(job):
+    fuentes = fuentes_registros(filtros_de_parametros(job.parametros))
+    total = sum(fuente.count() for fuente in (fuentes if isinstance(fuentes, list) else [fuentes]))
+    ReporteJob.objects.filter(pk=job.pk).update(filas_totales=total, fecha_actualizacion=timezone.now())
+
+    # El nombre lleva parte de la huella: no se puede adivinar a partir del id
+    job.archivo = f'{job.pk}-{job.huella[:16]}.{job.formato}.gz'
+    destino = ruta_archivo(job)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    temporal = destino.with_name(destino.name + '.parcial')
+    progreso = Progreso(job.pk, _ajuste('REPORTES_PASO_PROGRESO', 5000))
+    lineas = LINEAS[job.formato](progreso.contar(filas_reporte(fuentes)))
+
+    try:
+        with open(temporal, 'wb') as archivo:
+            for bloque in comprimir_gzip(lineas):
+                archivo.write(bloque)
+        # Renombrar al final: nunca se ofrece un archivo a medio escribir
+        os.replace(temporal, destino)
+    except BaseException:
+        temporal.unlink(missing_ok=True)
+        raise
+
+    ahora = timezone.now()
+    ReporteJob.objects.filter(pk=job.pk).update(
+        estado='completado',
+        archivo=job.archivo,
+        tamano=destino.stat().st_size,
+        filas_procesadas=progreso.filas,
+        fecha_finalizacion=ahora,
+        fecha_actualizacion=ahora,
+    )
+
+
+def limpiar_vencidos():
+    # Los archivos terminados se conservan REPORTES_VIGENCIA segundos
+    limite = timezone.now() - timedelta(seconds=_ajuste('REPORTES_VIGENCIA', 86400))
+    vencidos = ReporteJob.objects.filter(estado__in=('completado', 'fallido'), fecha_finalizacion__lt=limite)
+    for job in vencidos.only('pk', 'archivo'):
+        if job.archivo:
+            ruta_archivo(job).unlink(missing_ok=True)
+    return vencidos.delete()[0]
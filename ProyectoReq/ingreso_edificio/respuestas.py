@@ -0,0 +1,217 @@
+import hashlib
+from datetime import timezone as tz
+from functools import lru_cache, wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.middleware.gzip import GZipMiddleware
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition
+
+from .edificios import agrupar_por_base, edificios_consultados
+from .models import RegistroVisita, Visitante
+from .replicas import alias_lectura
+
+# GET condicional para las páginas que recepción refresca o consulta en
+# bucle. El validador sale de los máximos de columnas indexadas (una sola
+# consulta con subconsultas MAX, que SQLite resuelve leyendo un extremo del
+# índice): una entrada mueve max(fecha_entrada), una salida max(fecha_salida)
+# y una edición max(fecha_actualizacion). Los borrados no mueven ningún
+# máximo, así que incrementan una generación en la caché; los cambios de
+# usuarios (pocos, y ya seguidos por señales) también. Si el ETag coincide la
+# vista devuelve 304 sin consultar nada más ni renderizar la plantilla. Con
+# varios edificios se consultan los máximos de la base de cada edificio mostrado.
+# En las vistas que leen de la réplica los máximos salen de la misma réplica:
+# el ETag describe los datos que realmente se muestran.
+
+CLAVE_GENERACION = 'respuestas:generacion'
+
+# nombre: [(modelo, columna)]
+COLUMNAS = {
+    'registros': [(RegistroVisita, 'fecha_entrada'), (RegistroVisita, 'fecha_salida')],
+    'visitantes': [(Visitante, 'fecha_actualizacion')],
+}
+
+
+def generacion():
+    valor = cache.get(CLAVE_GENERACION)
+    if valor is None:
+        cache.add(CLAVE_GENERACION, 1, None)
+        valor = cache.get(CLAVE_GENERACION, 1)
+    return valor
+
+
+def marcar_cambio(using=None, **kwargs):
+    # Receptor de señales (borrados, usuarios) y llamado por el archivo
+    # histórico tras cada lote, con la base donde ocurrió el cambio
+    def incrementar():
+        try:
+            cache.incr(CLAVE_GENERACION)
+        except ValueError:
+            cache.add(CLAVE_GENERACION, 1, None)
+    transaction.on_commit(incrementar, using=using)
+
+
+def maximos(*tablas, using='default'):
+    columnas = [columna for tabla in tablas for columna in COLUMNAS[tabla]]
+    connection = connections[using]
+    q = connection.ops.quote_name
+    subconsultas = [
+        f'(SELECT MAX({q(columna)}) FROM {q(modelo._meta.db_table)} WHERE {q(columna)} IS NOT NULL)'
+        for modelo, columna in columnas
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(subconsultas))
+        return list(cursor.fetchone())
+
+
+@lru_cache(maxsize=1)
+def version_estaticos():
+    # Tras un despliegue con CSS o JS nuevos cambian los nombres con hash
+    nombres = sorted(getattr(staticfiles_storage, 'hashed_files', {}).values())
+    return hashlib.sha1('|'.join(nombres).encode('utf-8')).hexdigest()[:12]
+
+
+def _como_fecha(valor):
+    if valor is None:
+        return None
+    fecha = valor if hasattr(valor, 'tzinfo') else parse_datetime(str(valor))
+    if fecha is not None and timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha, tz.utc)
+    return fecha
+
+
+class Sello:
+    def __init__(self, request, tablas):
+        usuario = request.user
+        edificios = edificios_consultados(request)
+        valores = [
+            valor
+            for alias in sorted(agrupar_por_base(edificios))
+            for valor in maximos(*tablas, using=alias_lectura(alias))
+        ]
+        fechas = [_como_fecha(valor) for valor in valores]
+        fechas.append(usuario.fecha_actualizacion)
+        self.ultima_modificacion = max((f for f in fechas if f is not None), default=None)
+        partes = [
+            *(str(valor) for valor in valores),
+            str(generacion()),
+            version_estaticos(),
+            # El edificio elegido se guarda en la sesión, no en la URL
+            ','.join(str(edificio.pk) for edificio in edificios),
+            # Los totales "de hoy" cambian a medianoche aunque no haya escrituras
+            timezone.localdate().isoformat(),
+            # La página lleva el nombre y el menú del usuario, y el token CSRF
+            # cambia con cada inicio de sesión
+            str(usuario.pk), str(usuario.fecha_actualizacion),
+            request.session.session_key or '',
+            request.get_full_path(),
+        ]
+        self.etag = hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()
+
+
+def _sello(request, tablas):
+    # condition() pide el ETag y el Last-Modified por separado: se calculan una vez
+    if not hasattr(request, '_sello_condicional'):
+        usable = (
+            request.method in ('GET', 'HEAD')
+            and request.user.is_authenticated
+            # Con mensajes pendientes hay que renderizar para mostrarlos
+            and not len(get_messages(request))
+        )
+        request._sello_condicional = Sello(request, tablas) if usable else None
+    return request._sello_condicional
+
+
+def condicional(*tablas):
+    """Decorador: ETag y Last-Modified a partir de las tablas que muestra la vista."""
+    def etag(request, *args, **kwargs):
+        sello = _sello(request, tablas)
+        return sello.etag if sello else None
+
+    def ultima_modificacion(request, *args, **kwargs):
+        sello = _sello(request, tablas)
+        return sello.ultima_modificacion if sello else None
+
+    def decorador(vista):
+        vista_condicional = condition(etag_func=etag, last_modified_func=ultima_modificacion)(vista)
+
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltura_async(request, *args, **kwargs):
+                if not getattr(settings, 'RESPUESTAS_CONDICIONALES', True):
+                    return await vista(request, *args, **kwargs)
+                # condition() llama a las funciones del sello de forma síncrona:
+                # se calcula antes, fuera del event loop (consulta y sesión)
+                await sync_to_async(_sello)(request, tablas)
+                response = await vista_condicional(request, *args, **kwargs)
+                response.setdefault('Cache-Control', 'private, no-cache')
+                return response
+            return envoltura_async
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if not getattr(settings, 'RESPUESTAS_CONDICIONALES', True):
+                return vista(request, *args, **kwargs)
+            response = vista_condicional(request, *args, **kwargs)
+            # El navegador debe revalidar siempre: la respuesta es privada y
+            # cambia con cada escritura
+            response.setdefault('Cache-Control', 'private, no-cache')
+            return response
+        return envoltura
+    return decorador
+
+
+# ===== COMPRESIÓN =====
+
+# Contenido que ya viene comprimido (exportación .csv.gz) y eventos en vivo,
+# que gzip retendría en su búfer en lugar de enviarlos al publicarse
+TIPOS_COMPRIMIDOS = ('application/gzip', 'application/zip', 'image/', 'text/event-stream')
+
+
+def codificaciones_aceptadas(cabecera):
+    # Accept-Encoding con sus pesos: "gzip;q=0" rechaza gzip
+    pesos = {}
+    for parte in cabecera.split(','):
+        nombre, _, parametros = parte.partition(';')
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        peso = 1.0
+        for parametro in parametros.split(';'):
+            clave, _, valor = parametro.strip().partition('=')
+            if clave.lower() == 'q':
+                try:
+                    peso = float(valor)
+                except ValueError:
+                    peso = 0.0
+        pesos[nombre] = peso
+    return pesos
+
+
+def acepta(request, codificacion):
+    pesos = codificaciones_aceptadas(request.headers.get('Accept-Encoding', ''))
+    return pesos.get(codificacion, pesos.get('*', 0.0)) > 0
+
+
+class CompresionMiddleware(GZipMiddleware):
+    """GZipMiddleware solo para cuerpos grandes que no vengan ya comprimidos."""
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith(TIPOS_COMPRIMIDOS):
+            return response
+        # GZipMiddleware solo busca "gzip" en la cabecera, también con q=0
+        if not acepta(request, 'gzip'):
+            patch_vary_headers(response, ('Accept-Encoding',))
+            return response
+        minimo = getattr(settings, 'COMPRESION_TAMANO_MINIMO', 1024)
+        if not response.streaming and len(response.content) < minimo:
+            return response
+        return super().process_response(request, response)
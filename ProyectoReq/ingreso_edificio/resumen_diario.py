@@ -0,0 +1,206 @@
+import heapq
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .edificios import base_de, pk_edificio
+from .fechas import filtro_rango, inicio_dia
+from .models import RegistroVisita, RegistroVisitaArchivado, VisitaDiaria
+
+# Resumen diario de visitas (VisitaDiaria) de cada edificio. Los caminos de
+# escritura de ocupacion.py lo ajustan con UPDATE ... SET ingresos = ingresos + n
+# dentro de su transacción; recalcular_rango() lo reconstruye desde
+# RegistroVisita para cargar el histórico o corregir desviaciones. Ambos
+# caminos deben dar las mismas filas.
+
+EDIFICIO = ''
+
+
+def _acumular(edificio, fecha, apartamento, ingresos=0, egresos=0, ocupacion=None):
+    cambios = {
+        'ingresos': F('ingresos') + ingresos,
+        'egresos': F('egresos') + egresos,
+        'fecha_actualizacion': timezone.now(),
+    }
+    if ocupacion is not None:
+        cambios['pico_ocupacion'] = Greatest('pico_ocupacion', ocupacion)
+    fila = VisitaDiaria.objects.using(base_de(edificio)).filter(edificio=edificio, fecha=fecha, apartamento=apartamento)
+    if not fila.update(**cambios):
+        # Primer movimiento del día: se crea la fila (ignorando la de otra
+        # transacción concurrente) y se vuelve a aplicar el ajuste
+        VisitaDiaria.objects.using(base_de(edificio)).bulk_create(
+            _filas_nuevas(edificio, fecha, apartamento), ignore_conflicts=True,
+        )
+        fila.update(**cambios)
+
+
+def _filas_nuevas(edificio, fecha, apartamento):
+    # El pico parte de quienes seguían dentro al empezar el día, como en
+    # _picos_por_dia. Los días sin movimientos desde la fila anterior no
+    # tienen fila todavía: la ocupación no cambió en ellos, así que se crean
+    # con ese mismo pico
+    dentro = _dentro_al_iniciar(edificio, fecha, apartamento)
+    dias = [fecha]
+    if dentro:
+        anterior = VisitaDiaria.objects.using(base_de(edificio)).filter(
+            edificio=edificio, apartamento=apartamento, fecha__lt=fecha
+        ).order_by('-fecha').values_list('fecha', flat=True).first()
+        if anterior:
+            dias += [anterior + timedelta(days=n) for n in range(1, (fecha - anterior).days)]
+    return [
+        VisitaDiaria(edificio_id=pk_edificio(edificio), fecha=dia, apartamento=apartamento, pico_ocupacion=dentro)
+        for dia in dias
+    ]
+
+
+def _dentro_al_iniciar(edificio, fecha, apartamento):
+    # Dos conteos en lugar de un OR para usar los índices parciales de
+    # visitas abiertas y de salidas
+    inicio = inicio_dia(fecha)
+    anteriores = RegistroVisita.objects.del_edificio(edificio).filter(fecha_entrada__lt=inicio)
+    if apartamento != EDIFICIO:
+        anteriores = anteriores.filter(visitante__apartamento_visitado=apartamento)
+    return (
+        anteriores.filter(fecha_salida__isnull=True).count()
+        + anteriores.filter(fecha_salida__gte=inicio).count()
+    )
+
+
+def _abiertas_por_apartamento(edificio, apartamentos):
+    return dict(
+        RegistroVisita.objects.del_edificio(edificio).filter(
+            fecha_salida__isnull=True,
+            visitante__apartamento_visitado__in=apartamentos,
+        ).values_list('visitante__apartamento_visitado').annotate(total=Count('id'))
+    )
+
+
+def ingresos_registrados(edificio, registros, personas_dentro):
+    # registros: visitas recién creadas (con visitante cargado);
+    # personas_dentro: ocupación del edificio ya incluyendo estas entradas
+    por_dia = Counter(
+        (timezone.localdate(r.fecha_entrada), r.visitante.apartamento_visitado)
+        for r in registros
+    )
+    abiertas = _abiertas_por_apartamento(edificio, {apartamento for _, apartamento in por_dia})
+    for fecha, total in Counter(fecha for fecha, _ in por_dia.elements()).items():
+        _acumular(edificio, fecha, EDIFICIO, ingresos=total, ocupacion=personas_dentro)
+    for (fecha, apartamento), total in por_dia.items():
+        _acumular(edificio, fecha, apartamento, ingresos=total, ocupacion=abiertas.get(apartamento, 0))
+
+
+def egresos_registrados(edificio, fecha_salida, apartamentos):
+    # apartamentos: uno por visita cerrada (puede repetirse)
+    if not apartamentos:
+        return
+    fecha = timezone.localdate(fecha_salida)
+    _acumular(edificio, fecha, EDIFICIO, egresos=len(apartamentos))
+    for apartamento, total in Counter(apartamentos).items():
+        _acumular(edificio, fecha, apartamento, egresos=total)
+
+
+# ===== RECONSTRUCCIÓN =====
+
+def _conteos_por_dia(edificio, campo, desde, hasta):
+    filas = RegistroVisita.objects.del_edificio(edificio).filter(
+        **filtro_rango(campo, desde, hasta)
+    ).annotate(
+        dia=TruncDate(campo, tzinfo=timezone.get_current_timezone())
+    ).values_list('dia', 'visitante__apartamento_visitado').annotate(total=Count('id')).order_by()
+    conteos = Counter()
+    for dia, apartamento, total in filas:
+        conteos[dia, apartamento] += total
+        conteos[dia, EDIFICIO] += total
+    return conteos
+
+
+def _picos_por_dia(edificio, desde, hasta):
+    # Recorre entradas y salidas del rango en orden cronológico partiendo de
+    # las visitas que ya estaban abiertas al inicio del primer día
+    inicio = inicio_dia(desde)
+    fin = inicio_dia(hasta + timedelta(days=1))
+    registros = RegistroVisita.objects.del_edificio(edificio)
+    dentro = Counter(dict(
+        registros.filter(fecha_entrada__lt=inicio).filter(
+            Q(fecha_salida__isnull=True) | Q(fecha_salida__gte=inicio)
+        ).values_list('visitante__apartamento_visitado').annotate(total=Count('id')).order_by()
+    ))
+    dentro[EDIFICIO] = sum(dentro.values())
+
+    entradas = registros.filter(
+        fecha_entrada__gte=inicio, fecha_entrada__lt=fin
+    ).order_by('fecha_entrada').values_list('fecha_entrada', 'visitante__apartamento_visitado')
+    salidas = registros.filter(
+        fecha_salida__gte=inicio, fecha_salida__lt=fin
+    ).order_by('fecha_salida').values_list('fecha_salida', 'visitante__apartamento_visitado')
+    # Con la misma hora, las salidas (0) se procesan antes que las entradas (1)
+    eventos = heapq.merge(
+        ((fecha, 0, apartamento) for fecha, apartamento in salidas.iterator(chunk_size=2000)),
+        ((fecha, 1, apartamento) for fecha, apartamento in entradas.iterator(chunk_size=2000)),
+    )
+
+    picos = defaultdict(int)
+
+    def abrir_dia(dia):
+        for apartamento, total in dentro.items():
+            if total > 0:
+                picos[dia, apartamento] = max(picos[dia, apartamento], total)
+
+    dia = desde
+    abrir_dia(dia)
+    for fecha, es_entrada, apartamento in eventos:
+        fecha_local = timezone.localdate(fecha)
+        while dia < fecha_local:
+            dia += timedelta(days=1)
+            abrir_dia(dia)
+        delta = 1 if es_entrada else -1
+        for clave in (apartamento, EDIFICIO):
+            dentro[clave] = max(dentro[clave] + delta, 0)
+            picos[dia, clave] = max(picos[dia, clave], dentro[clave])
+    while dia < hasta:
+        dia += timedelta(days=1)
+        abrir_dia(dia)
+    return picos
+
+
+def recalcular_rango(edificio, desde=None, hasta=None):
+    hasta = hasta or timezone.localdate()
+    registros = RegistroVisita.objects.del_edificio(edificio)
+    archivados = RegistroVisitaArchivado.objects.del_edificio(edificio)
+    if desde is None:
+        primera = registros.order_by('fecha_entrada').values_list('fecha_entrada', flat=True).first()
+        desde = timezone.localdate(primera) if primera else hasta
+        archivada = archivados.order_by('-fecha_entrada').values_list('fecha_entrada', flat=True).first()
+        if archivada:
+            desde = min(max(desde, timezone.localdate(archivada) + timedelta(days=1)), hasta)
+    if desde > hasta:
+        raise ValueError('La fecha inicial es posterior a la final')
+    if archivados.filter(fecha_entrada__gte=inicio_dia(desde)).exists():
+        # El resumen de los días archivados se conserva: reconstruirlo solo
+        # con las tablas vivas lo dejaría incompleto
+        raise ValueError('El rango incluye visitas archivadas; use un --desde posterior al archivo')
+
+    ingresos = _conteos_por_dia(edificio, 'fecha_entrada', desde, hasta)
+    egresos = _conteos_por_dia(edificio, 'fecha_salida', desde, hasta)
+    picos = _picos_por_dia(edificio, desde, hasta)
+
+    filas = [
+        VisitaDiaria(
+            edificio_id=pk_edificio(edificio),
+            fecha=fecha,
+            apartamento=apartamento,
+            ingresos=ingresos.get((fecha, apartamento), 0),
+            egresos=egresos.get((fecha, apartamento), 0),
+            pico_ocupacion=picos.get((fecha, apartamento), 0),
+        )
+        for fecha, apartamento in sorted(set(ingresos) | set(egresos) | set(picos))
+    ]
+    alias = base_de(edificio)
+    with transaction.atomic(using=alias):
+        VisitaDiaria.objects.using(alias).filter(edificio=edificio, fecha__gte=desde, fecha__lte=hasta).delete()
+        VisitaDiaria.objects.using(alias).bulk_create(filas, batch_size=1000)
+    return desde, hasta, len(filas)
@@ -1,3 +1,1220 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from . import analitica, archivo, auditoria, estadisticas, exportacion, ocupacion, reportes, resumen_diario, urls, views
+from .datos_sinteticos import generar_datos
+from .edificios import RouterEdificios, olvidar_edificios
+from .fechas import inicio_dia
+from .medicion import MedicionMiddleware
+from .eventos import canal
+from .replicas import COOKIE_ESCRITURA, alias_lectura, lectura_replica, sincronizar_sqlite
+from .models import (
+    EDIFICIO_PRINCIPAL, AuditoriaAccion, Edificio, RegistroVisita, RegistroVisitaArchivado, ReporteJob, Usuario, VisitaDiaria, Visitante,
+    normalizar_texto,
+)
+
+# Presupuesto de consultas y tamaño de respuesta por ruta, medido con la caché
+# vacía (el peor caso) sobre un conjunto de datos sintéticos. Si una vista o
+# plantilla introduce un N+1 o un queryset sin límite, el número de consultas
+# o el tamaño de la respuesta supera el presupuesto y la prueba falla
+# mostrando el SQL ejecutado.
+
+VISITAS = 3000
+
+# nombre de la ruta: (máximo de consultas, máximo de KB en la respuesta)
+PRESUPUESTOS = {
+    'login': (0, 10),
+    'logout': (4, 1),
+    'dashboard': (9, 40),
+    'crear_usuario': (2, 30),
+    'listar_usuarios': (4, 40),
+    'editar_usuario': (3, 30),
+    'eliminar_usuario': (3, 30),
+    'registrar_visitante': (2, 30),
+    'listar_visitantes': (5, 80),
+    'buscar_visitantes': (4, 5),
+    'editar_visitante': (3, 30),
+    'registrar_entrada': (3, 30),
+    'registrar_salida': (2, 30),
+    'registro_grupal': (2, 30),
+    'lista_evacuacion': (5, 40),
+    'consultar_registros': (5, 80),
+    'generar_reporte': (4, 80),
+    'analitica_visitas': (10, 50),
+    'reportes_programados': (3, 40),
+    'descargar_reporte': (3, 1),
+    'cambiar_edificio': (2, 1),
+    'eventos_dashboard': (8, 1),
+    'api_registros': (4, 40),
+    'api_visitantes': (4, 40),
+    'api_usuarios': (4, 10),
+}
+
+# Parámetros de consulta por ruta (los ids de la URL se resuelven en url())
+PARAMETROS = {
+    'buscar_visitantes': '?q=mar',
+}
+
+# Vistas cuyo número de consultas no debe depender del tamaño de las tablas
+CONSTANTES = [
+    'dashboard', 'listar_usuarios', 'listar_visitantes', 'buscar_visitantes',
+    'lista_evacuacion', 'consultar_registros', 'generar_reporte', 'analitica_visitas', 'reportes_programados',
+    'api_registros', 'api_visitantes', 'api_usuarios',
+]
+
+
+def rutas_con_nombre():
+    return [patron.name for patron in urls.urlpatterns if isinstance(patron, URLPattern) and patron.name]
+
+
+@override_settings(AUDITORIA_MODO='sincrono', MEDICION_ACTIVA=False)
+class PresupuestoConsultasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(VISITAS, semilla=7)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+        cls.recepcionista = Usuario.objects.filter(rol='recepcionista').first()
+        cls.visitante = Visitante.objects.first()
+        # Pendiente: la descarga redirige a la lista sin leer ningún archivo
+        cls.reporte = ReporteJob.objects.create(huella='0' * 64, version_datos='0', solicitado_por=cls.administrador)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.administrador)
+
+    def url(self, nombre):
+        argumentos = {
+            'editar_usuario': [self.recepcionista.id],
+            'eliminar_usuario': [self.recepcionista.id],
+            'editar_visitante': [self.visitante.id],
+            'descargar_reporte': [self.reporte.id],
+        }
+        return reverse(nombre, args=argumentos.get(nombre)) + PARAMETROS.get(nombre, '')
+
+    def medir(self, nombre, cliente=None):
+        cache.clear()
+        cliente = cliente or self.client
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = cliente.get(self.url(nombre))
+            cuerpo = b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+        return respuesta, cuerpo, consultas.captured_queries
+
+    def detalle_sql(self, consultas):
+        return '\n'.join(f"  {i}. {c['sql'][:300]}" for i, c in enumerate(consultas, start=1))
+
+    def ampliar_datos(self, visitantes, visitas):
+        # Crece las tablas sin tocar el resto del conjunto de datos
+        ahora = timezone.now()
+        nuevos = Visitante.objects.bulk_create([
+            Visitante(
+                nombre=f'Ampliado {i}',
+                nombre_normalizado=normalizar_texto(f'Ampliado {i}'),
+                tipo_documento='CC',
+                documento=f'8{i:09d}',
+                motivo_visita='Prueba',
+                apartamento_visitado='101',
+                persona_a_visitar='Residente',
+            )
+            for i in range(visitantes)
+        ])
+        RegistroVisita.objects.bulk_create([
+            RegistroVisita(
+                visitante=nuevos[i % len(nuevos)],
+                fecha_salida=ahora + timedelta(minutes=30) if i % 3 else None,
+                registrado_por=self.recepcionista,
+            )
+            for i in range(visitas)
+        ])
+
+    def test_todas_las_rutas_tienen_presupuesto(self):
+        rutas = set(rutas_con_nombre())
+        self.assertEqual(
+            rutas, set(PRESUPUESTOS),
+            'Cada ruta con nombre en ingreso_edificio/urls.py necesita un presupuesto en PRESUPUESTOS'
+        )
+
+    def test_presupuesto_por_ruta(self):
+        anonimo = self.client_class()
+        # logout cierra la sesión: se mide con un cliente propio
+        saliente = self.client_class()
+        saliente.force_login(self.administrador)
+        clientes = {'login': anonimo, 'logout': saliente}
+        for nombre in rutas_con_nombre():
+            maximo_consultas, maximo_kb = PRESUPUESTOS[nombre]
+            with self.subTest(ruta=nombre):
+                respuesta, cuerpo, consultas = self.medir(nombre, clientes.get(nombre))
+                self.assertIn(respuesta.status_code, (200, 302), f'{nombre} respondió {respuesta.status_code}')
+                self.assertLessEqual(
+                    len(consultas), maximo_consultas,
+                    f'{nombre}: {len(consultas)} consultas, presupuesto {maximo_consultas}\n{self.detalle_sql(consultas)}'
+                )
+                self.assertLessEqual(
+                    len(cuerpo), maximo_kb * 1024,
+                    f'{nombre}: respuesta de {len(cuerpo) // 1024} KB, presupuesto {maximo_kb} KB'
+                )
+
+    def test_consultas_constantes_con_mas_datos(self):
+        antes = {nombre: len(self.medir(nombre)[2]) for nombre in CONSTANTES}
+        self.ampliar_datos(visitantes=300, visitas=1500)
+        for nombre in CONSTANTES:
+            with self.subTest(ruta=nombre):
+                _, _, consultas = self.medir(nombre)
+                self.assertEqual(
+                    len(consultas), antes[nombre],
+                    f'{nombre}: {antes[nombre]} consultas antes de ampliar los datos y {len(consultas)} después\n'
+                    f'{self.detalle_sql(consultas)}'
+                )
+
+    def test_exportacion_csv_consultas_constantes(self):
+        url = reverse('generar_reporte') + '?exportar_csv=1'
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+            filas = sum(bloque.count(b'\n') for bloque in respuesta.streaming_content)
+        self.assertEqual(filas, VISITAS + 1)
+        self.assertLessEqual(
+            len(consultas.captured_queries), 4,
+            f'La exportación no debe consultar por fila\n{self.detalle_sql(consultas.captured_queries)}'
+        )
+
+
+@override_settings(AUDITORIA_MODO='sincrono', MEDICION_ACTIVA=True, MEDICION_SERVER_TIMING=True,
+                   MEDICION_UMBRAL_REPETIDAS=3, MEDICION_UMBRAL_LENTO_MS=60000)
+class MedicionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(50, semilla=31)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+
+    def medir(self, vista):
+        with self.assertLogs('ingreso_edificio.medicion', 'INFO') as registros:
+            MedicionMiddleware(vista)(RequestFactory().get('/medicion/'))
+        return [(registro.levelno, json.loads(registro.getMessage())) for registro in registros.records]
+
+    def test_cabecera_server_timing(self):
+        self.client.force_login(self.administrador)
+        cabecera = self.client.get(reverse('dashboard'))['Server-Timing']
+        self.assertRegex(cabecera, r'^sql;dur=[\d.]+;desc="\d+ consultas", plantilla;dur=[\d.]+, '
+                                   r'vista;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertGreater(float(re.search(r'plantilla;dur=([\d.]+)', cabecera).group(1)), 0)
+
+    def test_consultas_repetidas_se_marcan_como_n_mas_1(self):
+        def vista(request):
+            for pk in Visitante.objects.values_list('pk', flat=True)[:4]:
+                Visitante.objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        registros = self.medir(vista)
+        avisos = [datos for nivel, datos in registros if nivel == logging.WARNING]
+        self.assertEqual([datos['evento'] for datos in avisos], ['consultas_repetidas'])
+        self.assertEqual(avisos[0]['repetidas'][0]['veces'], 4)
+        self.assertEqual(avisos[0]['consultas'], 5)
+
+    def test_peticion_normal_solo_a_nivel_info(self):
+        registros = self.medir(lambda request: HttpResponse())
+        self.assertEqual([nivel for nivel, _ in registros], [logging.INFO])
+        # Por defecto el logger deja pasar solo los avisos (lentas y N+1)
+        self.assertFalse(logging.getLogger('ingreso_edificio.medicion').isEnabledFor(logging.INFO))
+
+
+@override_settings(AUDITORIA_MODO='sincrono', MEDICION_ACTIVA=False)
+class AutenticacionCacheadaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(200, semilla=7)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+        cls.recepcionista = Usuario.objects.filter(rol='recepcionista').first()
+
+    def setUp(self):
+        cache.clear()
+
+    def consultas_a_tablas(self, cliente, url, *tablas):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = cliente.get(url)
+        return respuesta, [c['sql'] for c in consultas.captured_queries if any(t in c['sql'] for t in tablas)]
+
+    def test_peticiones_estables_sin_leer_sesiones_ni_usuarios(self):
+        self.client.force_login(self.administrador)
+        self.client.get(reverse('dashboard'))
+        respuesta, consultas = self.consultas_a_tablas(
+            self.client, reverse('dashboard'), 'django_session', 'ingreso_edificio_usuario'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(consultas, [])
+
+    def test_cambios_de_usuario_surten_efecto_en_la_siguiente_peticion(self):
+        cliente = self.client_class()
+        cliente.force_login(self.recepcionista)
+        self.assertEqual(cliente.get(reverse('registrar_entrada')).status_code, 200)
+
+        self.client.force_login(self.administrador)
+        self.client.post(reverse('editar_usuario', args=[self.recepcionista.id]), {
+            'first_name': self.recepcionista.first_name,
+            'last_name': self.recepcionista.last_name,
+            'email': 'recepcion@example.com',
+            'rol': 'recepcionista',
+            'telefono': '',
+        })
+        # Sin is_active el formulario desactiva al usuario
+        respuesta = cliente.get(reverse('registrar_entrada'))
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertIn(reverse('login'), respuesta['Location'])
+
+    def test_la_copia_en_cache_de_la_sesion_caduca(self):
+        # Otro worker cerró la sesión: borra la fila, pero no la caché local
+        self.client.force_login(self.recepcionista)
+        self.assertEqual(self.client.get(reverse('registrar_entrada')).status_code, 200)
+        Session.objects.all().delete()
+        self.assertEqual(self.client.get(reverse('registrar_entrada')).status_code, 200)
+
+        cliente = self.client_class()
+        with override_settings(SESION_CACHE_TIMEOUT=0):
+            cliente.force_login(self.recepcionista)
+            Session.objects.all().delete()
+            respuesta = cliente.get(reverse('registrar_entrada'))
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertIn(reverse('login'), respuesta['Location'])
+
+
+@override_settings(AUDITORIA_MODO='buffer', AUDITORIA_TAM_LOTE=3, AUDITORIA_INTERVALO_FLUSH=3600,
+                   MEDICION_ACTIVA=False)
+class AuditoriaEnLotesTests(TestCase):
+    # El hilo de vaciado no se arranca: la prueba vacía la cola a mano, en la
+    # misma conexión (y transacción) que el resto del caso
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(20, semilla=29)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+
+    def setUp(self):
+        parche = mock.patch.object(auditoria, '_iniciar_hilo')
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.addCleanup(self.descartar_cola)
+        self.descartar_cola()
+        self.previas = AuditoriaAccion.objects.count()
+
+    def descartar_cola(self):
+        with auditoria._lock:
+            del auditoria._cola[:]
+        auditoria._despertar.clear()
+
+    def auditar(self, cantidad, id_inicial=0):
+        for i in range(cantidad):
+            auditoria.registrar_auditoria(self.administrador, 'UPDATE', 'Visitante', id_inicial + i, 'prueba')
+
+    def nuevas(self):
+        return AuditoriaAccion.objects.count() - self.previas
+
+    def test_lote_lleno_se_escribe_de_una_vez(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.auditar(2)
+        self.assertEqual(auditoria.pendientes(), 2)
+        self.assertFalse(auditoria._despertar.is_set())
+        self.assertEqual(self.nuevas(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.auditar(1, id_inicial=2)
+        # Al completar el lote se despierta al hilo sin esperar el intervalo
+        self.assertTrue(auditoria._despertar.is_set())
+        with self.assertNumQueries(2):  # usuarios existentes + un INSERT
+            self.assertEqual(auditoria.vaciar_auditoria(), 3)
+        self.assertEqual(auditoria.pendientes(), 0)
+        self.assertEqual(
+            sorted(AuditoriaAccion.objects.filter(descripcion='prueba').values_list('id_objeto', flat=True)),
+            [0, 1, 2],
+        )
+
+    def test_transaccion_revertida_no_se_audita(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self.auditar(2)
+                    raise RuntimeError('fallo después de auditar')
+        self.assertEqual(auditoria.pendientes(), 0)
+        auditoria.vaciar_auditoria()
+        self.assertEqual(self.nuevas(), 0)
+
+    def test_error_al_escribir_devuelve_el_lote_con_tope(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.auditar(70)
+        with mock.patch.object(auditoria, '_escribir_lote', side_effect=RuntimeError('base caída')):
+            with self.assertRaises(RuntimeError):
+                auditoria.vaciar_auditoria()
+        # Tope de AUDITORIA_TAM_LOTE * 20 eventos en espera
+        self.assertEqual(auditoria.pendientes(), 60)
+        self.assertEqual(auditoria.vaciar_auditoria(), 60)
+        self.assertEqual(self.nuevas(), 60)
+
+    def test_al_salir_se_vacia_la_cola(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.auditar(5)
+        auditoria._vaciar_al_salir()
+        self.assertEqual(auditoria.pendientes(), 0)
+        self.assertEqual(self.nuevas(), 5)
+
+
+@override_settings(AUDITORIA_MODO='sincrono', MEDICION_ACTIVA=False)
+class ApiListadosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(600, semilla=11)
+        # Cuántas visitas quedan abiertas depende de la hora en que corre la
+        # prueba; se abren algunas para que siempre haya salidas nulas
+        recientes = RegistroVisita.objects.order_by('-fecha_entrada').values('pk')[:7]
+        RegistroVisita.objects.filter(pk__in=recientes).update(fecha_salida=None)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+
+    def setUp(self):
+        self.client.force_login(self.administrador)
+
+    def recorrer(self, url):
+        filas, datos = [], self.client.get(url).json()
+        while True:
+            filas.extend(datos['resultados'])
+            if not datos['siguiente']:
+                return filas
+            datos = self.client.get(datos['siguiente']).json()
+
+    def test_recorrido_por_cursor_respeta_el_orden(self):
+        casos = [
+            ('api_visitantes', '?orden=nombre&tam=17', Visitante.objects.order_by('nombre_normalizado', 'pk')),
+            ('api_visitantes', '?orden=-documento&tam=25', Visitante.objects.order_by('-documento', '-pk')),
+            # Las visitas sin salida ordenan como posteriores a cualquier salida
+            ('api_registros', '?orden=-fecha_salida&tam=90',
+             RegistroVisita.objects.order_by(F('fecha_salida').desc(nulls_first=True), '-pk')),
+            ('api_registros', '?orden=fecha_salida&tam=70',
+             RegistroVisita.objects.order_by(F('fecha_salida').asc(nulls_last=True), 'pk')),
+            ('api_usuarios', '?orden=username&tam=2', Usuario.objects.order_by('username', 'pk')),
+        ]
+        for nombre, parametros, esperado in casos:
+            with self.subTest(ruta=nombre, parametros=parametros):
+                filas = self.recorrer(reverse(nombre) + parametros)
+                self.assertEqual([f['id'] for f in filas], list(esperado.values_list('id', flat=True)))
+
+    def test_pagina_anterior(self):
+        primera = self.client.get(reverse('api_visitantes') + '?orden=nombre&tam=10').json()
+        segunda = self.client.get(primera['siguiente']).json()
+        de_vuelta = self.client.get(segunda['anterior']).json()
+        self.assertEqual(de_vuelta['resultados'], primera['resultados'])
+        self.assertIsNone(de_vuelta['anterior'])
+
+        # Volver atrás desde las visitas sin salida a las que tienen salida
+        abiertas = RegistroVisita.objects.filter(fecha_salida__isnull=True).count()
+        url = reverse('api_registros') + f'?orden=fecha_salida&tam={abiertas}&total=1'
+        paginas = [self.client.get(url).json()]
+        while paginas[-1]['siguiente']:
+            paginas.append(self.client.get(paginas[-1]['siguiente']).json())
+        self.assertEqual(sum(len(p['resultados']) for p in paginas), paginas[0]['total'])
+        self.assertIsNone(paginas[-1]['resultados'][-1]['fecha_salida'])
+        anterior = self.client.get(paginas[-1]['anterior']).json()
+        self.assertEqual(anterior['resultados'], paginas[-2]['resultados'])
+
+    def test_filtros(self):
+        dentro = self.recorrer(reverse('api_registros') + '?estado=dentro')
+        self.assertEqual(len(dentro), RegistroVisita.objects.filter(fecha_salida__isnull=True).count())
+        por_nombre = self.recorrer(reverse('api_visitantes') + '?q=mar&orden=nombre')
+        self.assertTrue(por_nombre)
+        self.assertTrue(all(normalizar_texto(f['nombre']).startswith('mar') for f in por_nombre))
+
+    def test_orden_y_filtros_invalidos(self):
+        self.assertEqual(self.client.get(reverse('api_usuarios') + '?orden=password').status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_registros') + '?fecha_inicio=ayer').status_code, 400)
+
+    def test_busqueda_con_mas_coincidencias_que_el_limite(self):
+        url = reverse('listar_visitantes') + '?buscar=mar'
+        with override_settings(BUSQUEDA_LIMITE=5):
+            respuesta = self.client.get(url)
+        self.assertEqual(len(respuesta.context['visitantes']), 5)
+        self.assertFalse(respuesta.context['visitantes'].total_exacto)
+        self.assertContains(respuesta, 'Refina la búsqueda')
+        self.assertNotContains(self.client.get(url), 'Refina la búsqueda')
+
+    def test_visitante_no_numerico_es_error_del_formulario(self):
+        self.assertEqual(self.client.get(reverse('consultar_registros') + '?visitante=abc').status_code, 200)
+        self.assertEqual(self.client.post(reverse('registrar_entrada'), {'visitante': 'abc'}).status_code, 200)
+
+
+@override_settings(AUDITORIA_MODO='sincrono', MEDICION_ACTIVA=False)
+class RespuestasCondicionalesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(300, semilla=5)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+        cls.visitante = Visitante.objects.first()
+
+    def setUp(self):
+        self.client.force_login(self.administrador)
+
+    def revalidar(self, url, etag):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return respuesta, consultas.captured_queries
+
+    def test_304_sin_renderizar_si_no_hubo_cambios(self):
+        for nombre in ['dashboard', 'listar_visitantes', 'consultar_registros', 'lista_evacuacion']:
+            with self.subTest(ruta=nombre):
+                url = reverse(nombre)
+                primera = self.client.get(url)
+                self.assertEqual(primera.status_code, 200)
+                respuesta, consultas = self.revalidar(url, primera['ETag'])
+                self.assertEqual(respuesta.status_code, 304)
+                self.assertEqual(respuesta.content, b'')
+                # Solo la consulta de los máximos
+                self.assertEqual(len(consultas), 1, self.detalle(consultas))
+
+    def detalle(self, consultas):
+        return '\n'.join(c['sql'][:200] for c in consultas)
+
+    def test_escrituras_cambian_el_etag(self):
+        url = reverse('lista_evacuacion')
+        etag = self.client.get(url)['ETag']
+        RegistroVisita.objects.create(visitante=self.visitante, registrado_por=self.administrador)
+        self.assertEqual(self.revalidar(url, etag)[0].status_code, 200)
+
+        url = reverse('listar_visitantes')
+        etag = self.client.get(url)['ETag']
+        self.visitante.telefono = '3000000000'
+        self.visitante.save()
+        self.assertEqual(self.revalidar(url, etag)[0].status_code, 200)
+
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Visitante.objects.filter(pk=Visitante.objects.last().pk).delete()
+        self.assertEqual(self.revalidar(url, etag)[0].status_code, 200)
+
+    def test_compresion_de_cuerpos_grandes(self):
+        respuesta = self.client.get(reverse('listar_visitantes'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertIn(b'<table', gzip.decompress(respuesta.content))
+        exportacion = self.client.get(
+            reverse('generar_reporte') + '?exportar_csv=1&comprimir_gzip=1', HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertNotIn('Content-Encoding', exportacion)
+
+
+class EventosDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(50, semilla=9)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+        cls.visitante = Visitante.objects.first()
+
+    def test_wsgi_envia_contadores_y_retry(self):
+        self.client.force_login(self.administrador)
+        respuesta = self.client.get(reverse('eventos_dashboard'))
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        self.assertTrue(respuesta.content.startswith(b'retry: '))
+        self.assertIn(b'event: contadores', respuesta.content)
+
+    def test_entrada_confirmada_llega_a_las_pantallas(self):
+        loop = asyncio.new_event_loop()
+
+        async def suscribir():
+            return canal.suscribir(EDIFICIO_PRINCIPAL)
+
+        async def recibir(suscripcion):
+            return [await asyncio.wait_for(suscripcion.cola.get(), 1) for _ in range(2)]
+
+        # Los contadores solo se publican si cambiaron respecto al último envío
+        canal._ultimos_contadores.clear()
+        suscripcion = loop.run_until_complete(suscribir())
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                registro = ocupacion.registrar_ingreso(
+                    RegistroVisita(visitante=self.visitante, registrado_por=self.administrador)
+                )
+            entrada, contadores = loop.run_until_complete(recibir(suscripcion))
+        finally:
+            canal.cancelar(suscripcion)
+            for tarea in asyncio.all_tasks(loop):
+                tarea.cancel()
+            loop.run_until_complete(asyncio.sleep(0))
+            loop.close()
+
+        tipo, datos = entrada.decode('utf-8').strip().split('\n')
+        self.assertEqual(tipo, 'event: entrada')
+        datos = json.loads(datos[len('data: '):])
+        self.assertEqual(datos['registros'][0]['id'], registro.pk)
+        self.assertEqual(datos['registros'][0]['documento'], self.visitante.documento)
+        self.assertTrue(contadores.startswith(b'event: contadores'))
+        # Sin pantallas del edificio se olvidan los últimos contadores
+        self.assertIsNone(canal.ultimos_contadores(EDIFICIO_PRINCIPAL))
+
+
+class VistasAsincronasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(300, semilla=11)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+
+    def setUp(self):
+        self.client.force_login(self.administrador)
+
+    def peticion_asincrona(self, url):
+        request = AsyncRequestFactory().get(url)
+        request.user = self.administrador
+        request.session = self.client.session
+
+        async def auser():
+            return self.administrador
+        request.auser = auser
+        return request
+
+    def sin_token(self, contenido):
+        return re.sub(rb'value="[A-Za-z0-9]{64}"', b'', contenido)
+
+    def test_mismo_html_que_las_vistas_sincronas(self):
+        casos = [
+            ('dashboard', views.dashboard_asincrono, ''),
+            ('consultar_registros', views.consultar_registros_asincrono, ''),
+            ('consultar_registros', views.consultar_registros_asincrono, '?orden=fecha_salida&total=1'),
+            ('consultar_registros', views.consultar_registros_asincrono, '?incluir_archivados=on'),
+        ]
+        for nombre, vista, parametros in casos:
+            with self.subTest(ruta=nombre, parametros=parametros):
+                url = reverse(nombre) + parametros
+                cache.clear()
+                sincrona = self.client.get(url)
+                cache.clear()
+                asincrona = async_to_sync(vista)(self.peticion_asincrona(url))
+                self.assertEqual(asincrona.status_code, 200)
+                self.assertEqual(self.sin_token(asincrona.content), self.sin_token(sincrona.content))
+
+    def test_revalidacion_asincrona(self):
+        url = reverse('dashboard')
+        etag = async_to_sync(views.dashboard_asincrono)(self.peticion_asincrona(url))['ETag']
+        request = self.peticion_asincrona(url)
+        request.META['HTTP_IF_NONE_MATCH'] = etag
+        self.assertEqual(async_to_sync(views.dashboard_asincrono)(request).status_code, 304)
+
+
+@override_settings(REPORTES_TRABAJADOR_LOCAL=False, REPORTES_PASO_PROGRESO=100)
+class ReportesSegundoPlanoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(500, semilla=13)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajustes = override_settings(REPORTES_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(self.administrador)
+
+    def test_mismos_parametros_reutilizan_el_trabajo(self):
+        primero, creado = reportes.solicitar_reporte({}, 'csv', self.administrador)
+        self.assertTrue(creado)
+        self.assertEqual(reportes.solicitar_reporte({}, 'csv')[0], primero)
+        self.assertNotEqual(reportes.solicitar_reporte({}, 'ndjson')[0], primero)
+
+        # Completado y sin cambios en los datos: se ofrece el mismo archivo
+        self.assertEqual(reportes.procesar_pendientes(), 2)
+        self.assertEqual(reportes.solicitar_reporte({}, 'csv'), (primero, False))
+
+        RegistroVisita.objects.create(visitante=Visitante.objects.first(), registrado_por=self.administrador)
+        nuevo, creado = reportes.solicitar_reporte({}, 'csv')
+        self.assertTrue(creado)
+        self.assertNotEqual(nuevo, primero)
+
+    def test_genera_archivo_comprimido_y_se_descarga(self):
+        reporte, _ = reportes.solicitar_reporte({'incluir_archivados': True}, 'ndjson', self.administrador)
+        self.assertEqual(reportes.procesar_pendientes(), 1)
+        reporte.refresh_from_db()
+        self.assertEqual(reporte.estado, 'completado')
+        self.assertEqual((reporte.filas_totales, reporte.filas_procesadas), (500, 500))
+
+        respuesta = self.client.get(reverse('descargar_reporte', args=[reporte.id]), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(respuesta['Content-Type'], 'application/gzip')
+        self.assertNotIn('Content-Encoding', respuesta)
+        lineas = gzip.decompress(b''.join(respuesta.streaming_content)).decode('utf-8').splitlines()
+        self.assertEqual(len(lineas), 500)
+        self.assertEqual(set(json.loads(lineas[0])), set(exportacion.CLAVES_NDJSON))
+
+    def test_exportacion_grande_pasa_a_segundo_plano(self):
+        url = reverse('generar_reporte') + '?exportar_csv=1'
+        with override_settings(REPORTES_UMBRAL_SEGUNDO_PLANO=100):
+            respuesta = self.client.get(url)
+        self.assertRedirects(respuesta, reverse('reportes_programados'))
+        self.assertEqual(ReporteJob.objects.get().estado, 'pendiente')
+        self.assertTrue(self.client.get(url).streaming)
+
+    def test_trabajo_abandonado_vuelve_a_la_cola(self):
+        reporte, _ = reportes.solicitar_reporte({}, 'csv')
+        self.assertTrue(reportes.reclamar(reporte.id))
+        self.assertIsNone(reportes.reclamar_siguiente())
+        ReporteJob.objects.filter(pk=reporte.pk).update(fecha_actualizacion=timezone.now() - timedelta(hours=1))
+        self.assertEqual(reportes.reclamar_siguiente(), reporte.id)
+
+        # Una nueva solicitud lo vuelve a encolar en lugar de solo devolverlo
+        ReporteJob.objects.filter(pk=reporte.pk).update(fecha_actualizacion=timezone.now() - timedelta(hours=1))
+        with mock.patch.object(reportes, 'encolar') as encolar:
+            self.assertEqual(reportes.solicitar_reporte({}, 'csv'), (reporte, False))
+        encolar.assert_called_once_with(reporte.pk)
+
+    def test_error_antes_de_escribir_marca_fallido(self):
+        reporte, _ = reportes.solicitar_reporte({}, 'csv')
+        ReporteJob.objects.filter(pk=reporte.pk).update(parametros={'fecha_inicio': 'ayer'})
+        self.assertTrue(reportes.reclamar(reporte.id))
+        self.assertFalse(reportes.generar(reporte.id))
+        reporte.refresh_from_db()
+        self.assertEqual(reporte.estado, 'fallido')
+        self.assertTrue(reportes.solicitar_reporte({}, 'csv')[1])
+
+
+@override_settings(AUDITORIA_MODO='sincrono', MEDICION_ACTIVA=False)
+class ContadoresTests(TestCase):
+    # Ocupacion y los contadores del dashboard en caché se ajustan en cada
+    # entrada y salida: deben coincidir siempre con un conteo desde cero
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(150, semilla=23)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+
+    def setUp(self):
+        cache.clear()
+        estadisticas.obtener_estadisticas(EDIFICIO_PRINCIPAL)
+
+    def comprobar(self):
+        # Los contadores salen de la caché ajustada; solo las últimas visitas
+        # se vuelven a consultar
+        with CaptureQueriesContext(connection) as consultas:
+            cacheadas = estadisticas.obtener_estadisticas(EDIFICIO_PRINCIPAL)
+        self.assertEqual([c['sql'] for c in consultas.captured_queries if 'COUNT' in c['sql']], [])
+
+        dentro = ocupacion.visitas_abiertas(EDIFICIO_PRINCIPAL).count()
+        self.assertEqual(ocupacion.personas_dentro(EDIFICIO_PRINCIPAL), dentro)
+        self.assertEqual(ocupacion.recalcular_ocupacion(EDIFICIO_PRINCIPAL), dentro)
+        hoy = timezone.localdate()
+        esperadas = {nombre: estadisticas.CALCULOS[nombre](EDIFICIO_PRINCIPAL, hoy)
+                     for nombre in ('total_visitantes', 'ingresos_hoy', 'egresos_hoy')}
+        esperadas['en_edificio'] = dentro
+        self.assertEqual({nombre: cacheadas[nombre] for nombre in esperadas}, esperadas)
+
+    def fuera(self, cantidad):
+        return list(Visitante.objects.filter(edificio=EDIFICIO_PRINCIPAL).exclude(
+            registros__fecha_salida__isnull=True
+        )[:cantidad])
+
+    def test_entradas_y_salidas(self):
+        visitante, *grupo = self.fuera(4)
+        with self.captureOnCommitCallbacks(execute=True):
+            registro = ocupacion.registrar_ingreso(RegistroVisita(
+                edificio_id=EDIFICIO_PRINCIPAL, visitante=visitante, registrado_por=self.administrador
+            ))
+        self.comprobar()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ocupacion.registrar_ingresos(EDIFICIO_PRINCIPAL, [RegistroVisita(visitante=v) for v in grupo])
+        self.comprobar()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(ocupacion.registrar_egreso(registro))
+            # La segunda salida de la misma visita no descuenta otra vez
+            self.assertFalse(ocupacion.registrar_egreso(registro))
+        self.comprobar()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(ocupacion.registrar_egresos(EDIFICIO_PRINCIPAL, [v.id for v in grupo]), 3)
+        self.comprobar()
+
+    def test_entrada_revertida_no_cuenta(self):
+        visitante, = self.fuera(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    ocupacion.registrar_ingreso(RegistroVisita(
+                        edificio_id=EDIFICIO_PRINCIPAL, visitante=visitante, registrado_por=self.administrador
+                    ))
+                    raise RuntimeError('fallo después de registrar')
+        self.comprobar()
+
+
+@override_settings(AUDITORIA_MODO='sincrono', MEDICION_ACTIVA=False)
+class ResumenDiarioTests(TestCase):
+    # Edificio propio para que el resumen solo tenga los movimientos de la prueba
+    @classmethod
+    def setUpTestData(cls):
+        cls.edificio = Edificio.objects.create(nombre='Este', codigo='este')
+        cls.addClassCleanup(olvidar_edificios)
+        cls.visitantes = [
+            Visitante.objects.create(
+                edificio=cls.edificio, nombre=f'Visitante {n}', tipo_documento='CC', documento=f'E-{n}',
+                motivo_visita='Prueba', apartamento_visitado=apartamento, persona_a_visitar='Residente',
+            )
+            for n, apartamento in enumerate(['101', '102', '101'])
+        ]
+        cls.dia = timezone.localdate() - timedelta(days=10)
+
+    def momento(self, dias, hora, minuto=0):
+        return inicio_dia(self.dia + timedelta(days=dias)) + timedelta(hours=hora, minutes=minuto)
+
+    def entrada(self, visitante, momento):
+        # fecha_entrada es auto_now_add: se fija la hora a través de timezone.now
+        with mock.patch('django.utils.timezone.now', return_value=momento):
+            return ocupacion.registrar_ingreso(RegistroVisita(edificio=self.edificio, visitante=visitante))
+
+    def resumen(self):
+        return list(VisitaDiaria.objects.filter(edificio=self.edificio).order_by('fecha', 'apartamento').values_list(
+            'fecha', 'apartamento', 'ingresos', 'egresos', 'pico_ocupacion'
+        ))
+
+    def test_incremental_coincide_con_la_reconstruccion(self):
+        a, b, c = self.visitantes
+        visita_a = self.entrada(a, self.momento(0, 10))
+        visita_b = self.entrada(b, self.momento(0, 11))
+        ocupacion.registrar_egreso(visita_b, self.momento(0, 12))
+        # Día 1 sin movimientos con A dentro; el día 2 solo tiene su salida
+        ocupacion.registrar_egreso(visita_a, self.momento(2, 9))
+        visita_c = self.entrada(c, self.momento(2, 23, 30))
+        ocupacion.registrar_egreso(visita_c, self.momento(3, 0, 30))
+
+        incremental = self.resumen()
+        self.assertIn((self.dia + timedelta(days=1), '', 0, 0, 1), incremental)
+        self.assertIn((self.dia + timedelta(days=2), '101', 1, 1, 1), incremental)
+        resumen_diario.recalcular_rango(self.edificio, self.dia, self.dia + timedelta(days=3))
+        self.assertEqual(self.resumen(), incremental)
+
+    def test_rangos_incluyen_el_ultimo_dia_completo(self):
+        a, b, c = self.visitantes
+        self.entrada(a, self.momento(0, 0))
+        # 23:30 en Bogotá es 04:30 UTC del día siguiente
+        ultima = self.entrada(b, self.momento(1, 23, 30))
+        self.entrada(c, self.momento(2, 0))
+
+        filtrados = reportes.filtrar_registros(
+            RegistroVisita.objects.filter(edificio=self.edificio),
+            {'fecha_inicio': self.dia, 'fecha_fin': self.dia + timedelta(days=1)},
+        )
+        self.assertEqual(filtrados.count(), 2)
+        self.assertIn(ultima, filtrados)
+
+        resumen_diario.recalcular_rango(self.edificio, self.dia, self.dia + timedelta(days=1))
+        self.assertEqual(
+            VisitaDiaria.objects.get(edificio=self.edificio, fecha=self.dia + timedelta(days=1), apartamento='').ingresos,
+            1,
+        )
+
+
+@override_settings(AUDITORIA_MODO='sincrono', MEDICION_ACTIVA=False)
+class AnaliticaTests(TestCase):
+    # (visitante, día, hora de llegada); la visita i dura (i + 1) * 10 minutos
+    VISITAS = [
+        (0, 0, 8), (1, 0, 8), (2, 0, 8), (0, 1, 8), (3, 1, 8),
+        (1, 1, 14), (0, 2, 14), (2, 2, 14), (1, 2, 14), (0, 2, 20),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.edificio = Edificio.objects.create(nombre='Oeste', codigo='oeste')
+        cls.addClassCleanup(olvidar_edificios)
+        visitantes = [
+            Visitante.objects.create(
+                edificio=cls.edificio, nombre=f'Visitante {n}', tipo_documento='CC', documento=f'O-{n}',
+                motivo_visita='Prueba', apartamento_visitado=apartamento, persona_a_visitar='Residente',
+            )
+            for n, apartamento in enumerate(['101', '102', '101', '103'])
+        ]
+        cls.dia = timezone.localdate() - timedelta(days=10)
+        for i, (visitante, dia, hora) in enumerate(cls.VISITAS):
+            entrada = inicio_dia(cls.dia + timedelta(days=dia)) + timedelta(hours=hora)
+            with mock.patch('django.utils.timezone.now', return_value=entrada):
+                registro = ocupacion.registrar_ingreso(RegistroVisita(edificio=cls.edificio, visitante=visitantes[visitante]))
+            ocupacion.registrar_egreso(registro, entrada + timedelta(minutes=(i + 1) * 10))
+
+    def calcular(self):
+        return analitica.calcular_analitica([self.edificio], self.dia, self.dia + timedelta(days=2))
+
+    def test_resultados_sobre_datos_conocidos(self):
+        resultado = self.calcular()
+        self.assertEqual((resultado['total_visitas'], resultado['visitantes_distintos']), (10, 4))
+        self.assertEqual(resultado['duracion'], {
+            'completadas': 10,
+            'promedio_min': 55.0,
+            'maxima_min': 100.0,
+            # Rango más cercano: posiciones 4, 8 y 8 de 10
+            'percentiles_min': {'p50': 50.0, 'p90': 90.0, 'p95': 90.0},
+        })
+        horas = {fila['hora']: (fila['total'], fila['porcentaje']) for fila in resultado['llegadas_por_hora'] if fila['total']}
+        self.assertEqual(horas, {8: (5, 100), 14: (4, 80), 20: (1, 20)})
+        self.assertEqual(
+            [(fila['apartamento'], fila['ingresos']) for fila in resultado['apartamentos']],
+            [('101', 6), ('102', 3), ('103', 1)],
+        )
+        self.assertEqual(
+            [(fila['posicion'], fila['nombre'], fila['visitas']) for fila in resultado['recurrentes']],
+            [(1, 'Visitante 0', 4), (2, 'Visitante 1', 3), (3, 'Visitante 2', 2)],
+        )
+
+    def test_percentiles_en_una_sola_lectura(self):
+        fuentes = [
+            RegistroVisita.objects.filter(edificio=self.edificio, fecha_salida__isnull=False).annotate(
+                duracion=analitica.DURACION
+            )
+        ]
+        with self.assertNumQueries(1):
+            percentiles = analitica._percentiles_sql(fuentes, 10)
+        self.assertEqual(percentiles[50], timedelta(minutes=50))
+        # Un conteo desactualizado no rompe el cálculo
+        self.assertEqual(analitica._percentiles_sql(fuentes, 40)[95], timedelta(minutes=100))
+        self.assertEqual(analitica._percentiles_sql(fuentes, 4)[95], timedelta(minutes=30))
+
+
+@override_settings(AUDITORIA_MODO='sincrono', MEDICION_ACTIVA=False)
+class ArchivoHistoricoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(300, semilla=19)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+
+    def archivar(self, **opciones):
+        call_command('archivar_historico', dias=0, lote=40, stdout=io.StringIO(), **opciones)
+
+    def test_copia_antes_de_borrar(self):
+        cerradas = list(RegistroVisita.objects.filter(fecha_salida__isnull=False).order_by('pk').values())
+        abiertas = RegistroVisita.objects.filter(fecha_salida__isnull=True).count()
+        self.archivar(solo='registros')
+        campos = list(cerradas[0])
+        self.assertEqual(list(RegistroVisitaArchivado.objects.order_by('pk').values(*campos)), cerradas)
+        # Las visitas abiertas nunca se archivan
+        self.assertEqual(RegistroVisita.objects.count(), abiertas)
+        self.assertFalse(RegistroVisita.objects.filter(fecha_salida__isnull=False).exists())
+
+    def test_dry_run_no_mueve_filas(self):
+        antes = RegistroVisita.objects.count()
+        self.archivar(dry_run=True)
+        self.assertEqual(RegistroVisita.objects.count(), antes)
+        self.assertFalse(RegistroVisitaArchivado.objects.exists())
+
+    def test_lote_fallido_se_revierte(self):
+        antes = RegistroVisita.objects.count()
+        # Falla después de copiar y borrar el primer lote, dentro de su transacción
+        with mock.patch.object(archivo, 'marcar_cambio', side_effect=RuntimeError('fallo')):
+            with self.assertRaises(RuntimeError):
+                archivo.archivar('registros', archivo.horizonte(0), tam_lote=40)
+        self.assertEqual(RegistroVisita.objects.count(), antes)
+        self.assertFalse(RegistroVisitaArchivado.objects.exists())
+
+    def test_archivados_siguen_en_consultas(self):
+        total = RegistroVisita.objects.count()
+        self.archivar()
+        self.client.force_login(self.administrador)
+        url = reverse('consultar_registros') + '?total=1'
+        self.assertLess(self.client.get(url).context['registros'].total, total)
+        self.assertEqual(self.client.get(url + '&incluir_archivados=on').context['registros'].total, total)
+
+
+class ImportarVisitantesTests(TestCase):
+    CSV = (
+        'nombre,tipo_documento,documento,email,telefono,motivo_visita,apartamento_visitado,persona_a_visitar\n'
+        'Ana,cc,900001,,,Visita,101,Residente\n'
+        'Luis,CC,900002,,,Visita,102,Residente\n'
+        'Ana María,CC,900001,,,Entrega,101,Residente\n'
+        ',CC,900003,,,Visita,103,Residente\n'
+        'Pedro,XX,900004,correo-invalido,,Visita,104,Residente\n'
+        'Existente Actualizado,CC,800001,,,Visita,105,Residente\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        Visitante.objects.create(
+            edificio_id=EDIFICIO_PRINCIPAL, nombre='Existente', tipo_documento='CC', documento='800001',
+            motivo_visita='Prueba', apartamento_visitado='100', persona_a_visitar='Residente',
+        )
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+        self.archivo = os.path.join(self.directorio, 'visitantes.csv')
+        self.rechazos = os.path.join(self.directorio, 'rechazos.csv')
+        with open(self.archivo, 'w', encoding='utf-8') as archivo:
+            archivo.write(self.CSV)
+
+    def importar(self, *opciones):
+        salida = io.StringIO()
+        # Lotes de 2: el documento repetido cae en otro lote que su primera aparición
+        call_command(
+            'import_visitantes', self.archivo, '--lote', '2', '--rechazos', self.rechazos, *opciones, stdout=salida
+        )
+        return salida.getvalue().strip().splitlines()[-1]
+
+    def test_crea_actualiza_y_rechaza(self):
+        resumen = self.importar()
+        self.assertIn('6 filas leídas: 2 creados, 2 actualizados, 2 rechazadas', resumen)
+        visitantes = dict(Visitante.objects.values_list('documento', 'nombre'))
+        self.assertEqual(visitantes, {'900001': 'Ana María', '900002': 'Luis', '800001': 'Existente Actualizado'})
+        ana = Visitante.objects.get(documento='900001')
+        self.assertEqual((ana.tipo_documento, ana.motivo_visita, ana.nombre_normalizado), ('CC', 'Entrega', 'ana maria'))
+
+        with open(self.rechazos, encoding='utf-8', newline='') as archivo:
+            rechazadas = list(csv.DictReader(archivo))
+        self.assertEqual([fila['linea'] for fila in rechazadas], ['5', '6'])
+        self.assertIn('nombre', rechazadas[0]['errores'])
+        self.assertIn('tipo_documento', rechazadas[1]['errores'])
+        self.assertIn('email', rechazadas[1]['errores'])
+
+    def test_dry_run_cuenta_sin_escribir(self):
+        resumen = self.importar('--dry-run')
+        self.assertIn('[dry-run] 6 filas leídas: 2 creados, 2 actualizados, 2 rechazadas', resumen)
+        self.assertEqual(list(Visitante.objects.values_list('nombre', flat=True)), ['Existente'])
+
+
+@skipUnless('sur' in settings.DATABASES, 'requiere --settings=config.settings_pruebas')
+@override_settings(AUDITORIA_MODO='sincrono', MEDICION_ACTIVA=False)
+class EdificiosTests(TestCase):
+    # Sin la base 'sur' la clase se omite, pero el runner igual lee databases
+    databases = {'default', 'sur'} & set(settings.DATABASES)
+
+    @classmethod
+    def setUpTestData(cls):
+        generar_datos(200, semilla=17)
+        cls.administrador = Usuario.objects.filter(rol='administrador').first()
+        # Segundo edificio en la misma base: las consultas filtran por edificio
+        cls.norte = Edificio.objects.create(nombre='Norte', codigo='norte')
+        cls.addClassCleanup(olvidar_edificios)
+        cls.repetido = Visitante.objects.filter(edificio=EDIFICIO_PRINCIPAL).first()
+        cls.visitante_norte = Visitante.objects.create(
+            edificio=cls.norte, nombre='Visitante Norte', tipo_documento='CC',
+            documento=cls.repetido.documento, motivo_visita='Prueba',
+            apartamento_visitado='101', persona_a_visitar='Residente',
+        )
+        ocupacion.recalcular_ocupacion(cls.norte)
+        ocupacion.registrar_ingreso(RegistroVisita(edificio=cls.norte, visitante=cls.visitante_norte))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.administrador)
+
+    def elegir(self, edificio):
+        self.client.post(reverse('cambiar_edificio'), {'edificio': edificio})
+
+    def test_router_por_edificio(self):
+        sur = Edificio.objects.create(nombre='Sur', codigo='sur', base_datos='sur')
+        self.addCleanup(olvidar_edificios)
+        router = RouterEdificios()
+        self.assertEqual(router.db_for_write(RegistroVisita, instance=RegistroVisita(edificio=sur)), 'sur')
+        self.assertEqual(router.db_for_write(Visitante, instance=self.repetido), 'default')
+        self.assertEqual(router.db_for_read(Usuario), 'default')
+        self.assertTrue(router.allow_migrate('sur', 'ingreso_edificio', 'registrovisita'))
+        self.assertFalse(router.allow_migrate('sur', 'ingreso_edificio', 'usuario'))
+        self.assertEqual([q.db for q in RegistroVisita.objects.de_edificios([sur, self.norte])], ['sur', 'default'])
+        # Con base propia no hace falta filtrar por edificio
+        self.assertNotIn('WHERE', str(RegistroVisita.objects.del_edificio(sur).query))
+        self.assertIn('WHERE', str(RegistroVisita.objects.del_edificio(self.norte).query))
+
+    def test_datos_separados_por_edificio(self):
+        self.assertEqual(ocupacion.personas_dentro(self.norte), 1)
+        self.elegir(self.norte.pk)
+        visitantes = self.client.get(reverse('api_visitantes')).json()['resultados']
+        self.assertEqual([v['id'] for v in visitantes], [self.visitante_norte.id])
+        registros = self.client.get(reverse('api_registros')).json()['resultados']
+        self.assertEqual([r['edificio'] for r in registros], ['Norte'])
+
+        self.elegir('todos')
+        total = self.client.get(reverse('api_registros') + '?estado=dentro&tam=500').json()['resultados']
+        self.assertEqual(len(total), RegistroVisita.objects.filter(fecha_salida__isnull=True).count())
+        self.assertContains(self.client.get(reverse('consultar_registros')), '<th>Edificio</th>')
+
+    @override_settings(AUDITORIA_MODO='buffer', AUDITORIA_INTERVALO_FLUSH=3600)
+    def test_lote_de_auditoria_por_base(self):
+        sur = Edificio.objects.create(nombre='Sur', codigo='sur', base_datos='sur')
+        self.addCleanup(olvidar_edificios)
+        with mock.patch.object(auditoria, '_iniciar_hilo'):
+            with self.captureOnCommitCallbacks(execute=True):
+                for edificio in (sur, self.norte, sur):
+                    auditoria.registrar_auditoria(
+                        self.administrador, 'UPDATE', 'Visitante', 1, 'por base', edificio=edificio
+                    )
+        self.assertEqual(auditoria.vaciar_auditoria(), 3)
+        self.assertEqual(AuditoriaAccion.objects.del_edificio(sur).filter(descripcion='por base').count(), 2)
+        self.assertEqual(AuditoriaAccion.objects.del_edificio(self.norte).filter(descripcion='por base').count(), 1)
+
+    def test_entrada_en_edificio_con_base_propia(self):
+        sur = Edificio.objects.create(nombre='Sur', codigo='sur', base_datos='sur')
+        self.addCleanup(olvidar_edificios)
+        # Id que no existe en la base principal
+        visitante = Visitante.objects.del_edificio(sur).create(
+            id=10 ** 6, edificio=sur, nombre='Visitante Sur', tipo_documento='CC', documento='S-1',
+            motivo_visita='Prueba', apartamento_visitado='201', persona_a_visitar='Residente',
+        )
+        self.elegir(sur.pk)
+        respuesta = self.client.post(reverse('registrar_entrada'), {'visitante': visitante.pk})
+        self.assertRedirects(respuesta, reverse('dashboard'))
+        self.assertEqual(RegistroVisita.objects.del_edificio(sur).get().visitante_id, visitante.pk)
+        self.assertFalse(RegistroVisita.objects.using('default').filter(visitante_id=visitante.pk, edificio=sur).exists())
+        self.assertEqual(ocupacion.personas_dentro(sur), 1)
+
+    def test_entrada_grupal(self):
+        self.elegir(EDIFICIO_PRINCIPAL)
+        fuera = Visitante.objects.filter(edificio=EDIFICIO_PRINCIPAL).exclude(
+            registros__fecha_salida__isnull=True
+        )[:3]
+        documentos = [visitante.documento for visitante in fuera]
+        dentro = ocupacion.personas_dentro(EDIFICIO_PRINCIPAL)
+        respuesta = self.client.post(
+            reverse('registro_grupal') + '?formato=json',
+            {'operacion': 'entrada', 'documentos': '\n'.join(documentos + ['no-existe'])},
+        )
+        self.assertEqual(respuesta.json()['registrados'], 3)
+        self.assertEqual(ocupacion.personas_dentro(EDIFICIO_PRINCIPAL), dentro + 3)
+        # El mismo grupo otra vez: ya están dentro
+        respuesta = self.client.post(reverse('registro_grupal') + '?formato=json', {
+            'operacion': 'entrada', 'documentos': '\n'.join(documentos),
+        })
+        self.assertEqual(respuesta.json()['registrados'], 0)
+        self.assertEqual(ocupacion.personas_dentro(EDIFICIO_PRINCIPAL), dentro + 3)
+        # Solo visitantes del edificio elegido
+        self.elegir(self.norte.pk)
+        respuesta = self.client.post(reverse('registro_grupal') + '?formato=json', {
+            'operacion': 'entrada', 'documentos': documentos[0],
+        })
+        self.assertEqual(respuesta.json()['registrados'], 0)
+
+    def test_documento_unico_por_edificio(self):
+        self.elegir(self.norte.pk)
+        datos = {
+            'nombre': 'Otro', 'tipo_documento': 'CC', 'documento': self.repetido.documento,
+            'motivo_visita': 'Prueba', 'apartamento_visitado': '101', 'persona_a_visitar': 'Residente',
+        }
+        respuesta = self.client.post(reverse('registrar_visitante'), datos)
+        self.assertContains(respuesta, 'Ya existe un visitante con este documento')
+
+
+class EstaticosTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+        ajustes = override_settings(STATIC_ROOT=self.directorio, DEBUG=False, MEDICION_ACTIVA=False)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_nombres_con_hash_y_variantes_comprimidas(self):
+        nombre = staticfiles_storage.stored_name('css/styles.css')
+        self.assertRegex(nombre, r'^css/styles\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.exists(os.path.join(self.directorio, nombre + '.gz')))
+
+        respuesta = self.client.get(staticfiles_storage.url('css/styles.css'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', respuesta['Cache-Control'])
+        self.assertIn('Accept-Encoding', respuesta['Vary'])
+        contenido = gzip.decompress(b''.join(respuesta.streaming_content))
+        with open(os.path.join(self.directorio, nombre), 'rb') as archivo:
+            self.assertEqual(contenido, archivo.read())
+
+    def test_pesos_de_accept_encoding(self):
+        url = staticfiles_storage.url('css/styles.css')
+        self.assertNotIn('Content-Encoding', self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0'))
+        self.assertNotIn('Content-Encoding', self.client.get(url, HTTP_ACCEPT_ENCODING='identity'))
+        respuesta = self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, *;q=0.5')
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+
+    def test_sin_manifiesto_falla_fuera_de_desarrollo(self):
+        vacio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, vacio)
+        with override_settings(STATIC_ROOT=vacio, ESTATICOS_MANIFIESTO_ESTRICTO=True):
+            with self.assertRaises(ValueError):
+                staticfiles_storage.url('css/styles.css')
+        with override_settings(STATIC_ROOT=vacio, ESTATICOS_MANIFIESTO_ESTRICTO=False):
+            self.assertEqual(staticfiles_storage.url('css/styles.css'), '/static/css/styles.css')
+
+    def test_nombre_sin_hash_se_revalida(self):
+        respuesta = self.client.get('/static/css/styles.css')
+        self.assertNotIn('Content-Encoding', respuesta)
+        self.assertNotIn('immutable', respuesta['Cache-Control'])
+
+    def test_plantillas_sin_estilos_en_linea(self):
+        self.client.force_login(Usuario.objects.create_user('adm', password='x', rol='administrador'))
+        respuesta = self.client.get(reverse('dashboard'))
+        self.assertNotContains(respuesta, '<style>')
+        self.assertContains(respuesta, staticfiles_storage.url('css/paginas/dashboard.css'))
+
+
+class ReplicasTests(SimpleTestCase):
+    # Sin transacción de prueba: dentro de una transacción siempre se lee de
+    # la base principal
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+        self.principal = os.path.join(self.directorio, 'principal.sqlite3')
+        self.copia = os.path.join(self.directorio, 'copia.sqlite3')
+
+    def escribir(self, *valores):
+        conexion = sqlite3.connect(self.principal)
+        conexion.execute('PRAGMA journal_mode = WAL')
+        conexion.execute('CREATE TABLE IF NOT EXISTS t (v)')
+        conexion.executemany('INSERT INTO t VALUES (?)', [(valor,) for valor in valores])
+        conexion.commit()
+        return conexion
+
+    def test_copia_sqlite_de_solo_lectura(self):
+        abierta = self.escribir(1, 2)
+        inicio = time.time()
+        sincronizar_sqlite(self.principal, self.copia)
+        self.assertGreaterEqual(os.stat(self.copia).st_mtime, int(inicio))
+
+        lectura = sqlite3.connect(f'file:{self.copia}?mode=ro', uri=True)
+        self.addCleanup(lectura.close)
+        self.assertEqual(lectura.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+        self.assertEqual(lectura.execute('SELECT count(*) FROM t').fetchone()[0], 2)
+
+        # Las conexiones ya abiertas ven la copia siguiente
+        abierta.execute('INSERT INTO t VALUES (3)')
+        abierta.commit()
+        abierta.close()
+        sincronizar_sqlite(self.principal, self.copia)
+        self.assertEqual(lectura.execute('SELECT count(*) FROM t').fetchone()[0], 3)
+
+    def test_se_lee_de_la_replica_solo_si_esta_al_dia(self):
+        self.escribir(1).close()
+        sincronizar_sqlite(self.principal, self.copia)
+        bases = {**settings.DATABASES, 'default_replica': {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': f'file:{self.copia}?mode=ro',
+        }}
+        with override_settings(DATABASES=bases, REPLICAS_LECTURA={'default': 'default_replica'}, REPLICA_RETRASO_MAXIMO=60):
+            self.assertEqual(alias_lectura('default'), 'default')
+            with lectura_replica():
+                self.assertEqual(alias_lectura('default'), 'default_replica')
+            # Escritura posterior a la copia: se lee de la principal
+            with lectura_replica(desde=time.time() + 1):
+                self.assertEqual(alias_lectura('default'), 'default')
+            # Copia más atrasada que el máximo permitido
+            hace_rato = time.time() - 120
+            os.utime(self.copia, (hace_rato, hace_rato))
+            with lectura_replica():
+                self.assertEqual(alias_lectura('default'), 'default')
+
+    @override_settings(REPLICAS_LECTURA={'default': 'default_replica'}, MEDICION_ACTIVA=False)
+    def test_escritura_anotada_en_cookie(self):
+        self.assertNotIn(COOKIE_ESCRITURA, self.client.get('/no-existe/').cookies)
+        antes = time.time()
+        cookie = self.client.post('/no-existe/').cookies[COOKIE_ESCRITURA]
+        self.assertGreaterEqual(float(cookie.value), antes - 1)
+        self.assertEqual(cookie['max-age'], 120)
@@ -1,13 +1,23 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Bajo ASGI (config/asgi.py activa VISTAS_ASINCRONAS) el dashboard y la
+# consulta de registros usan sus variantes asíncronas; bajo WSGI se quedan
+# las síncronas y Django no tiene que crear un event loop por petición
+ASINCRONAS = getattr(settings, 'VISTAS_ASINCRONAS', False)
+
 urlpatterns = [
     # ===== AUTENTICACIÓN =====
     path('', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     
     # ===== DASHBOARD =====
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', views.dashboard_asincrono if ASINCRONAS else views.dashboard, name='dashboard'),
+    path('dashboard/eventos/', views.eventos_dashboard, name='eventos_dashboard'),
+    
+    # ===== EDIFICIO =====
+    path('edificio/cambiar/', views.cambiar_edificio, name='cambiar_edificio'),
     
     # ===== USUARIOS =====
     path('usuarios/crear/', views.crear_usuario, name='crear_usuario'),
@@ -18,11 +28,22 @@ urlpatterns = [
     # ===== VISITANTES =====
     path('visitantes/registrar/', views.registrar_visitante, name='registrar_visitante'),
     path('visitantes/listar/', views.listar_visitantes, name='listar_visitantes'),
+    path('visitantes/buscar/', views.buscar_visitantes, name='buscar_visitantes'),
     path('visitantes/<int:visitante_id>/editar/', views.editar_visitante, name='editar_visitante'),
     
     # ===== REGISTROS DE ENTRADA/SALIDA =====
     path('registros/entrada/', views.registrar_entrada, name='registrar_entrada'),
     path('registros/salida/', views.registrar_salida, name='registrar_salida'),
-    path('registros/consultar/', views.consultar_registros, name='consultar_registros'),
+    path('registros/grupo/', views.registro_grupal, name='registro_grupal'),
+    path('registros/evacuacion/', views.lista_evacuacion, name='lista_evacuacion'),
+    path('registros/consultar/', views.consultar_registros_asincrono if ASINCRONAS else views.consultar_registros, name='consultar_registros'),
     path('registros/reporte/', views.generar_reporte, name='generar_reporte'),
+    path('registros/analitica/', views.analitica_visitas, name='analitica_visitas'),
+    path('registros/reportes/', views.reportes_programados, name='reportes_programados'),
+    path('registros/reportes/<int:reporte_id>/descargar/', views.descargar_reporte, name='descargar_reporte'),
+    
+    # ===== API DE LISTADOS =====
+    path('api/registros/', views.api_registros, name='api_registros'),
+    path('api/visitantes/', views.api_visitantes, name='api_visitantes'),
+    path('api/usuarios/', views.api_usuarios, name='api_usuarios'),
 ]
\ No newline at end of file
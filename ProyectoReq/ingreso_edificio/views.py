@@ -2,21 +2,44 @@
 
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from .models import Usuario, Visitante, RegistroVisita
+from .models import Usuario, Visitante, RegistroVisita, ReporteJob
+from .edificios import edificios_activos, pk_edificio
+from .widgets import AutocompletarVisitante
 
-class RegistroUsuarioForm(forms.ModelForm):
+class EdificioUsuarioMixin:
+    # Opciones desde la memoria de edificios: el formulario no consulta la tabla al mostrarse
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['edificio'].choices = [('', 'Todos (solo administradores)')] + [
+            (edificio.pk, edificio.nombre) for edificio in edificios_activos()
+        ]
+
+class VisitanteDelEdificioMixin:
+    # Solo se pueden elegir visitantes del edificio de la petición
+    def __init__(self, *args, edificio=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if edificio is not None:
+            self.fields['visitante'].queryset = Visitante.objects.del_edificio(edificio)
+            instancia = getattr(self, 'instance', None)
+            if instancia is not None and instancia._state.adding:
+                # La validación del modelo busca el visitante en la base del
+                # edificio de la instancia: debe conocerlo antes de is_valid()
+                instancia.edificio_id = pk_edificio(edificio)
+
+class RegistroUsuarioForm(EdificioUsuarioMixin, forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput)
     password_confirm = forms.CharField(widget=forms.PasswordInput, label="Confirmar Contraseña")
     
     class Meta:
         model = Usuario
-        fields = ['username', 'first_name', 'last_name', 'email', 'rol', 'telefono', 'documento']
+        fields = ['username', 'first_name', 'last_name', 'email', 'rol', 'edificio', 'telefono', 'documento']
         widgets = {
             'username': forms.TextInput(attrs={'class': 'form-control'}),
             'first_name': forms.TextInput(attrs={'class': 'form-control'}),
             'last_name': forms.TextInput(attrs={'class': 'form-control'}),
             'email': forms.EmailInput(attrs={'class': 'form-control'}),
             'rol': forms.Select(attrs={'class': 'form-control'}),
+            'edificio': forms.Select(attrs={'class': 'form-control'}),
             'telefono': forms.TextInput(attrs={'class': 'form-control'}),
             'documento': forms.TextInput(attrs={'class': 'form-control'}),
         }
@@ -31,31 +54,79 @@ class LoginForm(forms.Form):
     username = forms.CharField(max_length=100, widget=forms.TextInput(attrs={'class': 'form-control'}))
     password = forms.CharField(widget=forms.PasswordInput(attrs={'class': 'form-control'}))
 
-class EditarUsuarioForm(forms.ModelForm):
+class EditarUsuarioForm(EdificioUsuarioMixin, forms.ModelForm):
     class Meta:
         model = Usuario
-        fields = ['first_name', 'last_name', 'email', 'rol', 'telefono', 'is_active']
+        fields = ['first_name', 'last_name', 'email', 'rol', 'edificio', 'telefono', 'is_active']
 
 class RegistroVisitanteForm(forms.ModelForm):
     class Meta:
         model = Visitante
         fields = ['nombre', 'tipo_documento', 'documento', 'email', 'telefono', 
                   'motivo_visita', 'apartamento_visitado', 'persona_a_visitar', 'descripcion']
+    
+    def __init__(self, *args, edificio=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if edificio is not None and self.instance._state.adding:
+            self.instance.edificio_id = pk_edificio(edificio)
+    
+    def clean_documento(self):
+        # El documento es único dentro de cada edificio; el edificio no está
+        # en el formulario, así que la restricción no se valida sola
+        documento = self.cleaned_data['documento']
+        repetido = Visitante.objects.del_edificio(self.instance.edificio_id).filter(
+            documento=documento
+        ).exclude(pk=self.instance.pk)
+        if repetido.exists():
+            raise forms.ValidationError("Ya existe un visitante con este documento en el edificio")
+        return documento
 
-class RegistroEntradaForm(forms.ModelForm):
+class RegistroEntradaForm(VisitanteDelEdificioMixin, forms.ModelForm):
     class Meta:
         model = RegistroVisita
         fields = ['visitante', 'observaciones']
+        widgets = {
+            'visitante': AutocompletarVisitante(),
+        }
 
-class RegistroSalidaForm(forms.ModelForm):
+class RegistroSalidaForm(VisitanteDelEdificioMixin, forms.ModelForm):
     class Meta:
         model = RegistroVisita
         fields = ['visitante', 'observaciones']
+        widgets = {
+            'visitante': AutocompletarVisitante(solo_en_edificio=True),
+        }
 
-class FiltroReporteForm(forms.Form):
+class RegistroGrupalForm(forms.Form):
+    OPERACIONES = [
+        ('entrada', 'Entrada'),
+        ('salida', 'Salida'),
+    ]
+    
+    operacion = forms.ChoiceField(choices=OPERACIONES, widget=forms.RadioSelect, initial='entrada')
+    documentos = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 8, 'placeholder': 'Un documento por línea (también separados por comas)'})
+    )
+    observaciones = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 2}))
+
+class FiltroReporteForm(VisitanteDelEdificioMixin, forms.Form):
     fecha_inicio = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
     fecha_fin = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
-    visitante = forms.ModelChoiceField(queryset=Visitante.objects.all(), required=False)
+    visitante = forms.ModelChoiceField(queryset=Visitante.objects.all(), required=False, widget=AutocompletarVisitante())
+    incluir_archivados = forms.BooleanField(required=False)
+
+class FiltroAnaliticaForm(forms.Form):
+    fecha_inicio = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    fecha_fin = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        fecha_inicio = cleaned_data.get('fecha_inicio')
+        fecha_fin = cleaned_data.get('fecha_fin')
+        if fecha_inicio and fecha_fin and fecha_inicio > fecha_fin:
+            raise forms.ValidationError("La fecha inicio no puede ser posterior a la fecha fin")
+        return cleaned_data
 
 # ===== VIEWS.PY =====
 
@@ -63,11 +134,36 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import HttpResponse
+import asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from datetime import timedelta
 from django.db.models import Q
-import csv
+from .fechas import filtro_rango
+from .edificios import (
+    CLAVE_SESION, TODOS, edificio_actual, edificios_consultados, edificios_por_pk, puede_elegir_edificio,
+)
+from .exportacion import respuesta_csv_streaming
+from .paginacion import PaginaKeyset, apaginar_keyset, paginar_keyset
+from .respuestas import condicional
+from .replicas import en_replica
+from .reportes import exportacion_grande, fuentes_registros, ruta_archivo, solicitar_reporte
+from .eventos import canal, contadores, formato_sse
+from .listados import (
+    OrdenInvalido, en_cada_fuente, filtrar_visitantes, orden_solicitado,
+    respuesta_listado, serializar_registro, serializar_usuario, serializar_visitante, tam_pagina_api,
+)
+from .auditoria import registrar_auditoria
+from .busqueda import buscar_visitantes_por_prefijo, buscar_visitantes_texto
+from .analitica import obtener_analitica
+from .estadisticas import aobtener_estadisticas, obtener_estadisticas, usuarios_modificados, visitante_registrado
+from .registro_grupal import procesar_grupo, separar_documentos
+from .ocupacion import personas_dentro, registrar_egreso, registrar_ingreso, visitas_abiertas
 
 def es_administrador(user):
     return user.is_authenticated and user.rol == 'administrador'
@@ -89,7 +185,7 @@ def login_view(request):
             
             if user is not None:
                 login(request, user)
-                AuditoriaAccion.objects.create(
+                registrar_auditoria(
                     usuario=user,
                     accion='LOGIN',
                     modelo='Usuario',
@@ -112,29 +208,81 @@ def logout_view(request):
 
 # ===== DASHBOARD =====
 @login_required(login_url='login')
+@condicional('registros', 'visitantes')
 def dashboard(request):
-    total_visitantes = Visitante.objects.count()
-    ingresos_hoy = RegistroVisita.objects.filter(
-        fecha_entrada__date=timezone.now().date()
-    ).count()
-    
-    egresos_hoy = RegistroVisita.objects.filter(
-        fecha_salida__date=timezone.now().date()
-    ).count()
-    
-    usuarios_activos = Usuario.objects.filter(is_active=True).count()
-    ultimas_visitas = RegistroVisita.objects.select_related('visitante')[:10]
-    
-    context = {
-        'total_visitantes': total_visitantes,
-        'ingresos_hoy': ingresos_hoy,
-        'egresos_hoy': egresos_hoy,
-        'usuarios_activos': usuarios_activos,
-        'ultimas_visitas': ultimas_visitas,
-    }
+    context = obtener_estadisticas(edificio_actual(request))
     
     return render(request, 'dashboard.html', context)
 
+# Variante asíncrona (urls.py la usa bajo ASGI): los contadores que falten en
+# caché se consultan juntos y la petición no retiene un hilo mientras espera.
+# El render sigue siendo síncrono porque los context processors pueden
+# consultar la sesión
+@login_required(login_url='login')
+@condicional('registros', 'visitantes')
+async def dashboard_asincrono(request):
+    edificio = await sync_to_async(edificio_actual)(request)
+    context = await aobtener_estadisticas(edificio)
+    
+    return await sync_to_async(render)(request, 'dashboard.html', context)
+
+# ===== EVENTOS EN VIVO =====
+# Server-Sent Events para el dashboard (ver eventos.py). Bajo ASGI la conexión
+# queda abierta y recibe entradas, salidas y contadores del canal del
+# proceso; bajo WSGI no se puede retener un worker por pantalla, así que se
+# envían los contadores actuales y el navegador reconecta tras "retry".
+@login_required(login_url='login')
+@user_passes_test(es_recepcionista)
+async def eventos_dashboard(request):
+    intervalo_ms = getattr(settings, 'EVENTOS_INTERVALO_SONDEO', 5) * 1000
+    edificio = await sync_to_async(edificio_actual)(request)
+    actuales = canal.ultimos_contadores(edificio) or await sync_to_async(contadores)(edificio)
+    inicio = f'retry: {intervalo_ms}\n\n'.encode('utf-8') + formato_sse('contadores', actuales)
+    
+    if not isinstance(request, ASGIRequest):
+        response = HttpResponse(inicio, content_type='text/event-stream')
+    else:
+        response = StreamingHttpResponse(flujo_eventos(inicio, edificio), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Sin búfer en nginx: cada evento sale en cuanto se publica
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def flujo_eventos(inicio, edificio):
+    latido = getattr(settings, 'EVENTOS_LATIDO', 15)
+    suscripcion = canal.suscribir(edificio)
+    try:
+        yield inicio
+        while True:
+            try:
+                yield await asyncio.wait_for(suscripcion.cola.get(), latido)
+            except asyncio.TimeoutError:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield b': latido\n\n'
+    finally:
+        # El servidor cancela el generador cuando el navegador se desconecta
+        canal.cancelar(suscripcion)
+
+# ===== EDIFICIO =====
+@login_required(login_url='login')
+@user_passes_test(puede_elegir_edificio)
+def cambiar_edificio(request):
+    # La elección queda en la sesión: listados, reportes y analítica muestran
+    # ese edificio o, con "todos", combinan los de todos los edificios activos
+    if request.method == 'POST':
+        elegido = request.POST.get('edificio', '')
+        if elegido == TODOS:
+            request.session[CLAVE_SESION] = TODOS
+        elif elegido.isdigit() and int(elegido) in edificios_por_pk():
+            request.session[CLAVE_SESION] = int(elegido)
+        else:
+            messages.error(request, "Edificio no válido")
+    
+    anterior = request.META.get('HTTP_REFERER')
+    if anterior and url_has_allowed_host_and_scheme(anterior, {request.get_host()}, request.is_secure()):
+        return redirect(anterior)
+    return redirect('dashboard')
+
 # ===== USUARIOS =====
 @login_required(login_url='login')
 @user_passes_test(es_administrador)
@@ -145,8 +293,9 @@ def crear_usuario(request):
             usuario = form.save(commit=False)
             usuario.set_password(form.cleaned_data['password'])
             usuario.save()
+            usuarios_modificados()
             
-            AuditoriaAccion.objects.create(
+            registrar_auditoria(
                 usuario=request.user,
                 accion='CREATE',
                 modelo='Usuario',
@@ -164,8 +313,9 @@ def crear_usuario(request):
 @login_required(login_url='login')
 @user_passes_test(es_administrador)
 def listar_usuarios(request):
-    usuarios = Usuario.objects.all()
-    return render(request, 'usuarios/listar_usuarios.html', {'usuarios': usuarios})
+    clave, campo, descendente = orden_solicitado(request, 'usuarios')
+    usuarios = paginar_keyset(request, Usuario.objects.all(), campo, descendente=descendente)
+    return render(request, 'usuarios/listar_usuarios.html', {'usuarios': usuarios, 'orden': clave})
 
 @login_required(login_url='login')
 @user_passes_test(es_administrador)
@@ -176,8 +326,9 @@ def editar_usuario(request, usuario_id):
         form = EditarUsuarioForm(request.POST, instance=usuario)
         if form.is_valid():
             form.save()
+            usuarios_modificados()
             
-            AuditoriaAccion.objects.create(
+            registrar_auditoria(
                 usuario=request.user,
                 accion='UPDATE',
                 modelo='Usuario',
@@ -198,7 +349,7 @@ def eliminar_usuario(request, usuario_id):
     usuario = get_object_or_404(Usuario, id=usuario_id)
     
     if request.method == 'POST':
-        AuditoriaAccion.objects.create(
+        registrar_auditoria(
             usuario=request.user,
             accion='DELETE',
             modelo='Usuario',
@@ -207,6 +358,7 @@ def eliminar_usuario(request, usuario_id):
         )
         
         usuario.delete()
+        usuarios_modificados()
         messages.success(request, "Usuario eliminado exitosamente")
         return redirect('listar_usuarios')
     
@@ -216,34 +368,67 @@ def eliminar_usuario(request, usuario_id):
 @login_required(login_url='login')
 @user_passes_test(es_recepcionista)
 def registrar_visitante(request):
+    edificio = edificio_actual(request)
     if request.method == 'POST':
-        form = RegistroVisitanteForm(request.POST)
+        form = RegistroVisitanteForm(request.POST, edificio=edificio)
         if form.is_valid():
             form.save()
+            visitante_registrado(edificio)
             messages.success(request, "Visitante registrado exitosamente")
             return redirect('listar_visitantes')
     else:
-        form = RegistroVisitanteForm()
+        form = RegistroVisitanteForm(edificio=edificio)
     
     return render(request, 'visitantes/registrar_visitante.html', {'form': form})
 
 @login_required(login_url='login')
 @user_passes_test(es_recepcionista)
+@condicional('visitantes')
 def listar_visitantes(request):
-    visitantes = Visitante.objects.all()
-    
+    edificio = edificio_actual(request)
     if request.GET.get('buscar'):
-        q = request.GET.get('buscar')
-        visitantes = visitantes.filter(
-            Q(nombre__icontains=q) | Q(documento__icontains=q)
-        )
+        # Resultados ordenados por relevancia: se muestran las mejores coincidencias
+        # sin paginar por fecha. Una coincidencia de más indica que quedaron
+        # otras fuera del límite: el total ya no es exacto
+        limite = getattr(settings, 'BUSQUEDA_LIMITE', 100)
+        resultados = buscar_visitantes_texto(request.GET.get('buscar'), edificio, limite + 1)
+        truncada = len(resultados) > limite
+        resultados = resultados[:limite]
+        visitantes = PaginaKeyset(resultados, total=len(resultados), total_exacto=not truncada)
+    else:
+        truncada = False
+        clave, campo, descendente = orden_solicitado(request, 'visitantes')
+        visitantes = paginar_keyset(request, Visitante.objects.del_edificio(edificio), campo, descendente=descendente)
+    return render(request, 'visitantes/listar_visitantes.html', {
+        'visitantes': visitantes,
+        'busqueda_truncada': truncada,
+    })
+
+@login_required(login_url='login')
+@user_passes_test(es_recepcionista)
+def buscar_visitantes(request):
+    edificio = edificio_actual(request)
+    queryset = Visitante.objects.del_edificio(edificio)
+    if request.GET.get('en_edificio'):
+        queryset = queryset.filter(id__in=visitas_abiertas(edificio).values('visitante'))
     
-    return render(request, 'visitantes/listar_visitantes.html', {'visitantes': visitantes})
+    resultados = buscar_visitantes_por_prefijo(request.GET.get('q'), queryset=queryset)
+    return JsonResponse({
+        'resultados': [
+            {
+                'id': fila['id'],
+                'texto': f"{fila['nombre']} ({fila['documento']})",
+                'nombre': fila['nombre'],
+                'documento': fila['documento'],
+            }
+            for fila in resultados
+        ]
+    })
 
 @login_required(login_url='login')
 @user_passes_test(es_recepcionista)
 def editar_visitante(request, visitante_id):
-    visitante = get_object_or_404(Visitante, id=visitante_id)
+    visitante = get_object_or_404(Visitante.objects.del_edificio(edificio_actual(request)), id=visitante_id)
     
     if request.method == 'POST':
         form = RegistroVisitanteForm(request.POST, instance=visitante)
@@ -260,18 +445,20 @@ def editar_visitante(request, visitante_id):
 @login_required(login_url='login')
 @user_passes_test(es_recepcionista)
 def registrar_entrada(request):
+    edificio = edificio_actual(request)
     if request.method == 'POST':
-        form = RegistroEntradaForm(request.POST)
+        form = RegistroEntradaForm(request.POST, edificio=edificio)
         if form.is_valid():
             registro = form.save(commit=False)
+            registro.edificio_id = edificio.pk
             registro.registrado_por = request.user
-            registro.save()
+            registrar_ingreso(registro)
             messages.success(request, "Entrada registrada exitosamente")
             return redirect('dashboard')
     else:
-        form = RegistroEntradaForm()
+        form = RegistroEntradaForm(edificio=edificio)
     
-    visitantes_count = Visitante.objects.count()
+    visitantes_count = Visitante.objects.del_edificio(edificio).count()
     return render(request, 'registros/registrar_entrada.html', {
         'form': form,
         'visitantes_count': visitantes_count
@@ -281,87 +468,303 @@ def registrar_entrada(request):
 @user_passes_test(es_recepcionista)
 def registrar_salida(request):
     if request.method == 'POST':
+        edificio = edificio_actual(request)
         visitante_id = request.POST.get('visitante')
-        visitante = get_object_or_404(Visitante, id=visitante_id)
+        visitante = get_object_or_404(Visitante.objects.del_edificio(edificio), id=visitante_id)
         
-        registro = RegistroVisita.objects.filter(
+        registro = RegistroVisita.objects.del_edificio(edificio).filter(
             visitante=visitante,
             fecha_salida__isnull=True
         ).last()
         
-        if registro:
-            registro.fecha_salida = timezone.now()
-            registro.save()
+        if registro and registrar_egreso(registro):
             messages.success(request, "Salida registrada exitosamente")
         else:
             messages.error(request, "No hay registro de entrada para este visitante")
         
         return redirect('dashboard')
     
-    visitantes = Visitante.objects.all()
-    return render(request, 'registros/registrar_salida.html', {'visitantes': visitantes})
+    form = RegistroSalidaForm()
+    return render(request, 'registros/registrar_salida.html', {'form': form})
 
-# ===== REPORTES Y CONSULTAS =====
 @login_required(login_url='login')
 @user_passes_test(es_recepcionista)
-def consultar_registros(request):
-    registros = RegistroVisita.objects.select_related('visitante')
+def registro_grupal(request):
+    resultados = None
     
     if request.method == 'POST':
-        form = FiltroReporteForm(request.POST)
+        form = RegistroGrupalForm(request.POST)
         if form.is_valid():
-            if form.cleaned_data['fecha_inicio']:
-                registros = registros.filter(fecha_entrada__gte=form.cleaned_data['fecha_inicio'])
-            if form.cleaned_data['fecha_fin']:
-                registros = registros.filter(fecha_entrada__lte=form.cleaned_data['fecha_fin'])
-            if form.cleaned_data['visitante']:
-                registros = registros.filter(visitante=form.cleaned_data['visitante'])
+            documentos = separar_documentos(form.cleaned_data['documentos'])
+            ids = request.POST.getlist('visitante')
+            if not documentos and not ids:
+                form.add_error('documentos', 'Ingresa al menos un documento')
+            else:
+                try:
+                    resultados = procesar_grupo(
+                        form.cleaned_data['operacion'],
+                        edificio_actual(request),
+                        documentos=documentos,
+                        ids=ids,
+                        usuario=request.user,
+                        observaciones=form.cleaned_data['observaciones'],
+                    )
+                except ValueError as exc:
+                    form.add_error(None, str(exc))
+        
+        if request.GET.get('formato') == 'json':
+            if resultados is None:
+                return JsonResponse({'errores': form.errors}, status=400)
+            return JsonResponse({
+                'registrados': sum(1 for r in resultados if r['ok']),
+                'resultados': [
+                    {
+                        'identificador': r['identificador'],
+                        'visitante_id': r['visitante'].id if r['visitante'] else None,
+                        'ok': r['ok'],
+                        'mensaje': r['mensaje'],
+                    }
+                    for r in resultados
+                ],
+            })
+        
+        if resultados is not None:
+            registrados = sum(1 for r in resultados if r['ok'])
+            if registrados:
+                messages.success(request, f"{registrados} de {len(resultados)} registros procesados")
+            else:
+                messages.error(request, "Ningún visitante del grupo pudo registrarse")
     else:
-        form = FiltroReporteForm()
+        form = RegistroGrupalForm()
     
-    return render(request, 'registros/consultar_registros.html', {
+    return render(request, 'registros/registro_grupal.html', {
+        'form': form,
+        'resultados': resultados,
+    })
+
+@login_required(login_url='login')
+@user_passes_test(es_recepcionista)
+@condicional('registros', 'visitantes')
+def lista_evacuacion(request):
+    edificio = edificio_actual(request)
+    registros = visitas_abiertas(edificio).select_related('visitante').only(
+        'fecha_entrada',
+        'visitante__nombre',
+        'visitante__tipo_documento',
+        'visitante__documento',
+        'visitante__apartamento_visitado',
+        'visitante__persona_a_visitar',
+    )
+    
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({
+            'personas_dentro': personas_dentro(edificio),
+            'generado': timezone.now().isoformat(),
+            'visitantes': [
+                {
+                    'nombre': registro.visitante.nombre,
+                    'documento': registro.visitante.documento,
+                    'apartamento': registro.visitante.apartamento_visitado,
+                    'persona_a_visitar': registro.visitante.persona_a_visitar,
+                    'fecha_entrada': registro.fecha_entrada.isoformat(),
+                }
+                for registro in registros
+            ],
+        })
+    
+    return render(request, 'registros/lista_evacuacion.html', {
         'registros': registros,
+        'personas_dentro': personas_dentro(edificio),
+        'generado': timezone.now(),
+    })
+
+# ===== REPORTES Y CONSULTAS =====
+# Solo lectura: con réplicas configuradas (@en_replica, ver replicas.py) sus
+# escaneos no compiten con las entradas y salidas de recepción
+@login_required(login_url='login')
+@user_passes_test(es_recepcionista)
+@en_replica
+@condicional('registros', 'visitantes')
+def consultar_registros(request):
+    datos = request.POST if request.method == 'POST' else request.GET
+    
+    form = FiltroReporteForm(datos or None, edificio=edificio_actual(request))
+    clave, campo, descendente = orden_solicitado(request, 'registros')
+    registros = registros_filtrados(form, edificios_consultados(request), 'visitante')
+    
+    return render(request, 'registros/consultar_registros.html', {
+        'registros': paginar_keyset(request, registros, campo, descendente=descendente),
         'form': form
     })
 
 @login_required(login_url='login')
 @user_passes_test(es_recepcionista)
+@en_replica
+@condicional('registros', 'visitantes')
+async def consultar_registros_asincrono(request):
+    datos = request.POST if request.method == 'POST' else request.GET
+    
+    form = FiltroReporteForm(datos or None, edificio=await sync_to_async(edificio_actual)(request))
+    clave, campo, descendente = orden_solicitado(request, 'registros')
+    # Validar el filtro de visitante consulta la base
+    edificios = await sync_to_async(edificios_consultados)(request)
+    registros = await sync_to_async(registros_filtrados)(form, edificios, 'visitante')
+    
+    return await sync_to_async(render)(request, 'registros/consultar_registros.html', {
+        'registros': await apaginar_keyset(request, registros, campo, descendente=descendente),
+        'form': form
+    })
+
+@login_required(login_url='login')
+@user_passes_test(es_recepcionista)
+@en_replica
 def generar_reporte(request):
-    registros = RegistroVisita.objects.select_related('visitante', 'registrado_por')
+    datos = request.POST if request.method == 'POST' else request.GET
     
-    if request.method == 'POST':
-        form = FiltroReporteForm(request.POST)
-        if form.is_valid():
-            if form.cleaned_data['fecha_inicio']:
-                registros = registros.filter(fecha_entrada__gte=form.cleaned_data['fecha_inicio'])
-            if form.cleaned_data['fecha_fin']:
-                registros = registros.filter(fecha_entrada__lte=form.cleaned_data['fecha_fin'])
-        
-        if request.POST.get('exportar_csv'):
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="reporte_ingresos.csv"'
-            
-            writer = csv.writer(response)
-            writer.writerow(['Visitante', 'Documento', 'Entrada', 'Salida', 'Motivo'])
-            
-            for registro in registros:
-                writer.writerow([
-                    registro.visitante.nombre,
-                    registro.visitante.documento,
-                    registro.fecha_entrada,
-                    registro.fecha_salida,
-                    registro.visitante.motivo_visita
-                ])
-            
-            return response
-    else:
-        form = FiltroReporteForm()
+    form = FiltroReporteForm(datos or None, edificio=edificio_actual(request))
+    edificios = edificios_consultados(request)
+    registros = registros_filtrados(form, edificios, 'visitante', 'registrado_por')
+    
+    if datos.get('programar') or (datos.get('exportar_csv') and exportacion_grande(registros)):
+        # Fuera de la petición: el archivo se genera en segundo plano
+        filtros = filtros_de_consulta(form, edificios)
+        formato = datos.get('formato') if datos.get('formato') in dict(ReporteJob.FORMATOS) else 'csv'
+        reporte, creado = solicitar_reporte(filtros, formato, request.user)
+        if not datos.get('programar'):
+            messages.info(request, "El reporte es demasiado grande para descargarlo directamente: se está generando en segundo plano")
+        elif creado:
+            messages.success(request, "Reporte en cola. Podrás descargarlo aquí cuando termine")
+        else:
+            messages.info(request, "Ya existe un reporte con los mismos filtros")
+        return redirect('reportes_programados')
+    
+    if datos.get('exportar_csv'):
+        return respuesta_csv_streaming(
+            registros,
+            gzip=bool(datos.get('comprimir_gzip'))
+        )
     
     return render(request, 'registros/generar_reporte.html', {
         'form': form,
-        'registros': registros
+        'registros': paginar_keyset(request, registros, 'fecha_entrada')
     })
 
+@login_required(login_url='login')
+@user_passes_test(es_recepcionista)
+def reportes_programados(request):
+    reportes = reportes_visibles(request).select_related('solicitado_por')[:50]
+    
+    if request.GET.get('formato') == 'json':
+        # La página consulta el avance mientras haya reportes activos
+        return JsonResponse({'reportes': [
+            {
+                'id': reporte.id,
+                'estado': reporte.estado,
+                'estado_nombre': reporte.get_estado_display(),
+                'progreso': reporte.progreso,
+                'filas_procesadas': reporte.filas_procesadas,
+                'filas_totales': reporte.filas_totales,
+                'tamano': reporte.tamano,
+                'url_descarga': reverse('descargar_reporte', args=[reporte.id]) if reporte.estado == 'completado' else None,
+            }
+            for reporte in reportes
+        ]})
+    
+    return render(request, 'registros/reportes_programados.html', {
+        'reportes': reportes,
+        'hay_activos': any(reporte.activo for reporte in reportes),
+    })
+
+@login_required(login_url='login')
+@user_passes_test(es_recepcionista)
+def descargar_reporte(request, reporte_id):
+    reporte = get_object_or_404(reportes_visibles(request), id=reporte_id)
+    if reporte.estado != 'completado':
+        messages.warning(request, "El reporte todavía no está listo")
+        return redirect('reportes_programados')
+    
+    ruta = ruta_archivo(reporte)
+    if not ruta.exists():
+        raise Http404("El archivo del reporte ya no está disponible")
+    # El archivo ya está comprimido: se envía tal cual, sin pasar por gzip
+    return FileResponse(
+        open(ruta, 'rb'),
+        as_attachment=True,
+        filename=reporte.nombre_descarga,
+        content_type='application/gzip'
+    )
+
+@login_required(login_url='login')
+@user_passes_test(es_recepcionista)
+@en_replica
+def analitica_visitas(request):
+    form = FiltroAnaliticaForm(request.GET or None)
+    filtros = form.cleaned_data if form.is_bound and form.is_valid() else {}
+    analitica = obtener_analitica(edificios_consultados(request), filtros.get('fecha_inicio'), filtros.get('fecha_fin'))
+    
+    if request.GET.get('formato') == 'json':
+        return JsonResponse(analitica)
+    
+    return render(request, 'registros/analitica.html', {
+        'form': form,
+        'analitica': analitica
+    })
+
+# ===== API DE LISTADOS =====
+# Páginas JSON ordenadas y filtradas en la base (ver listados.py); main.js las
+# usa para cambiar de orden y de página sin recargar ni recorrer la tabla
+@login_required(login_url='login')
+@user_passes_test(es_recepcionista)
+@en_replica
+def api_registros(request):
+    try:
+        clave, campo, descendente = orden_solicitado(request, 'registros', estricto=True)
+    except OrdenInvalido as error:
+        return JsonResponse({'errores': {'orden': [str(error)]}}, status=400)
+    form = FiltroReporteForm(request.GET or None, edificio=edificio_actual(request))
+    if form.is_bound and not form.is_valid():
+        return JsonResponse({'errores': form.errors}, status=400)
+    
+    estado = request.GET.get('estado')
+    def filtrar(fuente):
+        if estado == 'dentro':
+            fuente = fuente.filter(fecha_salida__isnull=True)
+        elif estado == 'fuera':
+            fuente = fuente.filter(fecha_salida__isnull=False)
+        return fuente
+    
+    registros = en_cada_fuente(registros_filtrados(form, edificios_consultados(request), 'visitante', 'registrado_por'), filtrar)
+    pagina = paginar_keyset(request, registros, campo, tam_pagina_api(request), descendente)
+    return respuesta_listado(request, pagina, clave, serializar_registro)
+
+@login_required(login_url='login')
+@user_passes_test(es_recepcionista)
+def api_visitantes(request):
+    try:
+        clave, campo, descendente = orden_solicitado(request, 'visitantes', estricto=True)
+    except OrdenInvalido as error:
+        return JsonResponse({'errores': {'orden': [str(error)]}}, status=400)
+    
+    visitantes = filtrar_visitantes(Visitante.objects.del_edificio(edificio_actual(request)), request.GET.get('q'))
+    pagina = paginar_keyset(request, visitantes, campo, tam_pagina_api(request), descendente)
+    return respuesta_listado(request, pagina, clave, serializar_visitante)
+
+@login_required(login_url='login')
+@user_passes_test(es_administrador)
+def api_usuarios(request):
+    try:
+        clave, campo, descendente = orden_solicitado(request, 'usuarios', estricto=True)
+    except OrdenInvalido as error:
+        return JsonResponse({'errores': {'orden': [str(error)]}}, status=400)
+    
+    usuarios = Usuario.objects.all()
+    if request.GET.get('rol'):
+        usuarios = usuarios.filter(rol=request.GET['rol'])
+    if request.GET.get('activo') in ('0', '1'):
+        usuarios = usuarios.filter(is_active=request.GET['activo'] == '1')
+    pagina = paginar_keyset(request, usuarios, campo, tam_pagina_api(request), descendente)
+    return respuesta_listado(request, pagina, clave, serializar_usuario)
+
 # ===== UTILIDADES =====
 def get_client_ip(request):
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -371,4 +774,17 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR')
     return ip
 
-from .models import AuditoriaAccion
+def filtros_de_consulta(form, edificios):
+    filtros = dict(form.cleaned_data) if form.is_bound and form.is_valid() else {}
+    filtros['edificios'] = edificios
+    return filtros
+
+def registros_filtrados(form, edificios, *relaciones):
+    # Con varias bases o "incluir archivados" devuelve una lista de fuentes (ver reportes.py)
+    return fuentes_registros(filtros_de_consulta(form, edificios), *relaciones)
+
+def reportes_visibles(request):
+    # Los reportes de varios edificios solo los ve quien puede elegir edificio
+    if puede_elegir_edificio(request.user):
+        return ReporteJob.objects.all()
+    return ReporteJob.objects.filter(edificio=edificio_actual(request))
@@ -0,0 +1,53 @@
+from django import forms
+from django.urls import reverse_lazy
+from django.utils.html import format_html
+
+from .models import Visitante
+
+
+class AutocompletarVisitante(forms.Widget):
+    """Campo de búsqueda que consulta el endpoint JSON en lugar de listar
+    todos los visitantes en un <select>. Solo el id elegido viaja en el POST."""
+
+    url = reverse_lazy('buscar_visitantes')
+
+    class Media:
+        js = ['js/autocompletar.js']
+
+    def __init__(self, attrs=None, solo_en_edificio=False):
+        super().__init__(attrs)
+        self.solo_en_edificio = solo_en_edificio
+
+    def texto_inicial(self, value):
+        if value in (None, '') or not str(value).isdigit():
+            # Sin id válido (p. ej. ?visitante=abc): el campo ya muestra el error
+            return ''
+        # El campo acota los visitantes al edificio de la petición
+        queryset = getattr(getattr(self, 'choices', None), 'queryset', Visitante.objects.all())
+        visitante = queryset.filter(pk=value).only('nombre', 'documento').first()
+        return str(visitante) if visitante else ''
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        campo_id = attrs.get('id', f'id_{name}')
+        url = str(self.url)
+        if self.solo_en_edificio:
+            url += '?en_edificio=1'
+        return format_html(
+            '<div class="autocompletar" data-url="{}">'
+            '<input type="hidden" name="{}" id="{}" value="{}">'
+            '<input type="text" class="autocompletar-texto {}" id="{}_texto" value="{}" '
+            'placeholder="Buscar por nombre o documento..." autocomplete="off">'
+            '<ul class="autocompletar-resultados"></ul>'
+            '</div>',
+            url,
+            name,
+            campo_id,
+            '' if value is None else value,
+            attrs.get('class', ''),
+            campo_id,
+            self.texto_inicial(value),
+        )
+
+    def id_for_label(self, id_):
+        return f'{id_}_texto' if id_ else id_
@@ -0,0 +1,97 @@
+// ===== AUTOCOMPLETAR VISITANTES =====
+// Consulta el endpoint JSON mientras se escribe y guarda el id elegido en el
+// campo oculto; la página ya no incluye la tabla completa de visitantes.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.autocompletar').forEach(initAutocompletar);
+});
+
+function initAutocompletar(contenedor) {
+    const oculto = contenedor.querySelector('input[type="hidden"]');
+    const texto = contenedor.querySelector('.autocompletar-texto');
+    const lista = contenedor.querySelector('.autocompletar-resultados');
+    const url = contenedor.dataset.url;
+    let temporizador;
+    let peticion = 0;
+    let activo = -1;
+
+    function cerrar() {
+        lista.innerHTML = '';
+        lista.style.display = 'none';
+        activo = -1;
+    }
+
+    function elegir(item) {
+        oculto.value = item.id;
+        texto.value = item.texto;
+        cerrar();
+    }
+
+    function mostrar(resultados) {
+        lista.innerHTML = '';
+        if (!resultados.length) {
+            const vacio = document.createElement('li');
+            vacio.className = 'autocompletar-vacio';
+            vacio.textContent = 'Sin coincidencias';
+            lista.appendChild(vacio);
+        }
+        resultados.forEach(item => {
+            const li = document.createElement('li');
+            li.textContent = item.texto;
+            li.addEventListener('mousedown', function(e) {
+                e.preventDefault();
+                elegir(item);
+            });
+            li._item = item;
+            lista.appendChild(li);
+        });
+        lista.style.display = 'block';
+    }
+
+    function marcar(indice) {
+        const items = lista.querySelectorAll('li');
+        if (!items.length) return;
+        activo = (indice + items.length) % items.length;
+        items.forEach((li, i) => li.classList.toggle('activo', i === activo));
+    }
+
+    texto.addEventListener('input', function() {
+        oculto.value = '';
+        clearTimeout(temporizador);
+        const termino = this.value.trim();
+        if (!termino) {
+            cerrar();
+            return;
+        }
+        temporizador = setTimeout(() => {
+            const numero = ++peticion;
+            const separador = url.includes('?') ? '&' : '?';
+            fetch(`${url}${separador}q=${encodeURIComponent(termino)}`, {
+                headers: { 'X-Requested-With': 'XMLHttpRequest' }
+            })
+                .then(response => response.json())
+                .then(data => {
+                    // Ignorar respuestas de búsquedas anteriores
+                    if (numero === peticion) mostrar(data.resultados);
+                })
+                .catch(err => console.error('Error al buscar visitantes:', err));
+        }, 200);
+    });
+
+    texto.addEventListener('keydown', function(e) {
+        if (e.key === 'ArrowDown') {
+            e.preventDefault();
+            marcar(activo + 1);
+        } else if (e.key === 'ArrowUp') {
+            e.preventDefault();
+            marcar(activo - 1);
+        } else if (e.key === 'Enter' && activo >= 0) {
+            e.preventDefault();
+            const li = lista.querySelectorAll('li')[activo];
+            if (li && li._item) elegir(li._item);
+        } else if (e.key === 'Escape') {
+            cerrar();
+        }
+    });
+
+    texto.addEventListener('blur', cerrar);
+}
@@ -102,24 +102,6 @@ function togglePasswordVisibility(inputId) {
     }
 }
 
-// ===== FILTRAR TABLA =====
-function filterTable(tableId, searchId) {
-    const searchInput = document.getElementById(searchId);
-    const table = document.getElementById(tableId);
-
-    if (!searchInput || !table) return;
-
-    searchInput.addEventListener('keyup', function() {
-        const searchTerm = this.value.toLowerCase();
-        const rows = table.querySelectorAll('tbody tr');
-
-        rows.forEach(row => {
-            const text = row.innerText.toLowerCase();
-            row.style.display = text.includes(searchTerm) ? '' : 'none';
-        });
-    });
-}
-
 // ===== EXPORTAR TABLA A CSV =====
 function exportTableToCSV(tableId, filename = 'reporte.csv') {
     const table = document.getElementById(tableId);
@@ -221,89 +203,123 @@ function submitFormWithValidation(formId) {
     }
 }
 
-// ===== TABLA INTERACTIVA =====
-class DataTable {
-    constructor(tableId, options = {}) {
-        this.table = document.getElementById(tableId);
-        this.options = {
-            itemsPerPage: options.itemsPerPage || 10,
-            searchable: options.searchable !== false,
-            sortable: options.sortable !== false,
-            ...options
-        };
+// ===== TABLAS ORDENADAS Y PAGINADAS EN EL SERVIDOR =====
+// Las tablas con data-api piden cada página ya ordenada y filtrada a la API
+// de listados y solo dibujan esas filas. La primera página llega renderizada
+// en el HTML; los encabezados con data-orden cambian el orden y los enlaces
+// de paginación piden la página siguiente o anterior sin recargar.
+// Las filas se crean desde el <template> de la tabla:
+//   data-campo="x"  texto del campo x        data-fecha="x"  fecha formateada
+//   data-href="x"   enlace a la URL x        data-si / data-no="x" o "x=valor"
+//                                            muestra el elemento si se cumple / no
+class TablaRemota {
+    constructor(tabla) {
+        this.tabla = tabla;
+        this.api = tabla.dataset.api;
+        this.plantilla = tabla.querySelector('template');
+        this.parametros = new URLSearchParams(window.location.search);
         this.init();
     }
 
     init() {
-        if (!this.table) return;
-
-        if (this.options.searchable) {
-            this.addSearchBox();
-        }
+        if (!this.api || !this.plantilla) return;
 
-        if (this.options.sortable) {
-            this.addSortability();
-        }
+        this.tabla.querySelectorAll('thead th[data-orden]').forEach(th => {
+            th.style.cursor = 'pointer';
+            th.title = 'Click para ordenar';
+            th.addEventListener('click', () => this.ordenar(th.dataset.orden));
+        });
+        this.marcarOrden();
+
+        // La paginación incluida debajo de la tabla
+        document.addEventListener('click', evento => {
+            const enlace = evento.target.closest('.pagination a');
+            if (!enlace) return;
+            evento.preventDefault();
+            this.cargar(new URL(enlace.href, window.location.href).searchParams);
+        });
     }
 
-    addSearchBox() {
-        const searchBox = document.createElement('input');
-        searchBox.type = 'text';
-        searchBox.className = 'table-search';
-        searchBox.placeholder = 'Buscar en la tabla...';
-        searchBox.style.cssText = `
-            margin-bottom: 15px;
-            padding: 10px 15px;
-            border: 1px solid #bdc3c7;
-            border-radius: 5px;
-            width: 100%;
-            max-width: 300px;
-        `;
-
-        this.table.parentElement.insertBefore(searchBox, this.table);
-
-        searchBox.addEventListener('keyup', () => this.search(searchBox.value));
+    ordenar(clave) {
+        const actual = this.parametros.get('orden');
+        const parametros = new URLSearchParams(this.parametros);
+        parametros.set('orden', actual === clave ? `-${clave}` : clave);
+        parametros.delete('cursor');
+        this.cargar(parametros);
     }
 
-    search(term) {
-        const rows = this.table.querySelectorAll('tbody tr');
-        rows.forEach(row => {
-            const text = row.innerText.toLowerCase();
-            row.style.display = text.includes(term.toLowerCase()) ? '' : 'none';
+    marcarOrden() {
+        const orden = this.parametros.get('orden') || '';
+        this.tabla.querySelectorAll('thead th[data-orden]').forEach(th => {
+            th.classList.toggle('orden-asc', orden === th.dataset.orden);
+            th.classList.toggle('orden-desc', orden === `-${th.dataset.orden}`);
         });
     }
 
-    addSortability() {
-        const headers = this.table.querySelectorAll('thead th');
-        headers.forEach((header, index) => {
-            header.style.cursor = 'pointer';
-            header.title = 'Click para ordenar';
-            header.addEventListener('click', () => this.sort(index));
+    async cargar(parametros) {
+        const respuesta = await fetch(`${this.api}?${parametros}`, {
+            headers: { 'Accept': 'application/json' },
+            credentials: 'same-origin'
         });
+        if (!respuesta.ok) {
+            console.error('Error al cargar la tabla:', respuesta.status);
+            return;
+        }
+        const datos = await respuesta.json();
+
+        this.parametros = parametros;
+        const cuerpo = this.tabla.querySelector('tbody');
+        cuerpo.replaceChildren(...datos.resultados.map(fila => this.crearFila(fila)));
+        this.actualizarPaginacion(datos);
+        this.marcarOrden();
+        // La URL de la página refleja el estado: recargar muestra lo mismo
+        history.replaceState(null, '', `?${parametros}`);
     }
 
-    sort(columnIndex) {
-        const rows = Array.from(this.table.querySelectorAll('tbody tr'));
-        const isNumeric = rows.every(row => !isNaN(parseFloat(row.cells[columnIndex].innerText)));
-
-        rows.sort((a, b) => {
-            const aVal = a.cells[columnIndex].innerText;
-            const bVal = b.cells[columnIndex].innerText;
-
-            if (isNumeric) {
-                return parseFloat(aVal) - parseFloat(bVal);
-            }
-            return aVal.localeCompare(bVal);
+    crearFila(fila) {
+        const copia = this.plantilla.content.cloneNode(true);
+        const cumple = condicion => {
+            const [campo, valor] = condicion.split('=');
+            return valor === undefined ? Boolean(fila[campo]) : String(fila[campo]) === valor;
+        };
+        copia.querySelectorAll('[data-campo]').forEach(el => {
+            const valor = fila[el.dataset.campo];
+            el.textContent = valor === null || valor === '' ? 'N/A' : valor;
+        });
+        copia.querySelectorAll('[data-fecha]').forEach(el => {
+            const valor = fila[el.dataset.fecha];
+            el.textContent = valor ? formatDate(valor) : '-';
         });
+        copia.querySelectorAll('[data-href]').forEach(el => {
+            el.href = fila[el.dataset.href];
+        });
+        copia.querySelectorAll('[data-si]').forEach(el => {
+            if (!cumple(el.dataset.si)) el.remove();
+        });
+        copia.querySelectorAll('[data-no]').forEach(el => {
+            if (cumple(el.dataset.no)) el.remove();
+        });
+        return copia;
+    }
 
-        rows.forEach(row => this.table.querySelector('tbody').appendChild(row));
+    actualizarPaginacion(datos) {
+        let paginacion = document.querySelector('.pagination');
+        if (!paginacion) {
+            paginacion = document.createElement('div');
+            paginacion.className = 'pagination';
+            this.tabla.closest('.table-container').after(paginacion);
+        }
+        // Los enlaces apuntan a la página HTML con los mismos parámetros
+        const enlace = (url, html) => url ? `<a href="?${url.split('?')[1]}">${html}</a>` : '';
+        paginacion.innerHTML =
+            enlace(datos.anterior, '<i class="fas fa-chevron-left"></i> Anterior') +
+            enlace(datos.siguiente, 'Siguiente <i class="fas fa-chevron-right"></i>');
     }
 }
 
 // ===== INICIALIZAR TABLAS =====
 document.addEventListener('DOMContentLoaded', function() {
-    // Buscar todas las tablas con clase 'data-table' e inicializarlas
-    document.querySelectorAll('table.data-table').forEach(table => {
-        new DataTable(table.id);
+    document.querySelectorAll('table[data-api]').forEach(tabla => {
+        new TablaRemota(tabla);
     });
-});
\ No newline at end of file
+});